@@ -0,0 +1,113 @@
+"""Declarative alert rules compiled to vectorized predicates
+
+Rules come from ALERT_RULES in config, checked in order; the first rule a
+product matches decides its alert:
+
+    {'name': 'overstock', 'when': 'current_quantity >= max_stock_level * 0.8',
+     'alert': 'overstock'}
+
+``when`` is a Python-syntax expression over the alert input COLUMNS.
+Arithmetic, comparisons, and/or/not and ``in`` / ``not in`` against a
+tuple of constants are allowed; anything else is rejected when the rule
+is compiled. Each expression becomes a tree of NumPy operations over
+whole columns, so the catalog is evaluated in one pass per rule and a new
+rule adds no per-product Python. ``alert`` names the alert it raises
+(one of KINDS).
+"""
+import ast
+import functools
+from collections import namedtuple
+
+import numpy as np
+
+COLUMNS = ('current_quantity', 'reorder_level', 'max_stock_level', 'purchase_price', 'selling_price',
+           'velocity', 'forecast_demand', 'days_of_stock', 'category')
+KINDS = ('critical', 'warning', 'overstock', 'info')
+
+ARITHMETIC = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.divide}
+COMPARISONS = {ast.Lt: np.less, ast.LtE: np.less_equal, ast.Gt: np.greater,
+               ast.GtE: np.greater_equal, ast.Eq: np.equal, ast.NotEq: np.not_equal}
+
+Rule = namedtuple('Rule', ['name', 'alert', 'when', 'predicate'])
+
+
+def _constants(node):
+    """Values of a tuple/list of literals, the right-hand side of ``in``"""
+    if not isinstance(node, (ast.Tuple, ast.List, ast.Set)):
+        raise ValueError(f"'in' needs a tuple of constants, got {ast.unparse(node)}")
+    values = [item.value for item in node.elts if isinstance(item, ast.Constant)]
+    if len(values) != len(node.elts):
+        raise ValueError(f"'in' needs a tuple of constants, got {ast.unparse(node)}")
+    return np.array(values)
+
+
+def _compile(node):
+    """Function of the column dict evaluating ``node`` over whole arrays"""
+    if isinstance(node, ast.BoolOp):
+        parts = [_compile(value) for value in node.values]
+        combine = np.logical_and if isinstance(node.op, ast.And) else np.logical_or
+        return lambda cols: functools.reduce(combine, [part(cols) for part in parts])
+
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.Not, ast.USub)):
+        operand = _compile(node.operand)
+        negate = np.logical_not if isinstance(node.op, ast.Not) else np.negative
+        return lambda cols: negate(operand(cols))
+
+    if isinstance(node, ast.BinOp) and type(node.op) in ARITHMETIC:
+        left, right, op = _compile(node.left), _compile(node.right), ARITHMETIC[type(node.op)]
+        return lambda cols: op(left(cols), right(cols))
+
+    if isinstance(node, ast.Compare):
+        # Chained comparisons (a < b < c) hold when every link does
+        tests, left = [], node.left
+        for op, right in zip(node.ops, node.comparators):
+            if isinstance(op, (ast.In, ast.NotIn)):
+                values, operand = _constants(right), _compile(left)
+                invert = isinstance(op, ast.NotIn)
+                tests.append(lambda cols, operand=operand, values=values, invert=invert:
+                             np.isin(operand(cols), values, invert=invert))
+            elif type(op) in COMPARISONS:
+                a, b, compare = _compile(left), _compile(right), COMPARISONS[type(op)]
+                tests.append(lambda cols, a=a, b=b, compare=compare: compare(a(cols), b(cols)))
+            else:
+                raise ValueError(f"unsupported comparison in {ast.unparse(node)}")
+            left = right
+        return lambda cols: functools.reduce(np.logical_and, [test(cols) for test in tests])
+
+    if isinstance(node, ast.Name):
+        if node.id not in COLUMNS:
+            raise ValueError(f"unknown column '{node.id}' (choose from {', '.join(COLUMNS)})")
+        name = node.id
+        return lambda cols: cols[name]
+
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float, str)):
+        value = node.value
+        return lambda cols: value
+
+    raise ValueError(f"unsupported expression: {ast.unparse(node)}")
+
+
+def compile_rule(name, when, alert):
+    """A Rule whose predicate maps the column dict to a boolean array"""
+    if alert not in KINDS:
+        raise ValueError(f"Alert rule '{name}': unknown alert '{alert}' (choose from {', '.join(KINDS)})")
+    try:
+        predicate = _compile(ast.parse(when, mode='eval').body)
+    except (SyntaxError, ValueError) as e:
+        raise ValueError(f"Alert rule '{name}': {e}") from None
+    return Rule(name, alert, when, predicate)
+
+
+def compile_rules(rules):
+    """Compile rule dicts (name, when, alert) in order"""
+    return [compile_rule(rule['name'], rule['when'], rule['alert']) for rule in rules]
+
+
+def match_rules(rules, columns, count):
+    """Index of the first rule each of ``count`` rows matches, -1 where none does"""
+    if not rules:
+        return np.full(count, -1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        matches = [np.broadcast_to(np.asarray(rule.predicate(columns), dtype=bool), (count,))
+                   for rule in rules]
+    return np.select(matches, np.arange(len(rules)), -1)
@@ -1,253 +1,260 @@
 """Enhanced Alert System with AI-Powered Suggestions"""
+import threading
+import traceback
 import numpy as np
-from config import UNDERSTOCK_CRITICAL, UNDERSTOCK_WARNING, OVERSTOCK_WARNING
+from alert_rules import compile_rules, match_rules
+from config import ALERT_RULES, ALERT_POLL_SECONDS, ALERT_BATCH
+
+# Compiled once; a bad rule fails at import rather than mid-analysis
+RULES = compile_rules(ALERT_RULES)
 
 class AlertSystem:
     """Generate intelligent stock alerts with AI forecasting suggestions"""
     
-    def __init__(self, db):
+    def __init__(self, db, rules=RULES):
         self.db = db
+        self.rules = rules
     
-    def analyze_inventory(self):
-        """Analyze all products and generate alerts with AI suggestions"""
-        products = self.db.get_products()
-        alerts = []
+    def analyze_inventory(self, product_ids=None, dirty=None):
+        """Analyze products and reconcile their stored alerts with AI suggestions
+        
+        Stock, 30-day sales velocity and forecast totals come from three
+        aggregate queries, for the whole catalog or just ``product_ids``.
+        Every product is classified at once against the ALERT_RULES
+        predicates. Stored alerts are raised, updated in place or resolved
+        in one transaction, so repeated runs never duplicate them; ``dirty``
+        marks are cleared in the same transaction (a full run clears every
+        mark it saw).
+        """
+        if product_ids is None and dirty is None:
+            dirty = self.db.get_dirty_products(limit=-1)
+        data = self.db.get_alert_inputs(days=30, product_ids=product_ids)
+        current = data['current_quantity']
+        velocity = data['velocity']
+        days_of_stock = np.where(velocity > 0, current / np.where(velocity > 0, velocity, 1), 999)
+        
+        # First matching rule per product, -1 for none
+        matched = match_rules(self.rules, dict(data, days_of_stock=days_of_stock), len(current))
         
-        for _, product in products.iterrows():
-            product_alerts = self._check_product_with_forecast(product)
-            alerts.extend(product_alerts)
+        builders = {'critical': self._critical_alert, 'warning': self._warning_alert,
+                    'overstock': self._overstock_alert, 'info': self._info_alert}
+        alerts, rows = [], []
+        for i in np.flatnonzero(matched >= 0):
+            rule = self.rules[matched[i]]
+            product = {
+                'pid': int(data['product_id'][i]),
+                'name': data['product_name'][i],
+                'current': int(current[i]),
+                'reorder': int(data['reorder_level'][i]),
+                'max_stock': int(data['max_stock_level'][i]),
+                'purchase_price': float(data['purchase_price'][i]),
+                'selling_price': float(data['selling_price'][i]),
+                'velocity': float(velocity[i]),
+                'days_of_stock': float(days_of_stock[i])
+            }
+            alert, row = builders[rule.alert](product)
+            alert['forecast_demand'] = round(float(data['forecast_demand'][i]), 2)
+            alert['rule'] = rule.name
+            alerts.append(alert)
+            if row is not None:
+                rows.append(row)
         
+        # Products asked for but gone from the catalog get their alerts resolved
+        evaluated = data['product_id'].tolist() if product_ids is None else product_ids
+        self.db.reconcile_alerts(evaluated, rows, dirty or ())
         return alerts
     
-    def _calculate_sales_velocity(self, product_id):
-        """Calculate average daily sales velocity"""
-        try:
-            sales = self.db.get_sales(product_id, days=30)
-            if len(sales) > 0:
-                total_sold = sales['quantity_sold'].sum()
-                days = len(sales['sale_date'].unique())
-                return total_sold / days if days > 0 else 0
-            return 0
-        except:
-            return 0
-    
-    def _check_product_with_forecast(self, product):
-        """Check individual product with AI-powered suggestions"""
-        alerts = []
+    def _critical_alert(self, p):
+        """CRITICAL UNDERSTOCK: the alert and its alerts-table row"""
+        pid, name, current, reorder = p['pid'], p['name'], p['current'], p['reorder']
+        velocity, days_of_stock, purchase_price = p['velocity'], p['days_of_stock'], p['purchase_price']
+        shortage = reorder - current
         
-        pid = product['product_id']
-        name = product['product_name']
-        current = product['current_quantity']
-        reorder = product['reorder_level']
-        max_stock = product['max_stock_level']
-        category = product['category']
-        purchase_price = product['purchase_price']
-        selling_price = product['selling_price']
-        
-        # Calculate sales velocity
-        velocity = self._calculate_sales_velocity(pid)
-        days_of_stock = (current / velocity) if velocity > 0 else 999
+        # AI-powered suggestions
+        if velocity > 0:
+            # Based on sales velocity
+            urgent_qty = int(velocity * 14)  # 2 weeks supply
+            safe_qty = int(velocity * 30)     # 1 month supply
+            
+            suggestion = (
+                f"🚨 IMMEDIATE ACTION REQUIRED:\n"
+                f"• Current Stock: {current} units (CRITICALLY LOW)\n"
+                f"• Sales Velocity: {velocity:.1f} units/day\n"
+                f"• Days Until Stockout: {days_of_stock:.0f} days\n\n"
+                f"📦 ORDERING RECOMMENDATIONS:\n"
+                f"• Minimum Order: {urgent_qty} units (2-week supply)\n"
+                f"• Recommended Order: {safe_qty} units (1-month supply)\n"
+                f"• Cost: ₹{safe_qty * purchase_price:,.0f}\n\n"
+                f"⚡ ACTIONS:\n"
+                f"1. Place URGENT order with your supplier\n"
+                f"2. Consider expedited shipping\n"
+                f"3. Limit sales to prevent stockout\n"
+                f"4. Check with alternate suppliers"
+            )
+        else:
+            suggestion = (
+                f"🚨 CRITICAL STOCK ALERT:\n"
+                f"• Order {shortage + 50} units immediately\n"
+                f"• Cost: ₹{(shortage + 50) * purchase_price:,.0f}\n"
+                f"• This will restore stock to reorder level + safety buffer"
+            )
         
-        # Get 30-day forecast if available
-        forecast_df = self.db.get_forecasts(pid)
-        future_demand = 0
-        if not forecast_df.empty:
-            future_demand = forecast_df['predicted_demand'].sum()
+        alert = {
+            'product_id': pid,
+            'product_name': name,
+            'type': 'understock',
+            'severity': 'critical',
+            'message': f'CRITICAL: {name} will run out in {days_of_stock:.0f} days!',
+            'recommendation': suggestion,
+            'current_stock': current,
+            'reorder_level': reorder,
+            'action_required': True
+        }
+        return alert, (pid, 'understock', 'critical', f'{name} critically low: {current} units', suggestion)
+    
+    def _warning_alert(self, p):
+        """WARNING UNDERSTOCK: the alert and its alerts-table row"""
+        pid, name, current, reorder = p['pid'], p['name'], p['current'], p['reorder']
+        velocity, days_of_stock = p['velocity'], p['days_of_stock']
+        purchase_price, selling_price = p['purchase_price'], p['selling_price']
+        shortage = reorder - current
         
-        # === CRITICAL UNDERSTOCK ===
-        if current <= reorder * UNDERSTOCK_CRITICAL:
-            shortage = reorder - current
-            
-            # AI-powered suggestions
-            if velocity > 0:
-                # Based on sales velocity
-                urgent_qty = int(velocity * 14)  # 2 weeks supply
-                safe_qty = int(velocity * 30)     # 1 month supply
-                
-                suggestion = (
-                    f"🚨 IMMEDIATE ACTION REQUIRED:\n"
-                    f"• Current Stock: {current} units (CRITICALLY LOW)\n"
-                    f"• Sales Velocity: {velocity:.1f} units/day\n"
-                    f"• Days Until Stockout: {days_of_stock:.0f} days\n\n"
-                    f"📦 ORDERING RECOMMENDATIONS:\n"
-                    f"• Minimum Order: {urgent_qty} units (2-week supply)\n"
-                    f"• Recommended Order: {safe_qty} units (1-month supply)\n"
-                    f"• Cost: ₹{safe_qty * purchase_price:,.0f}\n\n"
-                    f"⚡ ACTIONS:\n"
-                    f"1. Place URGENT order with your supplier\n"
-                    f"2. Consider expedited shipping\n"
-                    f"3. Limit sales to prevent stockout\n"
-                    f"4. Check with alternate suppliers"
-                )
-            else:
-                suggestion = (
-                    f"🚨 CRITICAL STOCK ALERT:\n"
-                    f"• Order {shortage + 50} units immediately\n"
-                    f"• Cost: ₹{(shortage + 50) * purchase_price:,.0f}\n"
-                    f"• This will restore stock to reorder level + safety buffer"
-                )
+        if velocity > 0:
+            standard_qty = int(velocity * 21)  # 3 weeks supply
+            optimal_qty = int(velocity * 30)    # 1 month supply
             
-            alerts.append({
-                'product_id': pid,
-                'product_name': name,
-                'type': 'understock',
-                'severity': 'critical',
-                'message': f'CRITICAL: {name} will run out in {days_of_stock:.0f} days!',
-                'recommendation': suggestion,
-                'current_stock': current,
-                'reorder_level': reorder,
-                'action_required': True
-            })
-            
-            self.db.create_alert(pid, 'understock', 'critical',
-                f'{name} critically low: {current} units',
-                suggestion)
+            suggestion = (
+                f"⚠️ LOW STOCK WARNING:\n"
+                f"• Current Stock: {current} units\n"
+                f"• Sales Velocity: {velocity:.1f} units/day\n"
+                f"• Days Remaining: {days_of_stock:.0f} days\n\n"
+                f"📦 SUGGESTED ORDERS:\n"
+                f"• Standard Order: {standard_qty} units (3-week supply)\n"
+                f"  Cost: ₹{standard_qty * purchase_price:,.0f}\n"
+                f"• Optimal Order: {optimal_qty} units (1-month supply)\n"
+                f"  Cost: ₹{optimal_qty * purchase_price:,.0f}\n\n"
+                f"💡 RECOMMENDATIONS:\n"
+                f"• Place order within 3-5 days\n"
+                f"• Expected profit margin: {((selling_price - purchase_price)/purchase_price*100):.1f}%\n"
+                f"• Monitor daily sales closely"
+            )
+        else:
+            suggestion = (
+                f"⚠️ Stock below reorder point\n"
+                f"• Order {shortage + 30} units within next week\n"
+                f"• Cost: ₹{(shortage + 30) * purchase_price:,.0f}"
+            )
         
-        # === WARNING UNDERSTOCK ===
-        elif current <= reorder:
-            shortage = reorder - current
-            
-            if velocity > 0:
-                standard_qty = int(velocity * 21)  # 3 weeks supply
-                optimal_qty = int(velocity * 30)    # 1 month supply
-                
-                suggestion = (
-                    f"⚠️ LOW STOCK WARNING:\n"
-                    f"• Current Stock: {current} units\n"
-                    f"• Sales Velocity: {velocity:.1f} units/day\n"
-                    f"• Days Remaining: {days_of_stock:.0f} days\n\n"
-                    f"📦 SUGGESTED ORDERS:\n"
-                    f"• Standard Order: {standard_qty} units (3-week supply)\n"
-                    f"  Cost: ₹{standard_qty * purchase_price:,.0f}\n"
-                    f"• Optimal Order: {optimal_qty} units (1-month supply)\n"
-                    f"  Cost: ₹{optimal_qty * purchase_price:,.0f}\n\n"
-                    f"💡 RECOMMENDATIONS:\n"
-                    f"• Place order within 3-5 days\n"
-                    f"• Expected profit margin: {((selling_price - purchase_price)/purchase_price*100):.1f}%\n"
-                    f"• Monitor daily sales closely"
-                )
-            else:
-                suggestion = (
-                    f"⚠️ Stock below reorder point\n"
-                    f"• Order {shortage + 30} units within next week\n"
-                    f"• Cost: ₹{(shortage + 30) * purchase_price:,.0f}"
-                )
-            
-            alerts.append({
-                'product_id': pid,
-                'product_name': name,
-                'type': 'understock',
-                'severity': 'warning',
-                'message': f'WARNING: {name} stock running low',
-                'recommendation': suggestion,
-                'current_stock': current,
-                'reorder_level': reorder,
-                'action_required': True
-            })
-            
-            self.db.create_alert(pid, 'understock', 'warning',
-                f'{name} low stock: {current} units',
-                suggestion)
+        alert = {
+            'product_id': pid,
+            'product_name': name,
+            'type': 'understock',
+            'severity': 'warning',
+            'message': f'WARNING: {name} stock running low',
+            'recommendation': suggestion,
+            'current_stock': current,
+            'reorder_level': reorder,
+            'action_required': True
+        }
+        return alert, (pid, 'understock', 'warning', f'{name} low stock: {current} units', suggestion)
+    
+    def _overstock_alert(self, p):
+        """OVERSTOCK: the alert and its alerts-table row"""
+        pid, name, current, max_stock = p['pid'], p['name'], p['current'], p['max_stock']
+        velocity, purchase_price, selling_price = p['velocity'], p['purchase_price'], p['selling_price']
+        excess = current - max_stock
+        holding_cost = excess * purchase_price
         
-        # === OVERSTOCK ===
-        elif current >= max_stock * OVERSTOCK_WARNING:
-            excess = current - max_stock
-            holding_cost = excess * purchase_price
+        # Calculate discount recommendations
+        if velocity > 0:
+            days_to_clear = excess / velocity
             
-            # Calculate discount recommendations
-            if velocity > 0:
-                days_to_clear = excess / velocity
-                
-                # Discount tiers based on severity
-                if days_to_clear > 90:
-                    discount = 30
-                    urgency = "URGENT"
-                elif days_to_clear > 60:
-                    discount = 20
-                    urgency = "HIGH"
-                else:
-                    discount = 15
-                    urgency = "MEDIUM"
-                
-                discounted_price = selling_price * (1 - discount/100)
-                profit_at_discount = discounted_price - purchase_price
-                total_revenue = excess * discounted_price
-                
-                suggestion = (
-                    f"📊 OVERSTOCK ANALYSIS:\n"
-                    f"• Excess Stock: {excess} units ({(excess/max_stock*100):.1f}% over max)\n"
-                    f"• Days to Clear at Current Rate: {days_to_clear:.0f} days\n"
-                    f"• Holding Cost: ₹{holding_cost:,.0f}\n"
-                    f"• Urgency Level: {urgency}\n\n"
-                    f"💰 DISCOUNT STRATEGY:\n"
-                    f"• Recommended Discount: {discount}%\n"
-                    f"• Discounted Price: ₹{discounted_price:.2f} (was ₹{selling_price:.2f})\n"
-                    f"• Profit per Unit: ₹{profit_at_discount:.2f}\n"
-                    f"• Expected Revenue: ₹{total_revenue:,.0f}\n\n"
-                    f"🎯 PROMOTION IDEAS:\n"
-                    f"• 'Buy 2 Get {discount}% Off' deals\n"
-                    f"• Bundle with complementary products\n"
-                    f"• Limited time flash sale\n"
-                    f"• Loyalty program exclusive offer\n\n"
-                    f"📈 EXPECTED OUTCOMES:\n"
-                    f"• Clear excess in ~{int(days_to_clear/2)} days\n"
-                    f"• Free up ₹{holding_cost:,.0f} in capital\n"
-                    f"• Reduce storage costs"
-                )
+            # Discount tiers based on severity
+            if days_to_clear > 90:
+                discount = 30
+                urgency = "URGENT"
+            elif days_to_clear > 60:
+                discount = 20
+                urgency = "HIGH"
             else:
-                discount = min(35, int((excess / max_stock) * 100))
-                suggestion = (
-                    f"📦 OVERSTOCK DETECTED:\n"
-                    f"• Excess: {excess} units\n"
-                    f"• Recommended Action: {discount}% discount\n"
-                    f"• Alternative: Bundle deals or clearance sale"
-                )
+                discount = 15
+                urgency = "MEDIUM"
             
-            alerts.append({
-                'product_id': pid,
-                'product_name': name,
-                'type': 'overstock',
-                'severity': 'warning',
-                'message': f'OVERSTOCK: {name} has excess inventory',
-                'recommendation': suggestion,
-                'current_stock': current,
-                'max_stock': max_stock,
-                'discount_suggestion': discount,
-                'action_required': False
-            })
+            discounted_price = selling_price * (1 - discount/100)
+            profit_at_discount = discounted_price - purchase_price
+            total_revenue = excess * discounted_price
             
-            self.db.create_alert(pid, 'overstock', 'warning',
-                f'{name} overstocked: {current} units',
-                suggestion)
+            suggestion = (
+                f"📊 OVERSTOCK ANALYSIS:\n"
+                f"• Excess Stock: {excess} units ({(excess/max_stock*100):.1f}% over max)\n"
+                f"• Days to Clear at Current Rate: {days_to_clear:.0f} days\n"
+                f"• Holding Cost: ₹{holding_cost:,.0f}\n"
+                f"• Urgency Level: {urgency}\n\n"
+                f"💰 DISCOUNT STRATEGY:\n"
+                f"• Recommended Discount: {discount}%\n"
+                f"• Discounted Price: ₹{discounted_price:.2f} (was ₹{selling_price:.2f})\n"
+                f"• Profit per Unit: ₹{profit_at_discount:.2f}\n"
+                f"• Expected Revenue: ₹{total_revenue:,.0f}\n\n"
+                f"🎯 PROMOTION IDEAS:\n"
+                f"• 'Buy 2 Get {discount}% Off' deals\n"
+                f"• Bundle with complementary products\n"
+                f"• Limited time flash sale\n"
+                f"• Loyalty program exclusive offer\n\n"
+                f"📈 EXPECTED OUTCOMES:\n"
+                f"• Clear excess in ~{int(days_to_clear/2)} days\n"
+                f"• Free up ₹{holding_cost:,.0f} in capital\n"
+                f"• Reduce storage costs"
+            )
+        else:
+            discount = min(35, int((excess / max_stock) * 100))
+            suggestion = (
+                f"📦 OVERSTOCK DETECTED:\n"
+                f"• Excess: {excess} units\n"
+                f"• Recommended Action: {discount}% discount\n"
+                f"• Alternative: Bundle deals or clearance sale"
+            )
         
-        # === OPTIMAL STOCK (INFO) ===
-        elif velocity > 0 and current > reorder and current < max_stock * 0.8:
-            days_remaining = days_of_stock
-            
-            if days_remaining < 14:
-                suggestion = (
-                    f"ℹ️ STOCK STATUS - GOOD:\n"
-                    f"• Current Stock: {current} units\n"
-                    f"• Sales Rate: {velocity:.1f} units/day\n"
-                    f"• Stock will last ~{days_remaining:.0f} days\n\n"
-                    f"📅 PLANNING AHEAD:\n"
-                    f"• Consider reordering in {int(days_remaining - 7)} days\n"
-                    f"• Suggested quantity: {int(velocity * 30)} units\n"
-                    f"• This maintains optimal stock levels"
-                )
-                
-                alerts.append({
-                    'product_id': pid,
-                    'product_name': name,
-                    'type': 'info',
-                    'severity': 'info',
-                    'message': f'INFO: {name} stock healthy, reorder in {int(days_remaining - 7)} days',
-                    'recommendation': suggestion,
-                    'current_stock': current,
-                    'action_required': False
-                })
+        alert = {
+            'product_id': pid,
+            'product_name': name,
+            'type': 'overstock',
+            'severity': 'warning',
+            'message': f'OVERSTOCK: {name} has excess inventory',
+            'recommendation': suggestion,
+            'current_stock': current,
+            'max_stock': max_stock,
+            'discount_suggestion': discount,
+            'action_required': False
+        }
+        return alert, (pid, 'overstock', 'warning', f'{name} overstocked: {current} units', suggestion)
+    
+    def _info_alert(self, p):
+        """OPTIMAL STOCK (INFO): shown, but not stored"""
+        pid, name, current, velocity = p['pid'], p['name'], p['current'], p['velocity']
+        days_remaining = p['days_of_stock']
         
-        return alerts
+        suggestion = (
+            f"ℹ️ STOCK STATUS - GOOD:\n"
+            f"• Current Stock: {current} units\n"
+            f"• Sales Rate: {velocity:.1f} units/day\n"
+            f"• Stock will last ~{days_remaining:.0f} days\n\n"
+            f"📅 PLANNING AHEAD:\n"
+            f"• Consider reordering in {int(days_remaining - 7)} days\n"
+            f"• Suggested quantity: {int(velocity * 30)} units\n"
+            f"• This maintains optimal stock levels"
+        )
+        
+        alert = {
+            'product_id': pid,
+            'product_name': name,
+            'type': 'info',
+            'severity': 'info',
+            'message': f'INFO: {name} stock healthy, reorder in {int(days_remaining - 7)} days',
+            'recommendation': suggestion,
+            'current_stock': current,
+            'action_required': False
+        }
+        return alert, None
     
     def generate_forecast_recommendations(self, product, forecast_data):
         """Generate enhanced recommendations based on forecast"""
@@ -417,4 +424,58 @@ class AlertSystem:
                 )
             })
         
-        return recommendations
\ No newline at end of file
+        return recommendations
+
+
+class AlertEvaluator:
+    """Background thread re-checking the alerts of products whose stock changed
+    
+    Writes mark products in the alert_dirty table and set ``db.alerts_dirty``;
+    the thread wakes on that event (or every ALERT_POLL_SECONDS, to pick up
+    marks from other processes) and evaluates dirty products in batches.
+    """
+    
+    def __init__(self, db, batch=ALERT_BATCH):
+        self.db = db
+        self.alert_system = AlertSystem(db)
+        self.batch = batch
+        self._thread = None
+        self._stop = threading.Event()
+    
+    def start(self):
+        """Start the evaluator thread (idempotent)"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='alert-evaluator', daemon=True)
+        self._thread.start()
+        print("🔔 Alert evaluator started")
+    
+    def stop(self, timeout=5):
+        self._stop.set()
+        self.db.alerts_dirty.set()
+        if self._thread:
+            self._thread.join(timeout)
+        self._thread = None
+    
+    def evaluate_dirty(self):
+        """Re-check dirty products until none are left; returns how many were checked"""
+        checked = 0
+        while not self._stop.is_set():
+            dirty = self.db.get_dirty_products(self.batch)
+            if not dirty:
+                break
+            self.alert_system.analyze_inventory([pid for pid, _ in dirty], dirty)
+            checked += len(dirty)
+        return checked
+    
+    def _run(self):
+        while not self._stop.is_set():
+            # Cleared first, so marks made during a pass trigger another one
+            self.db.alerts_dirty.clear()
+            try:
+                self.evaluate_dirty()
+            except Exception as e:
+                print(f"❌ Alert evaluation error: {str(e)}")
+                traceback.print_exc()
+            self.db.alerts_dirty.wait(ALERT_POLL_SECONDS)
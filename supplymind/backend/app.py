@@ -1,13 +1,19 @@
 """Flask API Server for SupplyMind - ENHANCED VERSION"""
-from flask import Flask, request, jsonify, send_from_directory
+from flask import Flask, Response, request, jsonify, send_from_directory
 from flask_cors import CORS
 from database import Database
-from nbeats_model import NBEATSForecaster
-from alert_system import AlertSystem
+from model_cache import model_cache
+from model_registry import model_registry
+from batch_forecast import forecast_catalog
+from forecast_service import compute_forecast, stored_forecast
+from jobs import JobScheduler, forecast_key
+from events import event_bus, stream_events
+from config import DEBUG, FORECAST_ENGINE, JOBS_ENABLED, ALERTS_INCREMENTAL
+import json
+from alert_system import AlertSystem, AlertEvaluator
 from data_generator import initialize_sample_data
 import os
 import traceback
-from datetime import datetime
 
 app = Flask(__name__, static_folder='../frontend')
 CORS(app)
@@ -15,6 +21,15 @@ CORS(app)
 # Initialize database
 db = Database()
 
+# Map trained models from disk so this worker serves without retraining
+model_registry.open()
+
+# Background jobs (forecast refreshes, nightly run); workers start with the server
+job_scheduler = JobScheduler(db)
+
+# Re-checks alerts of products as their stock changes
+alert_evaluator = AlertEvaluator(db)
+
 @app.route('/')
 def index():
     """Serve the main application"""
@@ -32,6 +47,7 @@ def initialize_system():
     """Initialize system with sample data"""
     try:
         count = initialize_sample_data(db)
+        event_bus.publish('resync', {})
         message = f'Successfully initialized with {count} products and sales history'
         return jsonify({'success': True, 'message': message})
     except Exception as e:
@@ -123,32 +139,23 @@ def update_product(product_id):
     try:
         data = request.json
         
-        update_fields = []
-        values = []
+        fields = {}
         
         if 'product_name' in data:
-            update_fields.append('product_name = ?')
-            values.append(data['product_name'])
+            fields['product_name'] = data['product_name']
         if 'brand' in data:
-            update_fields.append('brand = ?')
-            values.append(data['brand'])
+            fields['brand'] = data['brand']
         if 'category' in data:
-            update_fields.append('category = ?')
-            values.append(data['category'])
+            fields['category'] = data['category']
         if 'purchase_price' in data:
-            update_fields.append('purchase_price = ?')
-            values.append(float(data['purchase_price']))
+            fields['purchase_price'] = float(data['purchase_price'])
         if 'selling_price' in data:
-            update_fields.append('selling_price = ?')
-            values.append(float(data['selling_price']))
+            fields['selling_price'] = float(data['selling_price'])
         
-        if not update_fields:
+        if not fields:
             return jsonify({'success': False, 'error': 'No fields to update'}), 400
         
-        values.append(product_id)
-        query = f"UPDATE products SET {', '.join(update_fields)} WHERE product_id = ?"
-        
-        db.execute_query(query, tuple(values))
+        db.update_product(product_id, fields)
         
         return jsonify({'success': True})
     except Exception as e:
@@ -160,7 +167,7 @@ def update_product(product_id):
 def delete_product(product_id):
     """Delete product"""
     try:
-        db.execute_query('DELETE FROM products WHERE product_id = ?', (product_id,))
+        db.delete_product(product_id)
         return jsonify({'success': True})
     except Exception as e:
         print(f"Delete product error: {str(e)}")
@@ -211,17 +218,17 @@ def create_bill():
         if not items:
             return jsonify({'success': False, 'error': 'No items in cart'}), 400
         
-        # Record each sale
-        total_amount = 0
-        for item in items:
-            db.record_sale(item['product_id'], item['quantity'])
-            total_amount += item['price'] * item['quantity']
+        # Record the whole cart in one transaction
+        checkout = db.record_checkout(items)
         
         return jsonify({
             'success': True,
-            'total_amount': total_amount,
+            'total_amount': checkout['total_amount'],
+            'items': checkout['items'],
             'message': 'Sale completed successfully'
         })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     except Exception as e:
         print(f"Billing error: {str(e)}")
         traceback.print_exc()
@@ -243,12 +250,18 @@ def get_bills():
 
 @app.route('/api/forecast/<int:product_id>', methods=['GET', 'POST'])
 def forecast_product(product_id):
-    """Generate demand forecast for product - INVENTORY based, not sales"""
+    """Generate demand forecast for product - INVENTORY based, not sales
+    
+    Served from the stored forecast while it is fresh; a stale one is
+    served while a background refresh runs. Pass ?refresh=1 to recompute,
+    or ?async=1 to queue the computation and get a job id back.
+    """
     try:
         days = 30
         if request.method == 'POST':
             data = request.json
             days = int(data.get('days', 30))
+        engine = request.args.get('engine', FORECAST_ENGINE)
         
         print(f"\n🔮 API: Forecast request for product {product_id}, {days} days")
         
@@ -260,21 +273,24 @@ def forecast_product(product_id):
                 'error': 'Product not found'
             }), 404
         
-        # Get sales data (minimum 60 days)
-        sales_df = db.get_sales(product_id, days=180)
-        
-        print(f"📊 Found {len(sales_df)} sales records")
-        
-        # Check if we have enough data
-        if sales_df.empty or len(sales_df) < 60:
-            # Generate simple forecast based on current stock and average if available
-            return generate_simple_forecast(product, days)
+        if request.args.get('refresh') != '1':
+            stored = stored_forecast(db, product, days, engine)
+            if stored is not None:
+                result, fresh = stored
+                if not fresh:
+                    job_scheduler.enqueue('forecast_product',
+                                          {'product_id': product_id, 'days': days, 'engine': engine},
+                                          lane='high', dedupe_key=forecast_key(product_id, days, engine))
+                print(f"⚡ API: Stored forecast ({'fresh' if fresh else 'stale, refreshing'})")
+                return jsonify(result)
         
-        # Initialize forecaster
-        forecaster = NBEATSForecaster(db)
+        if request.args.get('async') == '1':
+            job_id = job_scheduler.enqueue('forecast_product',
+                                           {'product_id': product_id, 'days': days, 'engine': engine},
+                                           lane='high', dedupe_key=forecast_key(product_id, days, engine))
+            return jsonify({'success': True, 'queued': True, 'job_id': job_id}), 202
         
-        # Generate forecast
-        result = forecaster.forecast_product(product_id, days)
+        result = compute_forecast(db, product, days, engine)
         
         print(f"✅ API: Forecast result - Success: {result.get('success', False)}")
         
@@ -287,67 +303,115 @@ def forecast_product(product_id):
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
-def generate_simple_forecast(product, days):
-    """Generate simple forecast when not enough historical data"""
-    import random
+@app.route('/api/forecast/batch', methods=['POST'])
+def forecast_batch():
+    """Forecast the whole catalog or one category, streamed as NDJSON
     
-    # Use current stock and reorder level to estimate demand
-    current_stock = product['current_quantity']
-    reorder_level = product['reorder_level']
+    Each line is one product's result, in completion order, followed by a
+    summary line. With {"async": true} the run is queued as a background
+    job instead and its job id returned.
+    """
+    data = request.json or {}
+    category = data.get('category')
+    days = int(data.get('days', 30))
     
-    # Estimate daily demand based on stock levels
-    estimated_daily_demand = max(5, reorder_level / 30)
+    if data.get('async'):
+        job_id = job_scheduler.enqueue('forecast_catalog', {'category': category, 'days': days},
+                                       lane='low', dedupe_key=f'catalog-{category or "all"}')
+        return jsonify({'success': True, 'queued': True, 'job_id': job_id}), 202
     
-    forecast = []
-    for day in range(1, days + 1):
-        # Add some randomness
-        demand = max(0, estimated_daily_demand + random.uniform(-2, 2))
-        
-        forecast.append({
-            'date': (datetime.now() + timedelta(days=day)).strftime('%Y-%m-%d'),
-            'demand': round(demand, 2),
-            'lower': round(demand * 0.8, 2),
-            'upper': round(demand * 1.2, 2)
-        })
-    
-    # Generate basic recommendations
-    total_demand = sum([f['demand'] for f in forecast])
+    def generate():
+        succeeded = failed = 0
+        try:
+            for result in forecast_catalog(db, category=category, days=days):
+                if result['success']:
+                    succeeded += 1
+                else:
+                    failed += 1
+                yield json.dumps(result) + '\n'
+            yield json.dumps({'done': True, 'succeeded': succeeded, 'failed': failed}) + '\n'
+        except Exception as e:
+            print(f"Batch forecast error: {str(e)}")
+            traceback.print_exc()
+            yield json.dumps({'done': True, 'success': False, 'error': str(e)}) + '\n'
     
-    recommendations = []
-    
-    if current_stock < total_demand:
-        shortage = total_demand - current_stock
-        recommendations.append({
-            'type': 'reorder_needed',
-            'priority': 'high' if current_stock < reorder_level else 'medium',
-            'icon': '🚨' if current_stock < reorder_level else '⚠️',
-            'message': f'Based on estimated demand, you will need {int(shortage)} more units',
-            'action': f'ORDER RECOMMENDATION:\n• Quantity: {int(total_demand * 1.2)} units (30-day forecast + 20% buffer)\n• Current stock: {current_stock} units\n• Estimated demand: {int(total_demand)} units'
-        })
-    else:
-        recommendations.append({
-            'type': 'stock_sufficient',
-            'priority': 'low',
-            'icon': '✅',
-            'message': f'Current stock appears sufficient for forecasted demand',
-            'action': f'STOCK STATUS:\n• Current stock: {current_stock} units\n• Estimated 30-day demand: {int(total_demand)} units\n• Stock will last approximately {int(current_stock / estimated_daily_demand)} days'
-        })
-    
-    return jsonify({
-        'success': True,
-        'forecast': forecast,
-        'accuracy': {
-            'accuracy': 70.0,
-            'mae': 2.5,
-            'rmse': 3.0,
-            'r2': 0.7,
-            'mape': 30.0
-        },
-        'recommendations': recommendations,
-        'note': 'Simple forecast generated due to insufficient historical data. Add more sales records for better accuracy.'
-    })
-
-from datetime import timedelta
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/forecast/cache', methods=['GET'])
+def forecast_cache_stats():
+    """Get trained-model cache and registry counters"""
+    try:
+        return jsonify({'success': True, 'cache': model_cache.stats(),
+                        'registry': model_registry.stats()})
+    except Exception as e:
+        print(f"Forecast cache error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/forecast/backtest', methods=['GET'])
+def get_backtest():
+    """Get backtest results per engine, latest run unless ?run_id= is given"""
+    try:
+        results = db.get_backtest_results(request.args.get('run_id'))
+        return jsonify({'success': True, 'results': results})
+    except Exception as e:
+        print(f"Backtest results error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/forecast/backtest', methods=['POST'])
+def start_backtest():
+    """Queue a backtest run as a background job"""
+    try:
+        data = request.json or {}
+        job_id = job_scheduler.enqueue('backtest', data, lane='low', dedupe_key='backtest')
+        return jsonify({'success': True, 'queued': True, 'job_id': job_id}), 202
+    except Exception as e:
+        print(f"Backtest error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+# ==================== JOB ENDPOINTS ====================
+
+@app.route('/api/jobs', methods=['GET'])
+def get_jobs():
+    """Get scheduler status, job counts per lane and recent jobs"""
+    try:
+        limit = int(request.args.get('limit', 50))
+        jobs = job_scheduler.queue.recent(limit, status=request.args.get('status'))
+        return jsonify({'success': True, 'scheduler': job_scheduler.status(), 'jobs': jobs})
+    except Exception as e:
+        print(f"Jobs error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs', methods=['POST'])
+def enqueue_job():
+    """Queue a background job"""
+    try:
+        data = request.json or {}
+        job_id = job_scheduler.enqueue(data['kind'], data.get('payload'),
+                                       lane=data.get('lane', 'normal'))
+        return jsonify({'success': True, 'job_id': job_id}), 202
+    except (KeyError, ValueError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"Enqueue job error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/api/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get one job's status and result"""
+    try:
+        job = job_scheduler.queue.get(job_id)
+        if job:
+            return jsonify({'success': True, 'job': job})
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    except Exception as e:
+        print(f"Job get error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
 
 # ==================== ALERT ENDPOINTS ====================
 
@@ -379,9 +443,7 @@ def get_alerts():
 def analyze_alerts():
     """Analyze inventory and generate alerts"""
     try:
-        # Clear existing alerts
-        db.execute_query("DELETE FROM alerts")
-        
+        # Existing alerts are updated or resolved in place, not cleared
         alert_system = AlertSystem(db)
         alerts = alert_system.analyze_inventory()
         return jsonify({'success': True, 'alerts': alerts})
@@ -394,13 +456,21 @@ def analyze_alerts():
 def resolve_alert(alert_id):
     """Mark alert as resolved"""
     try:
-        db.execute_query('UPDATE alerts SET resolved = 1 WHERE alert_id = ?', (alert_id,))
+        db.resolve_alert(alert_id)
         return jsonify({'success': True})
     except Exception as e:
         print(f"Resolve alert error: {str(e)}")
         traceback.print_exc()
         return jsonify({'success': False, 'error': str(e)}), 500
 
+# ==================== LIVE UPDATES ====================
+
+@app.route('/api/stream', methods=['GET'])
+def stream():
+    """Server-sent events: alert, stock and stats deltas as they are written"""
+    return Response(stream_events(event_bus), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 # ==================== ANALYTICS ENDPOINTS ====================
 
 @app.route('/api/analytics/sales', methods=['GET'])
@@ -409,60 +479,61 @@ def get_sales_analytics():
     try:
         days = int(request.args.get('days', 30))
         
+        # All four aggregates read the daily_sales rollup
         # Daily sales
-        daily_query = f"""
+        daily_query = """
             SELECT 
-                sale_date,
-                SUM(quantity_sold) as quantity_sold,
+                day as sale_date,
+                SUM(qty) as quantity_sold,
                 SUM(revenue) as revenue
-            FROM sales
-            WHERE sale_date >= date('now', '-{days} days')
-            GROUP BY sale_date
-            ORDER BY sale_date
+            FROM daily_sales
+            WHERE day >= date('now', '-' || ? || ' days')
+            GROUP BY day
+            ORDER BY day
         """
-        daily_sales = db.execute_query(daily_query)
+        daily_sales = db.execute_query(daily_query, (days,))
         
         # Category performance
-        category_query = f"""
+        category_query = """
             SELECT 
                 p.category,
-                SUM(s.quantity_sold) as units,
-                SUM(s.revenue) as revenue
-            FROM sales s
-            JOIN products p ON s.product_id = p.product_id
-            WHERE s.sale_date >= date('now', '-{days} days')
+                SUM(d.qty) as units,
+                SUM(d.revenue) as revenue
+            FROM daily_sales d
+            JOIN products p ON d.product_id = p.product_id
+            WHERE d.day >= date('now', '-' || ? || ' days')
             GROUP BY p.category
             ORDER BY revenue DESC
         """
-        category_performance = db.execute_query(category_query)
+        category_performance = db.execute_query(category_query, (days,))
         
         # Top products
-        top_products_query = f"""
+        top_products_query = """
             SELECT 
                 p.product_name,
                 p.brand,
                 p.category,
-                SUM(s.quantity_sold) as quantity_sold,
-                SUM(s.revenue) as revenue
-            FROM sales s
-            JOIN products p ON s.product_id = p.product_id
-            WHERE s.sale_date >= date('now', '-{days} days')
-            GROUP BY s.product_id
+                SUM(d.qty) as quantity_sold,
+                SUM(d.revenue) as revenue
+            FROM daily_sales d
+            JOIN products p ON d.product_id = p.product_id
+            WHERE d.day >= date('now', '-' || ? || ' days')
+            GROUP BY d.product_id
             ORDER BY revenue DESC
             LIMIT 10
         """
-        top_products = db.execute_query(top_products_query)
+        top_products = db.execute_query(top_products_query, (days,))
         
         # Summary stats
-        summary_query = f"""
+        summary_query = """
             SELECT 
-                SUM(quantity_sold) as total_sales,
+                SUM(qty) as total_sales,
                 SUM(revenue) as total_revenue,
-                AVG(revenue) as avg_sale_value
-            FROM sales
-            WHERE sale_date >= date('now', '-{days} days')
+                SUM(revenue) / SUM(sales_count) as avg_sale_value
+            FROM daily_sales
+            WHERE day >= date('now', '-' || ? || ' days')
         """
-        summary = db.execute_query(summary_query)
+        summary = db.execute_query(summary_query, (days,))
         
         analytics = {
             'daily_sales': daily_sales or [],
@@ -547,4 +618,11 @@ if __name__ == '__main__':
     print("✅ Server is ready!")
     print("=" * 60)
     
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Under the debug reloader only the serving child runs jobs
+    serving = not DEBUG or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'
+    if JOBS_ENABLED and serving:
+        job_scheduler.start()
+    if ALERTS_INCREMENTAL and serving:
+        alert_evaluator.start()
+    
+    app.run(host='0.0.0.0', port=5000, debug=DEBUG)
\ No newline at end of file
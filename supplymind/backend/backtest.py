@@ -0,0 +1,313 @@
+"""Rolling-origin backtesting of forecast engines
+
+Every engine is scored on the same (product, origin) pairs: for each of
+the last BACKTEST_FOLDS origins, BACKTEST_STEP days apart, it is trained
+on the history before the origin and forecasts the next horizon days,
+which are compared with what actually sold. A pair counts once the
+product has MIN_TRAINING_SAMPLES days of history before the origin.
+
+Per-product engines are fanned out over a process pool in chunks of
+products; pooled engines refit the whole catalog once per origin, so
+each origin is one task. Workers get plain arrays and never open the
+database. Results (MAE, RMSE, MAPE, bias and training and inference
+time) are written to the backtest_results table, one row per engine.
+"""
+import contextlib
+import io
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import numpy as np
+
+from config import (BACKTEST_ENGINES, BACKTEST_FOLDS, BACKTEST_HISTORY_DAYS, BACKTEST_HORIZON,
+                    BACKTEST_NBEATS_EPOCHS, BACKTEST_STEP, FORECAST_WORKERS, GLOBAL_MIN_DAYS,
+                    MIN_TRAINING_SAMPLES)
+from global_model import GlobalForecaster, daily_matrix
+from inference import ROLLOUT_WINDOW
+
+# Running sums kept per engine; every worker returns one such vector
+STATS = ['forecasts', 'points', 'abs_error', 'sq_error', 'error', 'pct_error', 'pct_points',
+         'fits', 'train_seconds', 'inference_seconds']
+S = {name: i for i, name in enumerate(STATS)}
+
+
+# ==================== PER-PRODUCT ENGINES ====================
+# fit(product, values, dates) -> model or None; predict(model, horizon) -> array
+
+def _fit_naive(product, values, dates):
+    return values[-7:]
+
+
+def _predict_naive(last_week, horizon):
+    """Seasonal naive: repeat the last observed week"""
+    return np.resize(last_week, horizon)
+
+
+def _fit_simple(product, values, dates):
+    return product
+
+
+def _predict_simple(product, horizon):
+    from forecast_service import generate_simple_forecast
+
+    return np.array([row['demand'] for row in generate_simple_forecast(product, horizon)['forecast']])
+
+
+def _fit_intermittent(product, values, dates):
+    from intermittent import demand_rates
+
+    return demand_rates(values[np.newaxis])[0]
+
+
+def _predict_intermittent(rate, horizon):
+    return np.full(horizon, rate)
+
+
+def _fit_ridge(product, values, dates):
+    import pandas as pd
+    from nbeats_model import NBEATSForecaster
+
+    forecaster = NBEATSForecaster(None)
+    sales = pd.DataFrame({'sale_date': dates.astype(str), 'quantity_sold': values})
+    success, _ = forecaster.train(sales)
+    return forecaster if success else None
+
+
+def _predict_ridge(forecaster, horizon):
+    return np.array([row['demand'] for row in forecaster.predict(horizon)])
+
+
+def _fit_hybrid(product, values, dates):
+    from hybrid_engine import fit_series
+
+    model, _ = fit_series(values, dates)
+    return model
+
+
+def _predict_hybrid(model, horizon):
+    return np.array([row['predicted_demand'] for row in model.predict(horizon)])
+
+
+def _fit_online(product, values, dates):
+    from online_model import OnlineModel
+
+    # The last training day becomes the (complete) open day
+    model = OnlineModel.bootstrap(values, dates)
+    return model if model.count > 0 else None
+
+
+def _predict_online(model, horizon):
+    return model.forecast(horizon)
+
+
+PRODUCT_ENGINES = {
+    'naive': (_fit_naive, _predict_naive),
+    'simple': (_fit_simple, _predict_simple),
+    'intermittent': (_fit_intermittent, _predict_intermittent),
+    'ridge': (_fit_ridge, _predict_ridge),
+    'online': (_fit_online, _predict_online),
+    'hybrid': (_fit_hybrid, _predict_hybrid),
+}
+
+
+# ==================== POOLED ENGINES ====================
+# fit(products, matrix, end_date) -> model or None
+# predict(model, rows, products, matrix, first_date, horizon) -> (rows covered, predictions)
+
+def _fit_global(products, matrix, end_date):
+    model = GlobalForecaster()
+    success, _ = model.train(matrix, products, end_date)
+    return model if success else None
+
+
+def _predict_global(model, rows, products, matrix, first_date, horizon):
+    rows = [i for i in rows if model.covers(products[i]['product_id'])]
+    if not rows:
+        return rows, np.empty((0, horizon))
+    ids = [products[i]['product_id'] for i in rows]
+    return rows, model.rollout(ids, matrix[rows, -ROLLOUT_WINDOW:], first_date, horizon)
+
+
+def _fit_nbeats(products, matrix, end_date):
+    from nbeats_engine import NBeatsEngine
+
+    keep = (matrix > 0).sum(axis=1) >= GLOBAL_MIN_DAYS
+    ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+    engine = NBeatsEngine()
+    success, _ = engine.train(matrix[keep], ids[keep], end_date, max_epochs=BACKTEST_NBEATS_EPOCHS,
+                              checkpoint_path=None, threads=1, log=lambda *args: None)
+    return engine if success else None
+
+
+def _predict_nbeats(engine, rows, products, matrix, first_date, horizon):
+    if horizon > engine.horizon:
+        raise ValueError(f"N-BEATS forecasts {engine.horizon} days, backtest horizon is {horizon}")
+    rows = [i for i in rows if engine.covers(products[i]['product_id'])]
+    return rows, engine.predict_history(matrix[rows, -engine.network.context:], horizon)
+
+
+POOLED_ENGINES = {
+    'global': (_fit_global, _predict_global),
+    'nbeats': (_fit_nbeats, _predict_nbeats),
+}
+
+ENGINES = list(PRODUCT_ENGINES) + list(POOLED_ENGINES)
+
+
+def _score(stats, actual, predicted):
+    """Add one forecast's errors to the running sums"""
+    error = np.asarray(predicted, dtype=np.float64) - actual
+    sold = actual > 0
+    stats[S['forecasts']] += 1
+    stats[S['points']] += len(actual)
+    stats[S['abs_error']] += np.abs(error).sum()
+    stats[S['sq_error']] += (error * error).sum()
+    stats[S['error']] += error.sum()
+    stats[S['pct_error']] += (np.abs(error[sold]) / actual[sold]).sum()
+    stats[S['pct_points']] += sold.sum()
+
+
+def _backtest_products(engine, products, matrix, dates, firsts, origins, horizon):
+    """Worker: every origin of a chunk of products for a per-product engine"""
+    fit, predict = PRODUCT_ENGINES[engine]
+    stats = np.zeros(len(STATS))
+    evaluated = set()
+
+    # Engines print training progress; keep worker output quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        for product, series, first in zip(products, matrix, firsts):
+            for origin in origins:
+                if origin - first < MIN_TRAINING_SAMPLES:
+                    continue
+                start = time.perf_counter()
+                model = fit(product, series[first:origin], dates[first:origin])
+                trained = time.perf_counter()
+                stats[S['fits']] += 1
+                stats[S['train_seconds']] += trained - start
+                if model is None:
+                    continue
+
+                predicted = predict(model, horizon)
+                stats[S['inference_seconds']] += time.perf_counter() - trained
+                _score(stats, series[origin:origin + horizon], predicted)
+                evaluated.add(product['product_id'])
+
+    return engine, stats, evaluated
+
+
+def _backtest_origin(engine, products, matrix, dates, firsts, origin, horizon):
+    """Worker: one catalog-wide refit of a pooled engine at one origin"""
+    fit, predict = POOLED_ENGINES[engine]
+    stats = np.zeros(len(STATS))
+    rows = np.flatnonzero(origin - firsts >= MIN_TRAINING_SAMPLES).tolist()
+    if not rows:
+        return engine, stats, set()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        model = fit(products, matrix[:, :origin], dates[origin - 1])
+        trained = time.perf_counter()
+        stats[S['fits']] += 1
+        stats[S['train_seconds']] += trained - start
+        if model is None:
+            return engine, stats, set()
+
+        rows, predictions = predict(model, rows, products, matrix[:, :origin], dates[origin], horizon)
+        stats[S['inference_seconds']] += time.perf_counter() - trained
+
+    for i, predicted in zip(rows, predictions):
+        _score(stats, matrix[i, origin:origin + horizon], predicted)
+    return engine, stats, {products[i]['product_id'] for i in rows}
+
+
+def backtest_origins(n_days, folds=BACKTEST_FOLDS, horizon=BACKTEST_HORIZON, step=BACKTEST_STEP):
+    """Column indices of the forecast origins, oldest first"""
+    last = n_days - horizon
+    return [origin for origin in range(last - (folds - 1) * step, last + 1, step) if origin > 0]
+
+
+def summarize(engine, stats, products):
+    """Metrics for one engine from its running sums"""
+    points = max(stats[S['points']], 1)
+    return {
+        'engine': engine,
+        'products': len(products),
+        'forecasts': int(stats[S['forecasts']]),
+        'mae': float(stats[S['abs_error']] / points),
+        'rmse': float(np.sqrt(stats[S['sq_error']] / points)),
+        'mape': float(stats[S['pct_error']] / max(stats[S['pct_points']], 1) * 100),
+        'bias': float(stats[S['error']] / points),   # positive means over-forecasting
+        'train_seconds': float(stats[S['train_seconds']]),
+        'inference_seconds': float(stats[S['inference_seconds']]),
+        'fits': int(stats[S['fits']])
+    }
+
+
+def run_backtest(db, engines=None, category=None, folds=BACKTEST_FOLDS, horizon=BACKTEST_HORIZON,
+                 step=BACKTEST_STEP, workers=FORECAST_WORKERS, save=True):
+    """Backtest engines over the catalog (or one category)
+
+    Returns (run_id, results) with one result dict per engine, best MAE
+    first. Results are saved to backtest_results unless ``save`` is False.
+    """
+    engines = list(engines or BACKTEST_ENGINES)
+    unknown = [engine for engine in engines if engine not in ENGINES]
+    if unknown:
+        raise ValueError(f"Unknown engines: {', '.join(unknown)} (choose from {', '.join(ENGINES)})")
+
+    products = db.get_products_by_category(category) if category else db.get_all_products()
+    sales = db.get_daily_sales(days=BACKTEST_HISTORY_DAYS)
+    if sales.empty or not products:
+        raise ValueError("No sales history to backtest")
+
+    end_date = np.datetime64(sales['sale_date'].max(), 'D')
+    dates = end_date - np.arange(BACKTEST_HISTORY_DAYS)[::-1]
+    ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+    matrix = daily_matrix(sales, ids, end_date, BACKTEST_HISTORY_DAYS)
+
+    sold = matrix.sum(axis=1) > 0
+    products = [p for p, keep in zip(products, sold) if keep]
+    matrix = matrix[sold]
+    firsts = np.argmax(matrix > 0, axis=1)
+
+    origins = backtest_origins(matrix.shape[1], folds, horizon, step)
+    if not origins:
+        raise ValueError(f"Need more than {horizon} days of history to backtest")
+
+    print(f"🧪 Backtest: {len(products)} products, {len(origins)} origins, "
+          f"{horizon}-day horizon, engines: {', '.join(engines)}")
+
+    totals = {engine: np.zeros(len(STATS)) for engine in engines}
+    evaluated = {engine: set() for engine in engines}
+    chunks = np.array_split(np.arange(len(products)), max(1, min(len(products), workers * 4)))
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for engine in engines:
+            if engine in POOLED_ENGINES:
+                for origin in origins:
+                    futures.append(pool.submit(_backtest_origin, engine, products, matrix, dates,
+                                               firsts, origin, horizon))
+                continue
+            for chunk in chunks:
+                futures.append(pool.submit(_backtest_products, engine,
+                                           [products[i] for i in chunk], matrix[chunk], dates,
+                                           firsts[chunk], origins, horizon))
+
+        for future in as_completed(futures):
+            engine, stats, done = future.result()
+            totals[engine] += stats
+            evaluated[engine] |= done
+
+    results = []
+    for engine in engines:
+        result = summarize(engine, totals[engine], evaluated[engine])
+        result.update({'category': category, 'folds': len(origins), 'horizon': horizon})
+        results.append(result)
+    results.sort(key=lambda r: r['mae'] if r['forecasts'] else float('inf'))
+
+    run_id = datetime.now().strftime('%Y%m%d-%H%M%S')
+    if save:
+        db.save_backtest_results(run_id, results)
+    return run_id, results
@@ -0,0 +1,118 @@
+"""Catalog-wide batch forecasting on a process pool
+
+The parent process reads every product's daily sales in one query, fans
+training out to worker processes, and writes finished forecasts back in
+bulk. Workers never open the database; the models they train are
+returned with the results and added to the model registry. Sparse
+products skip the pool: the intermittent-demand engine forecasts all of
+them in the parent in one vectorized pass.
+"""
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from config import FORECAST_DAYS, FORECAST_HISTORY_DAYS, FORECAST_SAVE_BATCH, FORECAST_WORKERS
+from global_model import daily_matrix
+from intermittent import forecast_intermittent, is_sparse
+from model_registry import model_registry, params_key
+
+
+def _forecast_one(product, sales_df, days, params=None):
+    """Worker: train and forecast one product"""
+    from nbeats_model import NBEATSForecaster
+
+    forecaster = NBEATSForecaster(None, params=params)
+    result = forecaster.forecast_from_sales(sales_df, product, days)
+    if result['success']:
+        result['state'] = forecaster.get_state()
+    result['product_id'] = product['product_id']
+    result['product_name'] = product['product_name']
+    return result
+
+
+def forecast_catalog(db, category=None, days=FORECAST_DAYS, workers=FORECAST_WORKERS):
+    """Forecast every product (or one category), yielding results as they finish
+
+    Successful forecasts are saved in batches of FORECAST_SAVE_BATCH with
+    one transaction per batch.
+    """
+    if category:
+        products = db.get_products_by_category(category)
+    else:
+        products = db.get_all_products()
+
+    # Watermarks first: a sale landing mid-read only makes a model look older
+    versions = db.get_sales_versions()
+    sales = db.get_daily_sales(days=FORECAST_HISTORY_DAYS)
+    history = {pid: frame for pid, frame in sales.groupby('product_id')}
+    tuned = {pid: {key: row[key] for key in ('alpha', 'lookback', 'features')}
+             for pid, row in db.get_all_tuned_params().items()}
+
+    # Sparse products: complete days up to yesterday, forecast from today
+    yesterday = np.datetime64('today', 'D') - 1
+    ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+    matrix = daily_matrix(sales, ids, yesterday, FORECAST_HISTORY_DAYS)
+    sparse = is_sparse(matrix)
+    sparse_products = [p for p, flag in zip(products, sparse) if flag]
+
+    sparse_results = forecast_intermittent(sparse_products, matrix[sparse], yesterday + 1, days)
+    if sparse_results:
+        db.save_forecasts([(p['product_id'], r['forecast'], r['accuracy']['accuracy'],
+                            {'sales_version': versions.get(p['product_id'], 0),
+                             'engine': 'intermittent', 'metrics': r['accuracy']})
+                           for p, r in zip(sparse_products, sparse_results)])
+    for product, result in zip(sparse_products, sparse_results):
+        result['product_id'] = product['product_id']
+        result['product_name'] = product['product_name']
+        yield result
+
+    pending = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        try:
+            for product, flag in zip(products, sparse):
+                frame = history.get(product['product_id'])
+                if flag:
+                    continue
+                if frame is None:
+                    yield {
+                        'product_id': product['product_id'],
+                        'product_name': product['product_name'],
+                        'success': False,
+                        'error': 'No sales history to forecast from.'
+                    }
+                    continue
+                futures[pool.submit(_forecast_one, product, frame, days,
+                                    tuned.get(product['product_id']))] = product
+
+            for future in as_completed(futures):
+                product = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {
+                        'product_id': product['product_id'],
+                        'product_name': product['product_name'],
+                        'success': False,
+                        'error': str(e)
+                    }
+
+                if result['success']:
+                    pid = result['product_id']
+                    model_registry.put(pid, versions.get(pid, 0), result.pop('state'),
+                                       params_key(tuned.get(pid)))
+                    pending.append((pid, result['forecast'], result['accuracy']['accuracy'],
+                                    {'sales_version': versions.get(pid, 0), 'engine': 'ridge',
+                                     'metrics': result['accuracy']}))
+                    if len(pending) >= FORECAST_SAVE_BATCH:
+                        db.save_forecasts(pending)
+                        pending = []
+
+                yield result
+        finally:
+            # Stop queued work if the consumer went away early
+            for future in futures:
+                future.cancel()
+            if pending:
+                db.save_forecasts(pending)
+            model_registry.flush()
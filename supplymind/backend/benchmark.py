@@ -0,0 +1,684 @@
+"""Performance benchmarks for SupplyMind
+
+Run from the backend directory against a scratch database:
+
+    python benchmark.py plans
+    python benchmark.py stock --threads 16 --stock 2000
+    python benchmark.py sequences --products 50
+    python benchmark.py predict --products 50 --horizon 365
+    python benchmark.py direct --products 50
+    python benchmark.py nbeats --products 500 --days 365 --epochs 2
+    python benchmark.py online --products 50
+    python benchmark.py inference --products 500
+    python benchmark.py alerts --products 5000 --days 30
+    python benchmark.py rules --products 20000
+    python benchmark.py intermittent --products 5000
+    python benchmark.py hybrid --products 5
+"""
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from config import CATEGORIES, NBEATS_CONFIG, NBEATS_THREADS
+from database import Database
+from features import FEATURE_COLS, build_features, training_windows
+from inference import predict_linear
+from nbeats_engine import NBeatsEngine
+from nbeats_model import NBEATSForecaster, predict_batch
+from online_model import OnlineModel
+
+# (name, query, params, index the plan must use)
+HOT_QUERIES = [
+    ('get_sales(product_id)',
+     '''SELECT s.*, p.product_name, p.category
+        FROM sales s JOIN products p ON s.product_id = p.product_id
+        WHERE s.product_id = ? AND s.sale_date >= date('now', '-' || ? || ' days')
+        ORDER BY s.sale_date''',
+     (1, 180), 'idx_sales_product_date'),
+    ('get_sales()',
+     '''SELECT s.*, p.product_name, p.category
+        FROM sales s JOIN products p ON s.product_id = p.product_id
+        WHERE s.sale_date >= date('now', '-' || ? || ' days')
+        ORDER BY s.sale_date''',
+     (30,), 'idx_sales_date'),
+    ('analytics daily sales',
+     '''SELECT day, SUM(qty), SUM(revenue)
+        FROM daily_sales WHERE day >= date('now', '-30 days')
+        GROUP BY day ORDER BY day''',
+     (), 'idx_daily_sales_day'),
+    ('monthly revenue',
+     '''SELECT SUM(revenue) FROM daily_sales
+        WHERE day >= date('now', '-30 days')''',
+     (), 'idx_daily_sales_day'),
+    ('daily sales(product_id)',
+     '''SELECT day, qty, revenue FROM daily_sales
+        WHERE product_id = ? AND day >= date('now', '-' || ? || ' days')
+        ORDER BY day''',
+     (1, 180), 'PRIMARY KEY'),
+    ('active alerts',
+     '''SELECT a.*, p.product_name, p.brand, p.category, p.current_quantity
+        FROM alerts a JOIN products p ON a.product_id = p.product_id
+        WHERE a.resolved = 0
+        ORDER BY CASE a.severity WHEN 'critical' THEN 1 WHEN 'warning' THEN 2 ELSE 3 END,
+                 a.created_at DESC''',
+     (), 'idx_alerts_active'),
+    ('active alert count',
+     'SELECT COUNT(*) FROM alerts WHERE resolved = 0',
+     (), 'idx_alerts_active'),
+    ('product transactions',
+     '''SELECT * FROM transactions WHERE product_id = ?
+        ORDER BY transaction_date DESC''',
+     (1,), 'idx_transactions_product_date'),
+]
+
+
+def seed_database(db, products=200, days=180):
+    """Fill a scratch database with synthetic products, sales and alerts"""
+    conn = db.get_conn()
+    categories = list(CATEGORIES)
+    today = datetime.now()
+
+    conn.executemany(
+        '''INSERT INTO products (product_name, brand, category, purchase_price,
+            selling_price, current_quantity, reorder_level, max_stock_level)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+        [(f'Product {i}', f'Brand {i % 20}', categories[i % len(categories)],
+          100.0, 150.0, random.randint(0, 500), 50, 500) for i in range(products)])
+    product_ids = [row[0] for row in conn.execute('SELECT product_id FROM products')]
+
+    sales = []
+    transactions = []
+    for pid in product_ids:
+        for day in range(days):
+            date = (today - timedelta(days=days - day)).strftime('%Y-%m-%d')
+            qty = random.randint(1, 15)
+            sales.append((pid, qty, date, 150.0, qty * 150.0))
+            transactions.append((pid, 'sale', -qty, date, f'Sale on {date}'))
+    conn.executemany(
+        '''INSERT INTO sales (product_id, quantity_sold, sale_date, selling_price, revenue)
+            VALUES (?, ?, ?, ?, ?)''', sales)
+    conn.executemany(
+        '''INSERT INTO transactions (product_id, type, quantity, transaction_date, notes)
+            VALUES (?, ?, ?, ?, ?)''', transactions)
+
+    conn.executemany(
+        '''INSERT INTO alerts (product_id, alert_type, severity, message, recommendation, resolved)
+            VALUES (?, ?, ?, ?, ?, ?)''',
+        [(pid, 'understock', random.choice(['critical', 'warning', 'info']),
+          'Benchmark alert', '', random.randint(0, 1)) for pid in product_ids])
+    conn.commit()
+    db.rebuild_daily_sales()
+    conn.execute('ANALYZE')
+    return product_ids
+
+
+def scratch_database(products, days):
+    """Create a seeded database in a temporary directory"""
+    path = os.path.join(tempfile.mkdtemp(prefix='supplymind-bench-'), 'bench.db')
+    db = Database(path)
+    seed_database(db, products, days)
+    return db
+
+
+def time_query(conn, query, params, repeat=20):
+    """Average wall time of a query in milliseconds"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(query, params).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def bench_query_plans(args):
+    """Check that hot queries use their indexes"""
+    db = scratch_database(args.products, args.days)
+    conn = db.get_read_conn()
+    failures = 0
+
+    print(f"\n📊 Query plans ({args.products} products x {args.days} days)")
+    for name, query, params, index in HOT_QUERIES:
+        plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {query}', params)]
+        uses_index = any(index in step for step in plan)
+        failures += not uses_index
+        ms = time_query(conn, query, params)
+        status = '✅' if uses_index else '❌'
+        print(f"{status} {name:<24} {ms:8.2f} ms  {' | '.join(plan)}")
+
+    db.close()
+    return failures
+
+
+def bench_stock_contention(args):
+    """Sell one product from many threads and check stock never goes negative"""
+    path = os.path.join(tempfile.mkdtemp(prefix='supplymind-bench-'), 'bench.db')
+    db = Database(path)
+    pid = db.add_product('Contended Product', 'Bench', 'Electronics', 100.0, 150.0, args.stock)
+
+    sold = []
+    rejected = []
+    negative = []
+    lock = threading.Lock()
+    start_gate = threading.Barrier(args.threads)
+
+    def seller():
+        ok = failed = 0
+        start_gate.wait()
+        # Every thread tries to sell more than its share of the stock
+        for _ in range(args.stock // args.threads * 2):
+            try:
+                remaining = db.record_sale(pid, 1)
+                ok += 1
+                if remaining < 0:
+                    negative.append(remaining)
+            except ValueError:
+                failed += 1
+        with lock:
+            sold.append(ok)
+            rejected.append(failed)
+
+    threads = [threading.Thread(target=seller) for _ in range(args.threads)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    final = db.get_product(pid)['current_quantity']
+    sales_rows = db.execute_query('SELECT COALESCE(SUM(quantity_sold), 0) AS n FROM sales')[0]['n']
+    total_sold = sum(sold)
+    db.close()
+
+    consistent = (final >= 0 and not negative and total_sold == sales_rows
+                  and total_sold + final == args.stock)
+    status = '✅' if consistent else '❌'
+    print(f"\n📊 Stock contention ({args.threads} threads, {args.stock} units)")
+    print(f"{status} sold={total_sold} rejected={sum(rejected)} final_stock={final} "
+          f"sales_rows={sales_rows}")
+    print(f"⚡ {total_sold / elapsed:,.0f} sales/sec")
+    return 0 if consistent else 1
+
+
+def synthetic_series(products, days, seed=42):
+    """Daily demand for several products with weekly seasonality"""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range(end=datetime.now().date(), periods=days, freq='D')
+    base = rng.uniform(3, 15, size=(products, 1))
+    weekend = np.where(dates.dayofweek >= 5, 1.4, 1.0)
+    values = np.maximum(1, rng.normal(base * weekend, base * 0.2)).round()
+    return dates, values
+
+
+def _loop_sequences(data, lookback):
+    """Reference per-row window builder (the original create_sequences)"""
+    X, y = [], []
+    for i in range(lookback, len(data)):
+        X.append(data[FEATURE_COLS].iloc[i-lookback:i].values.flatten())
+        y.append(data['value'].iloc[i])
+    return np.array(X), np.array(y)
+
+
+def bench_sequences(args):
+    """Per-row DataFrame windows vs strided NumPy windows"""
+    lookback = 30
+    dates, values = synthetic_series(args.products, args.days)
+    frames = []
+    for series in values:
+        features = build_features(series, dates.values)
+        frame = pd.DataFrame(features.astype(np.float64), columns=FEATURE_COLS)
+        frame.insert(0, 'date', dates)
+        frames.append(frame)
+
+    start = time.perf_counter()
+    loop_results = [_loop_sequences(frame, lookback) for frame in frames]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single_results = [training_windows(frame[FEATURE_COLS].to_numpy(dtype=np.float32), lookback)
+                      for frame in frames]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    X_batch, y_batch = training_windows(build_features(values, dates.values), lookback)
+    batch_time = time.perf_counter() - start
+
+    matches = all(np.allclose(a[0], b[0], atol=1e-4) and np.allclose(a[1], b[1])
+                  for a, b in zip(loop_results, single_results))
+    matches = matches and np.allclose(X_batch[-1], loop_results[-1][0], atol=1e-4)
+
+    windows = sum(len(r[1]) for r in loop_results)
+    print(f"\n📊 Sliding windows ({args.products} series x {args.days} days, "
+          f"{windows} windows)")
+    print(f"   per-row loop:         {loop_time * 1000:10.2f} ms")
+    print(f"   strided, per series:  {single_time * 1000:10.2f} ms  "
+          f"({loop_time / single_time:,.0f}x)")
+    print(f"   strided, batch+feats: {batch_time * 1000:10.2f} ms  "
+          f"({loop_time / batch_time:,.0f}x)  X {X_batch.shape} {X_batch.dtype}")
+    print(f"{'✅' if matches else '❌'} outputs match")
+    return 0 if matches else 1
+
+
+def _legacy_predict(forecaster, days):
+    """Reference DataFrame rollout (the original NBEATSForecaster.predict)"""
+    data = forecaster.training_data.copy()
+    last_date = data['date'].max()
+    forecasts = []
+
+    for day in range(1, days + 1):
+        recent = data.tail(30).copy()
+        next_date = last_date + timedelta(days=day)
+        values = recent['value']
+        row = {
+            'value': values.iloc[-1],
+            'day_of_week': next_date.weekday(),
+            'day_of_month': next_date.day,
+            'month': next_date.month,
+            'is_weekend': 1 if next_date.weekday() >= 5 else 0,
+            'lag_1': values.iloc[-1],
+            'lag_7': values.iloc[-7],
+            'lag_14': values.iloc[-14],
+            'lag_30': values.iloc[-30],
+            'rolling_mean_7': values.tail(7).mean(),
+            'rolling_mean_14': values.tail(14).mean(),
+            'rolling_mean_30': values.tail(30).mean()
+        }
+        X = np.array([row[col] for col in FEATURE_COLS] * forecaster.lookback).reshape(1, -1)
+        prediction = max(0, forecaster.model.predict(forecaster.scaler.transform(X))[0])
+        if day > 1:
+            prediction = 0.7 * prediction + 0.3 * forecasts[-1]['demand']
+        forecasts.append({
+            'date': next_date.strftime('%Y-%m-%d'),
+            'demand': round(float(prediction), 2),
+            'lower': round(float(prediction * 0.8), 2),
+            'upper': round(float(prediction * 1.2), 2)
+        })
+        new_row = pd.DataFrame({'date': [next_date], 'value': [prediction],
+                                **{col: [row[col]] for col in FEATURE_COLS[1:]}})
+        data = pd.concat([data, new_row], ignore_index=True)
+
+    return forecasts
+
+
+def train_synthetic(products, days):
+    """Train one forecaster per synthetic series"""
+    dates, values = synthetic_series(products, days)
+    forecasters = []
+    for series in values:
+        sales = pd.DataFrame({'sale_date': dates.strftime('%Y-%m-%d'), 'quantity_sold': series})
+        forecaster = NBEATSForecaster(None)
+        forecaster.train(sales)
+        forecasters.append(forecaster)
+    return forecasters
+
+
+def bench_predict(args):
+    """DataFrame rollout vs ring buffer rollout vs lockstep batch"""
+    forecasters = train_synthetic(args.products, args.days)
+    horizon = args.horizon
+
+    start = time.perf_counter()
+    legacy = [_legacy_predict(f, horizon) for f in forecasters]
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    single = [f.predict(horizon) for f in forecasters]
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = predict_batch(forecasters, horizon)
+    batch_time = time.perf_counter() - start
+
+    def max_gap(a, b):
+        return max(abs(x['demand'] - y['demand']) for fa, fb in zip(a, b) for x, y in zip(fa, fb))
+
+    dates_match = all(x['date'] == y['date'] for fa, fb in zip(legacy, batch) for x, y in zip(fa, fb))
+    gap = max(max_gap(legacy, single), max_gap(legacy, batch))
+    ok = dates_match and gap <= 0.011
+
+    print(f"\n📊 Recursive prediction ({args.products} products x {horizon}-day horizon)")
+    print(f"   DataFrame rollout:   {legacy_time * 1000:10.2f} ms")
+    print(f"   ring buffer:         {single_time * 1000:10.2f} ms  ({legacy_time / single_time:,.0f}x)")
+    print(f"   lockstep batch:      {batch_time * 1000:10.2f} ms  ({legacy_time / batch_time:,.0f}x)")
+    print(f"{'✅' if ok else '❌'} max demand difference {gap:.4f} (rounding only)")
+    return 0 if ok else 1
+
+
+def bench_direct(args):
+    """Recursive vs direct multi-horizon forecasting on a held-out horizon"""
+    horizon = args.horizon
+    dates, values = synthetic_series(args.products, args.days + horizon)
+    train_dates = dates[:args.days].strftime('%Y-%m-%d')
+    actual = values[:, args.days:]
+
+    print(f"\n📊 Recursive vs direct ({args.products} products, {args.days} days, "
+          f"{horizon}-day horizon)")
+    for mode in ('recursive', 'direct'):
+        start = time.perf_counter()
+        forecasters = []
+        for series in values[:, :args.days]:
+            forecaster = NBEATSForecaster(None, mode=mode, horizon=horizon)
+            forecaster.train(pd.DataFrame({'sale_date': train_dates, 'quantity_sold': series}))
+            forecasters.append(forecaster)
+        train_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        single = [f.predict(horizon) for f in forecasters]
+        single_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        predict_batch(forecasters, horizon)
+        batch_time = time.perf_counter() - start
+
+        predicted = np.array([[day['demand'] for day in forecast] for forecast in single])
+        errors = predicted - actual
+        mae = np.abs(errors).mean()
+        rmse = np.sqrt((errors ** 2).mean())
+        print(f"   {mode:<9}  train {train_time * 1000:8.1f} ms  "
+              f"predict {single_time / args.products * 1000:7.3f} ms/product  "
+              f"batch {batch_time * 1000:7.2f} ms  MAE {mae:6.2f}  RMSE {rmse:6.2f}")
+    return 0
+
+
+def bench_nbeats(args):
+    """N-BEATS training throughput in windows per second"""
+    dates, values = synthetic_series(args.products, args.days)
+    end_date = np.datetime64(dates[-1].date(), 'D')
+    ids = np.arange(1, args.products + 1)
+
+    print(f"\n📊 N-BEATS training ({args.products} products, {args.days} days, "
+          f"batch {NBEATS_CONFIG['batch_size']}, width {NBEATS_CONFIG['layer_width']})")
+    for threads in sorted({1, NBEATS_THREADS}):
+        engine = NBeatsEngine()
+        start = time.perf_counter()
+        success, message = engine.train(values, ids, end_date, max_epochs=args.epochs,
+                                        checkpoint_path=None, threads=threads, log=lambda line: None)
+        if not success:
+            print(f"   ❌ {message}")
+            return 1
+        elapsed = time.perf_counter() - start
+        print(f"   {threads:>3} threads  {np.mean(engine.throughput):10,.0f} windows/s  "
+              f"{elapsed:7.1f} s for {engine.epochs} epochs  holdout MAE {engine.metrics['mae']:.2f}")
+    return 0
+
+
+def bench_online(args):
+    """Cost of keeping a forecast fresh: online update vs full refit per sale"""
+    dates, values = synthetic_series(args.products, args.days + 1)
+    days = dates.to_numpy().astype('datetime64[D]')
+    train_dates = dates[:args.days].strftime('%Y-%m-%d')
+
+    start = time.perf_counter()
+    for series in values:
+        NBEATSForecaster(None).train(pd.DataFrame({'sale_date': train_dates,
+                                                   'quantity_sold': series[:args.days]}))
+    refit = (time.perf_counter() - start) / args.products
+
+    models = [OnlineModel.bootstrap(series[:args.days], days[:args.days]) for series in values]
+    start = time.perf_counter()
+    for model in models:
+        model.add_sale(days[args.days - 1], 1)
+    same_day = (time.perf_counter() - start) / args.products
+
+    start = time.perf_counter()
+    for model, series in zip(models, values):
+        model.add_sale(days[args.days], series[args.days])
+    new_day = (time.perf_counter() - start) / args.products
+
+    start = time.perf_counter()
+    for model in models:
+        OnlineModel.from_row(*model.to_row())
+    round_trip = (time.perf_counter() - start) / args.products
+
+    print(f"\n📊 Forecast freshness per sale ({args.products} products, {args.days} days)")
+    print(f"   full refit          {refit * 1e6:12.1f} µs")
+    print(f"   online, same day    {same_day * 1e6:12.1f} µs")
+    print(f"   online, new day     {new_day * 1e6:12.1f} µs")
+    print(f"   state load + save   {round_trip * 1e6:12.1f} µs")
+    return 0
+
+
+# Import a module in a fresh interpreter, report seconds, peak RSS and heavy modules
+# (VmHWM rather than ru_maxrss, which survives exec from this already large process)
+IMPORT_PROBE = '''import re, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+peak = int(re.search(r'VmHWM:\\s+(\\d+)', open('/proc/self/status').read()).group(1)) // 1024
+print(seconds, peak, 'sklearn' in sys.modules, 'pandas' in sys.modules)'''
+
+
+def bench_inference(args):
+    """Serving stack cold start and batch scoring: scikit-learn objects vs NumPy arrays"""
+    print("\n📊 Cold import (fresh interpreter)")
+    for module in ('forecast_service', 'nbeats_model'):
+        output = subprocess.run([sys.executable, '-c', IMPORT_PROBE.format(module=module)],
+                                capture_output=True, text=True, check=True).stdout.split()
+        seconds, rss, sklearn, pandas = float(output[0]), int(output[1]), output[2], output[3]
+        print(f"   {module:18s} {seconds * 1000:8.1f} ms  {rss:5d} MB peak  "
+              f"sklearn={sklearn} pandas={pandas}")
+
+    forecasters = train_synthetic(args.products, args.days)
+    models = [f.export_arrays() for f in forecasters]
+
+    start = time.perf_counter()
+    sklearn_batch = predict_batch(forecasters, args.horizon)
+    sklearn_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    numpy_batch = predict_linear(models, args.horizon)
+    numpy_time = time.perf_counter() - start
+
+    gap = max(abs(round(float(x), 2) - row['demand'])
+              for (_, predictions), forecast in zip(numpy_batch, sklearn_batch)
+              for x, row in zip(predictions, forecast))
+    ok = gap <= 0.011
+
+    print(f"\n📊 Batch scoring ({args.products} products x {args.horizon}-day horizon)")
+    print(f"   predict_batch:       {sklearn_time * 1000:10.2f} ms")
+    print(f"   predict_linear:      {numpy_time * 1000:10.2f} ms  ({sklearn_time / numpy_time:,.1f}x)")
+    print(f"{'✅' if ok else '❌'} max demand difference {gap:.4f}")
+    return 0 if ok else 1
+
+
+def _legacy_alert_reads(db):
+    """The per-product reads and writes the alert loop used to make"""
+    for _, product in db.get_products().iterrows():
+        pid = int(product['product_id'])
+        db.get_daily_sales(pid, days=30)
+        db.get_forecasts(pid)
+        db.create_alert(pid, 'benchmark', 'warning', 'Benchmark alert', '')
+
+
+def _statement_counts(statements):
+    """(queries, inserted rows, commits) in traced SQL"""
+    kinds = [sql.lstrip().split(None, 1)[0].upper() for sql in statements]
+    return (sum(kind == 'SELECT' for kind in kinds), kinds.count('INSERT'), kinds.count('COMMIT'))
+
+
+def bench_alerts(args):
+    """Alert analysis: per-product queries and commits vs three aggregate queries"""
+    from alert_system import AlertSystem
+
+    db = scratch_database(args.products, args.days)
+    statements = []
+    for conn in (db.get_conn(), db.get_read_conn()):
+        conn.set_trace_callback(statements.append)
+
+    start = time.perf_counter()
+    _legacy_alert_reads(db)
+    legacy_time = time.perf_counter() - start
+    legacy = _statement_counts(statements)
+
+    statements.clear()
+    start = time.perf_counter()
+    alerts = AlertSystem(db).analyze_inventory()
+    batch_time = time.perf_counter() - start
+    batch = _statement_counts(statements)
+
+    print(f"\n📊 Alert analysis ({args.products} products, {len(alerts)} alerts)")
+    print(f"   {'':38s} {'time':>10s} {'queries':>8s} {'inserts':>8s} {'commits':>8s}")
+    print(f"   per-product loop (reads + inserts)     {legacy_time * 1000:8.1f}ms {legacy[0]:8d} "
+          f"{legacy[1]:8d} {legacy[2]:8d}")
+    print(f"   set-based analyze_inventory            {batch_time * 1000:8.1f}ms {batch[0]:8d} "
+          f"{batch[1]:8d} {batch[2]:8d}  ({legacy_time / batch_time:,.0f}x)")
+    return 0
+
+
+def bench_intermittent(args):
+    """Croston/SBA/TSB rates on known series, and their cost over the catalog"""
+    from intermittent import METHODS, demand_rates
+
+    # (name, daily series over a 180-day window, expected rate before the SBA correction)
+    cases = []
+    for name, recent, quantity, expected in (('dense, 30 days old', 30, 5.0, 5.0),
+                                              ('dense, 10 days old', 10, 5.0, 5.0)):
+        series = np.zeros(180)
+        series[-recent:] = quantity
+        cases.append((name, series, expected))
+    weekly = np.zeros(180)
+    weekly[::7] = 3.0
+    cases.append(('every 7th day', weekly, 3.0 / 7))
+
+    failures = 0
+    matrix = np.array([series for _, series, _ in cases])
+    print("\n🧮 Intermittent demand rates (units/day)")
+    print(f"   {'':22s} {'expected':>9s} " + ' '.join(f"{method:>8s}" for method in METHODS))
+    rates = {method: demand_rates(matrix, method) for method in METHODS}
+    for i, (name, series, expected) in enumerate(cases):
+        # Leading empty days must not change the rate: compare with the series trimmed to its first sale
+        first = int(np.argmax(series > 0))
+        trimmed = {method: demand_rates(series[np.newaxis, first:], method)[0] for method in METHODS}
+        ok = (abs(rates['croston'][i] - expected) <= 0.05 * expected
+              and all(np.isclose(rates[method][i], trimmed[method]) for method in METHODS))
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} {name:22s} {expected:9.2f} "
+              + ' '.join(f"{rates[method][i]:8.2f}" for method in METHODS))
+
+    catalog = np.where(np.random.default_rng(0).random((args.products, args.days)) < 0.2, 3.0, 0.0)
+    start = time.perf_counter()
+    demand_rates(catalog)
+    print(f"   {args.products} products x {args.days} days: {(time.perf_counter() - start) * 1000:.1f}ms")
+    return failures
+
+
+def bench_rules(args):
+    """Alert rules: compiled NumPy predicates vs evaluating each rule per product"""
+    from alert_rules import COLUMNS, compile_rules, match_rules
+    from config import ALERT_RULES
+
+    rng = np.random.default_rng(0)
+    n = args.products
+    reorder = rng.integers(20, 100, n)
+    max_stock = reorder * 5
+    velocity = np.where(rng.random(n) < 0.3, 0.0, rng.gamma(2.0, 3.0, n))
+    current = rng.integers(0, 600, n)
+    columns = {
+        'current_quantity': current,
+        'reorder_level': reorder,
+        'max_stock_level': max_stock,
+        'purchase_price': rng.uniform(10, 500, n),
+        'selling_price': rng.uniform(15, 800, n),
+        'velocity': velocity,
+        'forecast_demand': velocity * 30,
+        'days_of_stock': np.where(velocity > 0, current / np.where(velocity > 0, velocity, 1), 999),
+        'category': rng.choice(list(CATEGORIES), n),
+    }
+    extra = [{'name': f'extra_{i}', 'alert': 'critical',
+              'when': f"days_of_stock < {i} and category in ('Electronics', 'Mobile')"} for i in range(20)]
+
+    failures = 0
+    print(f"\n📏 Alert rules over {n} products")
+    print(f"   {'':16s} {'compiled':>10s} {'per-product':>12s}")
+    for label, rules in (('config rules', ALERT_RULES), ('+20 rules', extra + ALERT_RULES)):
+        compiled = compile_rules(rules)
+        start = time.perf_counter()
+        vectorized = match_rules(compiled, columns, n)
+        vector_time = time.perf_counter() - start
+
+        # The same rules as Python expressions evaluated row by row
+        code = [compile(rule['when'], rule['name'], 'eval') for rule in rules]
+        start = time.perf_counter()
+        looped = []
+        for i in range(n):
+            row = {name: columns[name][i] for name in COLUMNS}
+            looped.append(next((j for j, expr in enumerate(code) if eval(expr, {}, row)), -1))
+        loop_time = time.perf_counter() - start
+
+        same = np.array_equal(vectorized, looped)
+        failures += not same
+        print(f"   {label:16s} {vector_time * 1000:8.1f}ms {loop_time * 1000:10.1f}ms  "
+              f"({loop_time / vector_time:,.0f}x){'' if same else '  MISMATCH'}")
+    return failures
+
+
+def bench_hybrid(args):
+    """A cold hybrid request falls back at once while the model is fitted in the background"""
+    from forecast_service import compute_forecast
+    from hybrid_engine import hybrid_engine, model_path
+    from model_registry import model_registry
+
+    db = scratch_database(args.products, args.days)
+    hybrid_engine.directory = tempfile.mkdtemp(prefix='supplymind-hybrid-')
+    model_registry.path = tempfile.mkdtemp(prefix='supplymind-registry-')
+    product = db.get_product(1)
+    watermark = db.get_sales_version(1)
+
+    print(f"\n🔮 Hybrid engine, cold request (fit budget {hybrid_engine.budget}s)")
+    start = time.perf_counter()
+    result = compute_forecast(db, product, args.horizon, engine='hybrid')
+    cold = time.perf_counter() - start
+    pending = hybrid_engine._pending.get((1, watermark))
+    ok = result['success'] and result.get('engine') != 'hybrid' and pending is not None
+    print(f"{'✅' if ok else '❌'} answered by the fallback in {cold:.2f}s, fit running in the background")
+    failures = not ok
+
+    pending.result()
+    start = time.perf_counter()
+    result = compute_forecast(db, product, args.horizon, engine='hybrid')
+    warm = time.perf_counter() - start
+    if os.path.exists(model_path(hybrid_engine.directory, 1, watermark)):
+        ok = result.get('engine') == 'hybrid'
+        failures += not ok
+        print(f"{'✅' if ok else '❌'} next request served by the fitted model in {warm:.2f}s")
+    else:
+        print(f"   fit did not produce a model (is prophet installed?), fallback again in {warm:.2f}s")
+    return failures
+
+
+BENCHMARKS = {
+    'plans': bench_query_plans,
+    'stock': bench_stock_contention,
+    'sequences': bench_sequences,
+    'predict': bench_predict,
+    'direct': bench_direct,
+    'nbeats': bench_nbeats,
+    'online': bench_online,
+    'inference': bench_inference,
+    'alerts': bench_alerts,
+    'rules': bench_rules,
+    'intermittent': bench_intermittent,
+    'hybrid': bench_hybrid,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SupplyMind benchmarks')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS))
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--days', type=int, default=180)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--stock', type=int, default=1000)
+    parser.add_argument('--horizon', type=int, default=30)
+    parser.add_argument('--epochs', type=int, default=2)
+    args = parser.parse_args()
+
+    failures = BENCHMARKS[args.benchmark](args)
+    raise SystemExit(1 if failures else 0)
@@ -4,6 +4,7 @@ import os
 # Paths
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 DATA_DIR = os.path.join(BASE_DIR, '..', 'data')
+MODEL_DIR = os.path.join(DATA_DIR, 'models')
 DATABASE_PATH = os.path.join(DATA_DIR, 'inventory.db')
 INVOICE_DIR = os.path.join(DATA_DIR, 'invoices')
 
@@ -31,21 +32,146 @@ NBEATS_CONFIG = {
     'trend_polynomial_degree': 3,
     'prediction_length': 30,
     'context_length': 60,
-    'batch_size': 32,
+    'batch_size': 1024,       # windows per step, large enough for BLAS-sized matmuls
     'max_epochs': 100,
-    'learning_rate': 0.001
+    'learning_rate': 0.001,
+    'patience': 5,            # epochs without validation improvement before stopping
+    'validation_split': 0.2   # share of forecast origins held out, newest first
 }
 
 # Forecasting settings
 FORECAST_DAYS = 30
+FORECAST_MODE = 'recursive'   # 'recursive' (one day at a time) or 'direct' (whole horizon at once)
+FORECAST_ENGINE = 'ridge'     # 'ridge' (per-product models), 'global' (one pooled model), 'nbeats', 'online' or 'hybrid'
 MIN_TRAINING_SAMPLES = 60
+FORECAST_HISTORY_DAYS = 180   # days of daily sales the per-product forecasters train on
 TARGET_ACCURACY = 0.90
 
+# Pooled cross-product model
+GLOBAL_MODEL_PATH = os.path.join(MODEL_DIR, 'global_model.npz')
+GLOBAL_MIN_DAYS = 14          # days with sales a product needs to join the pooled fit
+GLOBAL_ALPHA = 1.0
+
+# N-BEATS engine
+NBEATS_MODEL_PATH = os.path.join(MODEL_DIR, 'nbeats.npz')
+NBEATS_CHECKPOINT_PATH = os.path.join(MODEL_DIR, 'nbeats_checkpoint.npz')
+NBEATS_HISTORY_DAYS = 365     # days of sales loaded for training
+NBEATS_THREADS = os.cpu_count() or 2   # BLAS threads used while training
+
+# Online learning
+ONLINE_LEARNING = True        # fold every sale into per-product online model state
+ONLINE_FORGETTING = 0.995     # per-day weight decay, roughly 200 days of memory
+ONLINE_ALPHA = 1.0            # Ridge penalty on standardized features
+ONLINE_HISTORY_DAYS = 180     # history used to bootstrap a product's state
+
+# Prophet + gradient boosting hybrid (needs the prophet package)
+HYBRID_MODEL_DIR = os.path.join(MODEL_DIR, 'hybrid')
+HYBRID_WORKERS = os.cpu_count() or 2   # process pool for fits
+HYBRID_FIT_BUDGET = 30        # seconds per fit before falling back to the fast engines
+HYBRID_PREDICT_TIMEOUT = 5    # seconds a request waits for a cached model's prediction
+HYBRID_HISTORY_DAYS = 365     # days of sales a fit sees
+
+# Intermittent demand (sparse, long-tail products)
+INTERMITTENT_METHOD = 'sba'   # 'croston', 'sba' (bias-corrected Croston) or 'tsb' (decays when sales stop)
+INTERMITTENT_ALPHA = 0.1      # smoothing of demand sizes and intervals
+INTERMITTENT_BETA = 0.1       # smoothing of the daily demand probability (tsb)
+INTERMITTENT_ADI = 1.32       # average days between sales above which demand counts as intermittent
+INTERMITTENT_HOLDOUT = 14     # days held out to report accuracy
+
+# Batch forecasting
+FORECAST_WORKERS = os.cpu_count() or 2   # process pool size
+FORECAST_SAVE_BATCH = 50                 # products per bulk forecast write
+
+# Rolling-origin backtesting
+BACKTEST_ENGINES = ['naive', 'simple', 'intermittent', 'ridge', 'online', 'global']   # also 'nbeats', 'hybrid' (slow)
+BACKTEST_FOLDS = 4            # forecast origins per product
+BACKTEST_HORIZON = 30         # days forecast from each origin
+BACKTEST_STEP = 7             # days between consecutive origins
+BACKTEST_HISTORY_DAYS = 365   # sales history loaded for the run
+BACKTEST_NBEATS_EPOCHS = 10   # epoch limit per N-BEATS refit
+
+# Hyperparameter tuning of per-product forecasters
+TUNING_ALPHAS = [0.1, 1.0, 10.0, 100.0]
+TUNING_LOOKBACKS = [7, 14, 30]
+TUNING_FEATURE_SETS = ['all', 'no_calendar', 'no_rolling', 'lags_only']
+TUNING_FOLDS = 3              # expanding-window validation folds
+TUNING_SCOPE = 'product'      # 'product' (one winner each) or 'category' (shared per category)
+TUNING_LEVEL_DAYS = 28        # recent days whose mean demand is tracked for drift
+TUNING_DRIFT = 0.25           # relative change of that mean that triggers re-tuning
+TUNING_MAX_AGE_DAYS = 30      # tuned parameters older than this are re-tuned anyway
+TUNING_TIME_BUDGET = 2 * 3600 # seconds; unfinished products are tuned on the next run
+
+# Stored forecast serving
+FORECAST_TTL = 6 * 3600          # seconds a stored forecast is served as fresh
+FORECAST_STALE_TTL = 24 * 3600   # up to this age a stale one is served while it refreshes
+
+# Background jobs
+JOBS_ENABLED = True           # run the job scheduler inside the API server
+JOB_WORKERS = 2               # concurrent jobs per process
+JOB_LANES = {'high': 0, 'normal': 1, 'low': 2}   # claimed in priority order
+JOB_LOW_LANE_LIMIT = 1        # low-lane (catalog-wide) jobs running at once
+JOB_MAX_ATTEMPTS = 3
+JOB_RETRY_DELAY = 30          # seconds before the first retry, doubled per attempt
+JOB_LEASE_SECONDS = 60        # running jobs without a heartbeat for this long are requeued
+JOB_POLL_SECONDS = 5          # queue and sales polling interval
+JOB_NIGHTLY_AT = '02:00'      # local time of the nightly refresh
+JOB_REFRESH_AFTER_SALES = 20  # new sales of a product that trigger a forecast refresh
+
+# Reorder levels set by the nightly job
+REORDER_LEAD_DAYS = 7         # supplier lead time
+REORDER_SERVICE_Z = 1.65      # safety stock z-score, about a 95% service level
+
+# Trained-model cache (per process)
+MODEL_CACHE_SIZE = 512     # max cached product models
+MODEL_CACHE_MAX_MB = 256   # memory bound for cached models
+
+# On-disk model registry (shared by all processes)
+REGISTRY_DIR = os.path.join(MODEL_DIR, 'registry')
+REGISTRY_FLUSH_EVERY = 32  # newly trained models buffered before a segment is written
+
 # Alert thresholds
 UNDERSTOCK_CRITICAL = 0.8  # 80% below reorder point
 UNDERSTOCK_WARNING = 0.5   # 50% below reorder point
 OVERSTOCK_WARNING = 0.8    # 80% of max stock
 
+# Alert rules, checked in order; the first match decides a product's alert.
+# ``when`` is an expression over the columns in alert_rules.COLUMNS, e.g.
+#   "days_of_stock < 7 and category in ('Electronics', 'Mobile')"
+# ``alert`` is one of critical, warning, overstock or info.
+ALERT_RULES = [
+    {'name': 'critical_understock', 'alert': 'critical',
+     'when': f'current_quantity <= reorder_level * {UNDERSTOCK_CRITICAL}'},
+    {'name': 'understock', 'alert': 'warning',
+     'when': 'current_quantity <= reorder_level'},
+    {'name': 'overstock', 'alert': 'overstock',
+     'when': f'current_quantity >= max_stock_level * {OVERSTOCK_WARNING}'},
+    {'name': 'healthy', 'alert': 'info',
+     'when': 'velocity > 0 and current_quantity > reorder_level '
+             'and current_quantity < max_stock_level * 0.8 and days_of_stock < 14'},
+]
+
+# Incremental alerts
+ALERTS_INCREMENTAL = True  # re-check products as their stock changes
+ALERT_POLL_SECONDS = 2     # how soon changes made by other processes are picked up
+ALERT_BATCH = 500          # dirty products evaluated per pass
+
+# Live updates (/api/stream)
+STREAM_QUEUE_SIZE = 1000       # events a client may fall behind before it is told to resync
+STREAM_BATCH = 500             # queued events coalesced into one write
+STREAM_KEEPALIVE_SECONDS = 15  # comment sent on idle connections
+STREAM_RETRY_MS = 3000         # browser reconnect delay
+
+# SQLite connection pool
+DB_POOL_SIZE = 8           # idle writer connections kept for reuse
+DB_READ_POOL_SIZE = 16     # idle read-only connections kept for reuse
+DB_BUSY_TIMEOUT = 5.0      # seconds to wait on a locked database
+SQLITE_PRAGMAS = {
+    'synchronous': 'NORMAL',    # safe with WAL, one fsync per checkpoint
+    'cache_size': -64000,       # 64 MB page cache per connection
+    'mmap_size': 268435456,     # 256 MB memory-mapped I/O
+    'temp_store': 'MEMORY'
+}
+
 # API Configuration
 API_HOST = '0.0.0.0'
 API_PORT = 5000
@@ -1,27 +1,134 @@
 """Database operations - ENHANCED VERSION with Category Support"""
 import sqlite3
-import pandas as pd
-from datetime import datetime
+import threading
+import weakref
+import queue
+import numpy as np
+from datetime import datetime, timedelta
+from urllib.request import pathname2url
 import os
-from config import DATABASE_PATH, DATA_DIR, CATEGORIES
+import json
+from config import (DATABASE_PATH, CATEGORIES, DB_POOL_SIZE,
+                    DB_READ_POOL_SIZE, DB_BUSY_TIMEOUT, SQLITE_PRAGMAS, ONLINE_LEARNING)
+from events import event_bus
+from migrations import migrate
+from online_model import OnlineModel
+
+# Adds a sale into the daily_sales rollup, in the same transaction as the sale
+ROLLUP_UPSERT = '''INSERT INTO daily_sales (product_id, day, qty, revenue, sales_count)
+    VALUES (?, ?, ?, ?, 1)
+    ON CONFLICT(product_id, day) DO UPDATE SET
+        qty = qty + excluded.qty,
+        revenue = revenue + excluded.revenue,
+        sales_count = sales_count + 1'''
+
+# Queue a product for alert re-evaluation, inside the transaction that changed it
+ALERT_DIRTY_MARK = '''INSERT INTO alert_dirty (product_id) VALUES (?)
+    ON CONFLICT(product_id) DO UPDATE SET version = version + 1'''
+
+
+class _Lease:
+    """Holds a pooled connection for the lifetime of one thread"""
+    __slots__ = ('conn', '__weakref__')
+
+    def __init__(self, conn):
+        self.conn = conn
+
+
+class ConnectionPool:
+    """Per-thread SQLite connections backed by a bounded idle pool
+
+    Each thread gets its own connection, so cursors are never shared
+    between Flask request threads. When a thread finishes, its connection
+    goes back to the idle pool for the next thread instead of being closed.
+    """
+
+    def __init__(self, db_path, size, read_only=False):
+        self.db_path = db_path
+        self.read_only = read_only
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._local = threading.local()
+        self._closed = False
+
+    def _connect(self):
+        """Open a new connection with tuned pragmas"""
+        if self.read_only:
+            uri = f"file:{pathname2url(os.path.abspath(self.db_path))}?mode=ro"
+            conn = sqlite3.connect(uri, uri=True, timeout=DB_BUSY_TIMEOUT,
+                                   check_same_thread=False)
+        else:
+            conn = sqlite3.connect(self.db_path, timeout=DB_BUSY_TIMEOUT,
+                                   check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+
+        for pragma, value in SQLITE_PRAGMAS.items():
+            conn.execute(f'PRAGMA {pragma}={value}')
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def get(self):
+        """Get the calling thread's connection"""
+        lease = getattr(self._local, 'lease', None)
+        if lease is None:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            lease = _Lease(conn)
+            weakref.finalize(lease, self._release, conn)
+            self._local.lease = lease
+        return lease.conn
+
+    def _release(self, conn):
+        """Return a connection to the idle pool once its thread is gone"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            if self._closed:
+                conn.close()
+                return
+            self._idle.put_nowait(conn)
+        except queue.Full:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def close(self):
+        """Close idle connections and the calling thread's connection"""
+        self._closed = True
+        lease = getattr(self._local, 'lease', None)
+        if lease is not None:
+            self._local.lease = None
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
 
 class Database:
-    def __init__(self):
-        os.makedirs(DATA_DIR, exist_ok=True)
-        self.db_path = DATABASE_PATH
-        self.conn = None
+    def __init__(self, db_path=DATABASE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.db_path = db_path
+        self.pool = ConnectionPool(self.db_path, DB_POOL_SIZE)
         self.init_db()
+        # Read-only pool opens after init_db so the database file exists
+        self.read_pool = ConnectionPool(self.db_path, DB_READ_POOL_SIZE, read_only=True)
+        # Set when this process marks products for alert re-evaluation
+        self.alerts_dirty = threading.Event()
     
     def get_conn(self):
-        """Get database connection"""
-        if self.conn is None:
-            self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
-            self.conn.row_factory = sqlite3.Row
-        return self.conn
+        """Get the calling thread's read-write connection"""
+        return self.pool.get()
+    
+    def get_read_conn(self):
+        """Get the calling thread's read-only connection"""
+        return self.read_pool.get()
     
     def execute_query(self, query, params=None):
         """Execute a query and return results as list of dicts"""
-        conn = self.get_conn()
+        is_select = query.strip().upper().startswith('SELECT')
+        conn = self.get_read_conn() if is_select else self.get_conn()
         cursor = conn.cursor()
         
         if params:
@@ -29,7 +136,7 @@ class Database:
         else:
             cursor.execute(query)
         
-        if query.strip().upper().startswith('SELECT'):
+        if is_select:
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
         
@@ -37,92 +144,14 @@ class Database:
         return None
     
     def init_db(self):
-        """Initialize database with fixed schema"""
+        """Initialize database, upgrading the schema in place"""
         conn = self.get_conn()
-        c = conn.cursor()
-        
-        # Products table
-        c.execute('''CREATE TABLE IF NOT EXISTS products (
-            product_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_name TEXT NOT NULL,
-            brand TEXT NOT NULL,
-            category TEXT NOT NULL,
-            purchase_price REAL NOT NULL,
-            selling_price REAL NOT NULL,
-            current_quantity INTEGER DEFAULT 0,
-            reorder_level INTEGER DEFAULT 50,
-            max_stock_level INTEGER DEFAULT 500,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(product_name, brand)
-        )''')
-        
-        # Drop old sales table if exists and recreate
-        c.execute("DROP TABLE IF EXISTS sales")
-        c.execute('''CREATE TABLE sales (
-            sale_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER,
-            quantity_sold INTEGER,
-            sale_date DATE,
-            selling_price REAL,
-            revenue REAL,
-            FOREIGN KEY (product_id) REFERENCES products(product_id)
-        )''')
-        
-        # Transactions table
-        c.execute('''CREATE TABLE IF NOT EXISTS transactions (
-            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER,
-            type TEXT,
-            quantity INTEGER,
-            transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            notes TEXT,
-            FOREIGN KEY (product_id) REFERENCES products(product_id)
-        )''')
-        
-        # Alerts table
-        c.execute('''CREATE TABLE IF NOT EXISTS alerts (
-            alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER,
-            alert_type TEXT,
-            severity TEXT,
-            message TEXT,
-            recommendation TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            resolved INTEGER DEFAULT 0,
-            FOREIGN KEY (product_id) REFERENCES products(product_id)
-        )''')
-        
-        # Forecasts table
-        c.execute('''CREATE TABLE IF NOT EXISTS forecasts (
-            forecast_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            product_id INTEGER,
-            forecast_date DATE,
-            predicted_demand REAL,
-            lower_bound REAL,
-            upper_bound REAL,
-            accuracy REAL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (product_id) REFERENCES products(product_id)
-        )''')
-        
-        # Suppliers table
-        c.execute('''CREATE TABLE IF NOT EXISTS suppliers (
-            supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
-            supplier_name TEXT NOT NULL,
-            contact_person TEXT,
-            phone TEXT,
-            email TEXT,
-            address TEXT,
-            payment_terms TEXT,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        )''')
-        
-        conn.commit()
+        migrate(conn)
         print("✅ Database initialized")
     
     def get_categories(self):
         """Get all unique categories from products"""
-        conn = self.get_conn()
+        conn = self.get_read_conn()
         c = conn.cursor()
         c.execute('SELECT DISTINCT category FROM products ORDER BY category')
         categories = [row[0] for row in c.fetchall()]
@@ -136,8 +165,8 @@ class Database:
         thresholds = CATEGORIES.get(category, {'reorder_point': 50, 'max_stock': 500})
         
         # Check if product already exists
-        c.execute('SELECT product_id, current_quantity FROM products WHERE product_name = ? AND brand = ?', 
-                  (product_name, brand))
+        c.execute('''SELECT product_id, current_quantity, purchase_price FROM products
+            WHERE product_name = ? AND brand = ?''', (product_name, brand))
         existing = c.fetchone()
         
         if existing:
@@ -160,7 +189,12 @@ class Database:
                 c.execute('''INSERT INTO transactions (product_id, type, quantity, notes)
                     VALUES (?, 'restock', ?, 'Product restocked')''', (product_id, initial_quantity))
             
+            c.execute(ALERT_DIRTY_MARK, (product_id,))
             conn.commit()
+            self.alerts_dirty.set()
+            event_bus.publish('product', {'action': 'updated', 'product_id': product_id})
+            self._publish_stock([(product_id, new_quantity, initial_quantity,
+                                  new_quantity * purchase_price - existing[1] * existing[2])])
             print(f"✅ Updated existing product: {product_name} ({brand})")
             return product_id
         else:
@@ -178,7 +212,12 @@ class Database:
                 c.execute('''INSERT INTO transactions (product_id, type, quantity, notes)
                     VALUES (?, 'initial', ?, 'Initial stock')''', (pid, initial_quantity))
             
+            c.execute(ALERT_DIRTY_MARK, (pid,))
             conn.commit()
+            self.alerts_dirty.set()
+            event_bus.publish('product', {'action': 'created', 'product_id': pid})
+            event_bus.publish('stats', {'total_products': 1,
+                                        'inventory_value': initial_quantity * purchase_price})
             print(f"✅ Added new product: {product_name} ({brand})")
             return pid
     
@@ -198,76 +237,297 @@ class Database:
         query = 'SELECT * FROM products WHERE category = ? ORDER BY product_name'
         return self.execute_query(query, (category,))
     
+    def update_product(self, product_id, fields):
+        """Update product details; ``fields`` maps column names to new values"""
+        conn = self.get_conn()
+        c = conn.cursor()
+        
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            c.execute('SELECT current_quantity, purchase_price FROM products WHERE product_id = ?',
+                      (product_id,))
+            before = c.fetchone()
+            
+            columns = ', '.join(f'{name} = ?' for name in fields)
+            c.execute(f'UPDATE products SET {columns} WHERE product_id = ?',
+                      (*fields.values(), product_id))
+            c.execute(ALERT_DIRTY_MARK, (product_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self.alerts_dirty.set()
+        if before:
+            event_bus.publish('product', {'action': 'updated', 'product_id': product_id})
+            if 'purchase_price' in fields:
+                quantity, purchase_price = before
+                event_bus.publish('stats', {
+                    'inventory_value': quantity * (fields['purchase_price'] - purchase_price)})
+    
+    def delete_product(self, product_id):
+        """Delete a product; its alerts are resolved by the next alert check"""
+        conn = self.get_conn()
+        c = conn.cursor()
+        
+        c.execute('''DELETE FROM products WHERE product_id = ?
+            RETURNING current_quantity, purchase_price''', (product_id,))
+        deleted = c.fetchall()
+        c.execute(ALERT_DIRTY_MARK, (product_id,))
+        conn.commit()
+        
+        self.alerts_dirty.set()
+        if deleted:
+            quantity, purchase_price = deleted[0]
+            event_bus.publish('product', {'action': 'deleted', 'product_id': product_id})
+            event_bus.publish('stats', {'total_products': -1,
+                                        'inventory_value': -quantity * purchase_price})
+    
     def update_quantity(self, product_id, quantity_change, trans_type, notes=''):
         """Update product quantity"""
         conn = self.get_conn()
         c = conn.cursor()
         
         c.execute('''UPDATE products SET current_quantity = current_quantity + ?
-            WHERE product_id = ?''', (quantity_change, product_id))
+            WHERE product_id = ? RETURNING current_quantity, purchase_price''', (quantity_change, product_id))
+        updated = c.fetchall()
         
         c.execute('''INSERT INTO transactions (product_id, type, quantity, notes)
             VALUES (?, ?, ?, ?)''', (product_id, trans_type, quantity_change, notes))
         
+        c.execute(ALERT_DIRTY_MARK, (product_id,))
         conn.commit()
+        self.alerts_dirty.set()
+        if updated:
+            new_quantity, purchase_price = updated[0]
+            self._publish_stock([(product_id, new_quantity, quantity_change,
+                                  quantity_change * purchase_price)])
     
     def record_purchase(self, product_id, quantity, notes=''):
         """Record purchase (add stock)"""
         self.update_quantity(product_id, quantity, 'purchase', notes)
     
     def record_sale(self, product_id, quantity, sale_date=None):
-        """Record sale and update quantity"""
+        """Record sale and update quantity, returns the remaining stock"""
+        if quantity <= 0:
+            raise ValueError(f"Quantity must be positive, got {quantity}")
         if not sale_date:
             sale_date = datetime.now().strftime('%Y-%m-%d')
         
         conn = self.get_conn()
         c = conn.cursor()
         
-        # Get current product info
-        c.execute('SELECT selling_price, current_quantity FROM products WHERE product_id=?', 
-                  (product_id,))
-        result = c.fetchone()
-        
-        if not result:
-            raise ValueError("Product not found")
-        
-        selling_price = result[0]
-        current = result[1]
-        
-        if current < quantity:
-            raise ValueError(f"Insufficient stock: {current} available, {quantity} requested")
-        
-        revenue = selling_price * quantity
-        
-        # Insert into sales
-        c.execute('''INSERT INTO sales (product_id, quantity_sold, sale_date, selling_price, revenue)
-            VALUES (?, ?, ?, ?, ?)''', 
-            (product_id, quantity, sale_date, selling_price, revenue))
+        try:
+            # Check and decrement stock in one guarded statement
+            c.execute('''UPDATE products SET current_quantity = current_quantity - ?
+                WHERE product_id = ? AND current_quantity >= ?
+                RETURNING selling_price, current_quantity, purchase_price''',
+                (quantity, product_id, quantity))
+            result = c.fetchall()
+            
+            if not result:
+                c.execute('SELECT current_quantity FROM products WHERE product_id=?', (product_id,))
+                row = c.fetchone()
+                if not row:
+                    raise ValueError("Product not found")
+                raise ValueError(f"Insufficient stock: {row[0]} available, {quantity} requested")
+            
+            selling_price, new_quantity, purchase_price = result[0]
+            revenue = selling_price * quantity
+            
+            # Insert into sales
+            c.execute('''INSERT INTO sales (product_id, quantity_sold, sale_date, selling_price, revenue)
+                VALUES (?, ?, ?, ?, ?)''', 
+                (product_id, quantity, sale_date, selling_price, revenue))
+            
+            c.execute(ROLLUP_UPSERT, (product_id, sale_date, quantity, revenue))
+            
+            # Record transaction
+            c.execute('''INSERT INTO transactions (product_id, type, quantity, notes)
+                VALUES (?, 'sale', ?, ?)''', (product_id, -quantity, f'Sale on {sale_date}'))
+            
+            self._fold_online_sales(c, sale_date, [(product_id, quantity)])
+            c.execute(ALERT_DIRTY_MARK, (product_id,))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self.alerts_dirty.set()
+        self._publish_stock([(product_id, new_quantity, -quantity, -quantity * purchase_price)],
+                            revenue, sale_date)
+        return new_quantity
+    
+    def record_bulk_sale(self, items):
+        """Record multiple items sale at once"""
+        return self.record_checkout(items)['sale_date']
+    
+    def record_checkout(self, items, sale_date=None):
+        """Record a whole cart in one transaction
+        
+        Prices and stock for every line are read with a single IN query,
+        stock is decremented with executemany, and sales/transaction rows
+        are inserted in bulk before one commit. If any line fails the stock
+        check nothing is written.
+        """
+        if not sale_date:
+            sale_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Update product quantity
-        c.execute('''UPDATE products SET current_quantity = current_quantity - ?
-            WHERE product_id = ?''', (quantity, product_id))
+        # Merge repeated cart lines for the same product
+        quantities = {}
+        for item in items:
+            try:
+                pid = int(item['product_id'])
+                quantity = int(item['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"Each item needs a product_id and an integer quantity: {item!r}") from None
+            if quantity <= 0:
+                raise ValueError(f"Quantity must be positive for product {pid}, got {quantity}")
+            quantities[pid] = quantities.get(pid, 0) + quantity
+        
+        if not quantities:
+            raise ValueError("No items to record")
         
-        # Record transaction
-        c.execute('''INSERT INTO transactions (product_id, type, quantity, notes)
-            VALUES (?, 'sale', ?, ?)''', (product_id, -quantity, f'Sale on {sale_date}'))
+        conn = self.get_conn()
+        c = conn.cursor()
         
-        conn.commit()
+        try:
+            # Take the write lock before reading stock so the check holds
+            c.execute('BEGIN IMMEDIATE')
+            
+            placeholders = ','.join('?' * len(quantities))
+            c.execute(f'''SELECT product_id, selling_price, current_quantity, purchase_price
+                FROM products WHERE product_id IN ({placeholders})''',
+                tuple(quantities))
+            found = {row[0]: (row[1], row[2], row[3]) for row in c.fetchall()}
+            
+            missing = [pid for pid in quantities if pid not in found]
+            if missing:
+                raise ValueError(f"Product not found: {missing[0]}")
+            
+            for pid, quantity in quantities.items():
+                current = found[pid][1]
+                if current < quantity:
+                    raise ValueError(f"Insufficient stock for product {pid}: "
+                                     f"{current} available, {quantity} requested")
+            
+            lines = [(pid, quantity, found[pid][0]) for pid, quantity in quantities.items()]
+            
+            c.executemany('''UPDATE products SET current_quantity = current_quantity - ?
+                WHERE product_id = ?''', [(qty, pid) for pid, qty, _ in lines])
+            
+            c.executemany('''INSERT INTO sales (product_id, quantity_sold, sale_date, selling_price, revenue)
+                VALUES (?, ?, ?, ?, ?)''',
+                [(pid, qty, sale_date, price, price * qty) for pid, qty, price in lines])
+            
+            c.executemany(ROLLUP_UPSERT,
+                [(pid, sale_date, qty, price * qty) for pid, qty, price in lines])
+            
+            c.executemany('''INSERT INTO transactions (product_id, type, quantity, notes)
+                VALUES (?, 'sale', ?, ?)''',
+                [(pid, -qty, f'Sale on {sale_date}') for pid, qty, _ in lines])
+            
+            self._fold_online_sales(c, sale_date, [(pid, qty) for pid, qty, _ in lines])
+            c.executemany(ALERT_DIRTY_MARK, [(pid,) for pid, _, _ in lines])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self.alerts_dirty.set()
+        self._publish_stock([(pid, found[pid][1] - qty, -qty, -qty * found[pid][2]) for pid, qty, _ in lines],
+                            sum(price * qty for _, qty, price in lines), sale_date)
+        return {
+            'sale_date': sale_date,
+            'total_amount': sum(price * qty for _, qty, price in lines),
+            'items': [{'product_id': pid, 'quantity': qty, 'price': price, 'revenue': price * qty}
+                      for pid, qty, price in lines]
+        }
     
-    def record_bulk_sale(self, items):
-        """Record multiple items sale at once"""
-        sale_date = datetime.now().strftime('%Y-%m-%d')
+    def _publish_stock(self, changes, revenue=0, sale_date=None):
+        """Publish committed stock changes and the dashboard stats they move
+        
+        ``changes`` are (product_id, current_quantity, delta, inventory value delta).
+        """
+        if not event_bus.active():
+            return
+        for product_id, quantity, delta, _ in changes:
+            event_bus.publish('stock', {'product_id': product_id, 'current_quantity': quantity,
+                                        'delta': delta})
+        stats = {'inventory_value': sum(value for _, _, _, value in changes)}
+        if revenue and sale_date >= (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'):
+            stats['monthly_revenue'] = revenue
+        event_bus.publish('stats', stats)
+    
+    def _fold_online_sales(self, c, sale_date, quantities):
+        """Update online model state for products that have it, inside the sale transaction
+        
+        A back-dated sale cannot be folded into finished days, so that
+        product's state is dropped and rebuilt from history on next use.
+        """
+        if not ONLINE_LEARNING:
+            return
+        
+        placeholders = ','.join('?' * len(quantities))
+        c.execute(f'''SELECT product_id, open_day, day_total, state FROM online_models
+            WHERE product_id IN ({placeholders})''', [pid for pid, _ in quantities])
+        models = {row[0]: OnlineModel.from_row(*row[1:]) for row in c.fetchall()}
+        if not models:
+            return
+        
+        updates, stale = [], []
+        for pid, quantity in quantities:
+            model = models.get(pid)
+            if model is None:
+                continue
+            if model.add_sale(sale_date, quantity):
+                updates.append(model.to_row() + (pid,))
+            else:
+                stale.append((pid,))
+        
+        c.executemany('''UPDATE online_models SET open_day = ?, day_total = ?, state = ?,
+            updated_at = CURRENT_TIMESTAMP WHERE product_id = ?''', updates)
+        c.executemany('DELETE FROM online_models WHERE product_id = ?', stale)
+    
+    def get_online_model(self, product_id):
+        """Get a product's online model state, or None if it has none"""
+        row = self.get_read_conn().execute(
+            'SELECT open_day, day_total, state FROM online_models WHERE product_id = ?',
+            (product_id,)).fetchone()
+        return OnlineModel.from_row(*row) if row else None
+    
+    def bootstrap_online_model(self, product_id, days, build):
+        """Get a product's online model state, storing ``build(sales)`` if it has none
+        
+        The write lock is held from reading the last ``days`` of sales to
+        storing the state, so no sale can commit in between and be left out
+        of it. ``build`` gets get_daily_columns() output and may return None.
+        """
         conn = self.get_conn()
         
-        for item in items:
-            self.record_sale(item['product_id'], item['quantity'], sale_date)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT open_day, day_total, state FROM online_models WHERE product_id = ?',
+                               (product_id,)).fetchone()
+            if row:
+                model = OnlineModel.from_row(*row)
+            else:
+                model = build(self.get_daily_columns(product_id, days=days))
+                if model is not None:
+                    conn.execute('''INSERT INTO online_models (product_id, open_day, day_total, state)
+                        VALUES (?, ?, ?, ?)''', (product_id,) + model.to_row())
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         
-        conn.commit()
-        return sale_date
+        return model
     
     def get_products(self, product_id=None):
         """Get products DataFrame for compatibility"""
-        conn = self.get_conn()
+        import pandas as pd
+        
+        conn = self.get_read_conn()
         query = 'SELECT * FROM products'
         params = ()
         
@@ -280,7 +540,9 @@ class Database:
     
     def get_sales(self, product_id=None, days=90):
         """Get sales history DataFrame"""
-        conn = self.get_conn()
+        import pandas as pd
+        
+        conn = self.get_read_conn()
         
         if product_id:
             query = '''SELECT s.*, p.product_name, p.category 
@@ -297,29 +559,369 @@ class Database:
         
         return df
     
-    def save_forecast(self, product_id, forecasts, accuracy):
-        """Save forecast results"""
+    def get_daily_sales(self, product_id=None, days=90):
+        """Get per-day sales totals from the daily_sales rollup
+        
+        Returns one row per product per day with sales, using the same
+        column names as get_sales so forecasting code can use either.
+        """
+        import pandas as pd
+        
+        conn = self.get_read_conn()
+        
+        if product_id:
+            query = '''SELECT product_id, day AS sale_date, qty AS quantity_sold,
+                    revenue, sales_count
+                FROM daily_sales
+                WHERE product_id = ? AND day >= date('now', '-' || ? || ' days')
+                ORDER BY day'''
+            return pd.read_sql_query(query, conn, params=(product_id, days))
+        
+        query = '''SELECT product_id, day AS sale_date, qty AS quantity_sold,
+                revenue, sales_count
+            FROM daily_sales
+            WHERE day >= date('now', '-' || ? || ' days')
+            ORDER BY day, product_id'''
+        return pd.read_sql_query(query, conn, params=(days,))
+    
+    def get_daily_columns(self, product_id=None, days=90):
+        """get_daily_sales as NumPy columns, for serving without pandas
+        
+        Returns a dict of ``product_id``, ``sale_date`` (datetime64[D]) and
+        ``quantity_sold`` arrays.
+        """
+        conn = self.get_read_conn()
+        if product_id:
+            rows = conn.execute('''SELECT product_id, day, qty FROM daily_sales
+                WHERE product_id = ? AND day >= date('now', '-' || ? || ' days')
+                ORDER BY day''', (product_id, days)).fetchall()
+        else:
+            rows = conn.execute('''SELECT product_id, day, qty FROM daily_sales
+                WHERE day >= date('now', '-' || ? || ' days')
+                ORDER BY day, product_id''', (days,)).fetchall()
+        
+        product_ids, sale_dates, quantities = zip(*rows) if rows else ((), (), ())
+        return {
+            'product_id': np.array(product_ids, dtype=np.int64),
+            'sale_date': np.array(sale_dates, dtype='datetime64[D]'),
+            'quantity_sold': np.array(quantities, dtype=np.float64)
+        }
+    
+    def rebuild_daily_sales(self):
+        """Rebuild the daily_sales rollup from raw sales rows"""
         conn = self.get_conn()
         c = conn.cursor()
         
-        c.execute('DELETE FROM forecasts WHERE product_id = ?', (product_id,))
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            c.execute('DELETE FROM daily_sales')
+            c.execute('''INSERT INTO daily_sales (product_id, day, qty, revenue, sales_count)
+                SELECT product_id, sale_date, SUM(quantity_sold), SUM(revenue), COUNT(*)
+                FROM sales GROUP BY product_id, sale_date''')
+            rows = c.rowcount
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        return rows
+    
+    def get_sales_version(self, product_id):
+        """Latest sale_id for a product, used as a training watermark"""
+        conn = self.get_read_conn()
+        c = conn.cursor()
+        c.execute('SELECT COALESCE(MAX(sale_id), 0) FROM sales WHERE product_id = ?',
+                  (product_id,))
+        return c.fetchone()[0]
+    
+    def get_sales_versions(self):
+        """Latest sale_id of every product with sales, in one query"""
+        conn = self.get_read_conn()
+        rows = conn.execute('SELECT product_id, MAX(sale_id) FROM sales GROUP BY product_id').fetchall()
+        return dict(rows)
+    
+    def save_forecast(self, product_id, forecasts, accuracy, sales_version=None,
+                      engine='ridge', metrics=None):
+        """Save forecast results"""
+        self.save_forecasts([(product_id, forecasts, accuracy,
+                              {'sales_version': sales_version, 'engine': engine, 'metrics': metrics})])
+    
+    def save_forecasts(self, batch):
+        """Save forecasts for many products in one transaction
+        
+        ``batch`` is a list of (product_id, forecasts, accuracy) tuples, with
+        an optional fourth item ``{'sales_version', 'engine', 'metrics'}``
+        describing the run. A run without a sales_version is never served
+        from storage.
+        """
+        runs = []
+        for item in batch:
+            product_id, forecasts, accuracy = item[:3]
+            run = item[3] if len(item) > 3 else {}
+            metrics = run.get('metrics') or {'accuracy': accuracy}
+            runs.append((product_id, run.get('sales_version'), run.get('engine') or 'ridge',
+                         len(forecasts), json.dumps(metrics)))
+        
+        conn = self.get_conn()
+        c = conn.cursor()
         
-        for f in forecasts:
-            c.execute('''INSERT INTO forecasts 
+        try:
+            c.executemany('DELETE FROM forecasts WHERE product_id = ?',
+                          [(item[0],) for item in batch])
+            
+            c.executemany('''INSERT INTO forecasts 
                 (product_id, forecast_date, predicted_demand, lower_bound, upper_bound, accuracy)
                 VALUES (?, ?, ?, ?, ?, ?)''',
-                (product_id, f['date'], f['demand'], f['lower'], f['upper'], accuracy))
-        
-        conn.commit()
+                [(item[0], f['date'], f['demand'], f['lower'], f['upper'], item[2])
+                 for item in batch for f in item[1]])
+            
+            c.executemany('''INSERT INTO forecast_runs
+                (product_id, sales_version, engine, days, metrics, created_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+                ON CONFLICT(product_id) DO UPDATE SET sales_version = excluded.sales_version,
+                    engine = excluded.engine, days = excluded.days,
+                    metrics = excluded.metrics, created_at = excluded.created_at''', runs)
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
     
     def get_forecasts(self, product_id):
         """Get saved forecasts DataFrame"""
-        conn = self.get_conn()
+        import pandas as pd
+        
+        conn = self.get_read_conn()
         df = pd.read_sql_query(
             'SELECT * FROM forecasts WHERE product_id = ? ORDER BY forecast_date',
             conn, params=(product_id,))
         return df
     
+    def get_forecast_rows(self, product_id):
+        """Get a saved forecast in the API's row format"""
+        conn = self.get_read_conn()
+        rows = conn.execute('''SELECT forecast_date, predicted_demand, lower_bound, upper_bound
+            FROM forecasts WHERE product_id = ? ORDER BY forecast_date''', (product_id,)).fetchall()
+        return [{'date': date, 'demand': demand, 'lower': lower, 'upper': upper}
+                for date, demand, lower, upper in rows]
+    
+    def get_forecast_run(self, product_id):
+        """Get how and when a product's saved forecast was made, with its age
+        
+        ``current_version`` is the product's sales watermark now; it differs
+        from ``sales_version`` once new sales have arrived.
+        """
+        conn = self.get_read_conn()
+        row = conn.execute('''SELECT sales_version, engine, days, metrics, created_at,
+                (julianday('now') - julianday(created_at)) * 86400,
+                (SELECT COALESCE(MAX(sale_id), 0) FROM sales WHERE product_id = r.product_id)
+            FROM forecast_runs r WHERE product_id = ?''', (product_id,)).fetchone()
+        if not row:
+            return None
+        
+        sales_version, engine, days, metrics, created_at, age, current_version = row
+        return {
+            'sales_version': sales_version,
+            'engine': engine,
+            'days': days,
+            'metrics': json.loads(metrics) if metrics else {},
+            'created_at': created_at,
+            'age': age,
+            'current_version': current_version
+        }
+    
+    def save_backtest_results(self, run_id, results):
+        """Save one backtest run, one row per engine"""
+        conn = self.get_conn()
+        conn.executemany('''INSERT INTO backtest_results
+            (run_id, engine, category, folds, horizon, products, forecasts, mae, rmse, mape,
+             bias, train_seconds, inference_seconds, fits)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+            [(run_id, r['engine'], r['category'], r['folds'], r['horizon'], r['products'],
+              r['forecasts'], r['mae'], r['rmse'], r['mape'], r['bias'], r['train_seconds'],
+              r['inference_seconds'], r['fits']) for r in results])
+        conn.commit()
+    
+    def get_backtest_results(self, run_id=None):
+        """Get the rows of one backtest run, the latest by default"""
+        if run_id is None:
+            latest = self.execute_query('SELECT MAX(run_id) AS run_id FROM backtest_results')
+            run_id = latest[0]['run_id']
+        return self.execute_query('''SELECT * FROM backtest_results WHERE run_id = ?
+            ORDER BY mae''', (run_id,))
+    
+    def get_tuned_params(self, product_id):
+        """Tuned forecaster parameters for a product, or None"""
+        conn = self.get_read_conn()
+        row = conn.execute('SELECT alpha, lookback, features FROM tuned_params WHERE product_id = ?',
+                           (product_id,)).fetchone()
+        if not row:
+            return None
+        return {'alpha': row[0], 'lookback': row[1], 'features': row[2]}
+    
+    def get_all_tuned_params(self):
+        """Every tuning record with its age in days, keyed by product_id"""
+        rows = self.execute_query('''SELECT *, julianday('now') - julianday(tuned_at) AS age_days
+            FROM tuned_params''')
+        return {row['product_id']: row for row in rows}
+    
+    def save_tuned_params(self, rows):
+        """Upsert tuning winners in one transaction"""
+        conn = self.get_conn()
+        conn.executemany('''INSERT INTO tuned_params
+            (product_id, alpha, lookback, features, scope, cv_mae, baseline_mae, level,
+             sales_version, tuned_at)
+            VALUES (:product_id, :alpha, :lookback, :features, :scope, :cv_mae, :baseline_mae,
+                    :level, :sales_version, CURRENT_TIMESTAMP)
+            ON CONFLICT(product_id) DO UPDATE SET alpha = excluded.alpha,
+                lookback = excluded.lookback, features = excluded.features,
+                scope = excluded.scope, cv_mae = excluded.cv_mae,
+                baseline_mae = excluded.baseline_mae, level = excluded.level,
+                sales_version = excluded.sales_version, tuned_at = excluded.tuned_at''', rows)
+        conn.commit()
+    
+    def get_alert_inputs(self, days=30, product_ids=None):
+        """Stock, category, sales velocity and forecast totals of products as NumPy columns
+        
+        Three aggregate queries whatever the catalog size, over every product
+        or just ``product_ids``. Velocity is units per day with sales over the
+        last ``days`` days; products without sales or forecasts get 0.
+        """
+        conn = self.get_read_conn()
+        where, params = '', ()
+        if product_ids is not None:
+            params = tuple(int(pid) for pid in product_ids)
+            where = f"product_id IN ({','.join('?' * len(params))})"
+        products = conn.execute(f'''SELECT product_id, product_name, current_quantity, reorder_level,
+            max_stock_level, purchase_price, selling_price, category FROM products
+            {'WHERE ' + where if where else ''} ORDER BY product_id''', params).fetchall()
+        velocity = conn.execute(f'''SELECT product_id, SUM(qty) * 1.0 / COUNT(*) FROM daily_sales
+            WHERE day >= date('now', '-' || ? || ' days') {'AND ' + where if where else ''}
+            GROUP BY product_id''', (days,) + params).fetchall()
+        demand = conn.execute(f'''SELECT product_id, SUM(predicted_demand) FROM forecasts
+            {'WHERE ' + where if where else ''} GROUP BY product_id''', params).fetchall()
+        
+        ids = np.array([row[0] for row in products], dtype=np.int64)
+        
+        def aligned(rows):
+            # Spread (product_id, value) rows onto the sorted product ids
+            values = np.zeros(len(ids))
+            if rows and len(ids):
+                keys = np.array([row[0] for row in rows], dtype=np.int64)
+                found = np.minimum(np.searchsorted(ids, keys), len(ids) - 1)
+                keep = ids[found] == keys
+                values[found[keep]] = np.array([row[1] or 0 for row in rows], dtype=np.float64)[keep]
+            return values
+        
+        columns = [('current_quantity', np.int64), ('reorder_level', np.int64), ('max_stock_level', np.int64),
+                   ('purchase_price', np.float64), ('selling_price', np.float64)]
+        return {
+            'product_id': ids,
+            'product_name': [row[1] for row in products],
+            'category': np.array([row[7] or '' for row in products], dtype=str),
+            **{name: np.array([row[i + 2] or 0 for row in products], dtype=dtype)
+               for i, (name, dtype) in enumerate(columns)},
+            'velocity': aligned(velocity),
+            'forecast_demand': aligned(demand)
+        }
+    
+    def mark_alerts_dirty(self, product_ids):
+        """Queue products for alert re-evaluation after a change made outside the methods here"""
+        conn = self.get_conn()
+        conn.executemany(ALERT_DIRTY_MARK, [(int(pid),) for pid in product_ids])
+        conn.commit()
+        self.alerts_dirty.set()
+    
+    def get_dirty_products(self, limit=500):
+        """Products waiting for alert re-evaluation, as (product_id, version) pairs (-1: all)"""
+        conn = self.get_read_conn()
+        rows = conn.execute('SELECT product_id, version FROM alert_dirty LIMIT ?', (limit,)).fetchall()
+        return [tuple(row) for row in rows]
+    
+    def reconcile_alerts(self, product_ids, rows, dirty=()):
+        """Make the active alerts of ``product_ids`` match ``rows``, in one transaction
+        
+        ``rows`` are (product_id, alert_type, severity, message, recommendation),
+        at most one per product. Matching active alerts are updated in place,
+        new ones inserted and any other active alert of those products is
+        resolved. ``dirty`` (product_id, version) pairs are cleared unless the
+        product was marked again in the meantime. Returns the number of
+        alerts written and resolved.
+        """
+        keep = {row[0]: row[1] for row in rows}
+        ids = json.dumps([int(pid) for pid in product_ids])
+        # Stream clients get the differences; skip reading them when nobody listens
+        listening = event_bus.active()
+        conn = self.get_conn()
+        c = conn.cursor()
+        try:
+            c.execute('BEGIN IMMEDIATE')
+            before = self._active_alerts(c, ids) if listening else {}
+            
+            c.executemany('''INSERT INTO alerts 
+                (product_id, alert_type, severity, message, recommendation)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(product_id, alert_type) WHERE resolved = 0 DO UPDATE SET
+                    severity = excluded.severity, message = excluded.message,
+                    recommendation = excluded.recommendation
+                WHERE severity != excluded.severity OR message != excluded.message
+                    OR recommendation != excluded.recommendation''', rows)
+            written = c.rowcount
+            
+            c.executemany('''UPDATE alerts SET resolved = 1
+                WHERE resolved = 0 AND product_id = ? AND alert_type IS NOT ?''',
+                [(int(pid), keep.get(int(pid))) for pid in product_ids])
+            resolved = c.rowcount
+            
+            after = self._active_alerts(c, ids) if listening else {}
+            c.executemany('DELETE FROM alert_dirty WHERE product_id = ? AND version = ?', dirty)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        if listening:
+            self._publish_alerts(before, after)
+        return written, resolved
+    
+    def _active_alerts(self, c, ids):
+        """Active alerts of the products in the JSON array ``ids``, shaped as /api/alerts serves them"""
+        c.execute('''SELECT a.*, p.product_name, p.brand, p.category, p.current_quantity
+            FROM alerts a LEFT JOIN products p ON a.product_id = p.product_id
+            WHERE a.resolved = 0 AND a.product_id IN (SELECT value FROM json_each(?))''', (ids,))
+        return {row['alert_id']: dict(row) for row in c.fetchall()}
+    
+    def _publish_alerts(self, before, after):
+        """Publish raised, updated and resolved alerts between two _active_alerts snapshots"""
+        for alert_id, alert in after.items():
+            old = before.get(alert_id)
+            if old is None:
+                action = 'raised'
+            elif any(old[key] != alert[key] for key in ('severity', 'message', 'recommendation')):
+                action = 'updated'
+            else:
+                continue
+            event_bus.publish('alert', {'action': action, 'alert_id': alert_id,
+                                        'product_id': alert['product_id'], 'alert': alert})
+        for alert_id in before.keys() - after.keys():
+            event_bus.publish('alert', {'action': 'resolved', 'alert_id': alert_id,
+                                        'product_id': before[alert_id]['product_id']})
+        event_bus.publish('stats', {'active_alerts': len(after) - len(before)})
+    
+    def resolve_alert(self, alert_id):
+        """Mark one alert resolved"""
+        conn = self.get_conn()
+        c = conn.cursor()
+        c.execute('''UPDATE alerts SET resolved = 1 WHERE alert_id = ? AND resolved = 0
+            RETURNING product_id''', (alert_id,))
+        resolved = c.fetchall()
+        conn.commit()
+        
+        if resolved:
+            event_bus.publish('alert', {'action': 'resolved', 'alert_id': alert_id,
+                                        'product_id': resolved[0][0]})
+            event_bus.publish('stats', {'active_alerts': -1})
+    
     def create_alert(self, product_id, alert_type, severity, message, recommendation):
         """Create alert"""
         conn = self.get_conn()
@@ -332,7 +934,7 @@ class Database:
     
     def get_stats(self):
         """Dashboard stats"""
-        conn = self.get_conn()
+        conn = self.get_read_conn()
         c = conn.cursor()
         
         stats = {}
@@ -345,8 +947,8 @@ class Database:
         c.execute('SELECT COUNT(*) FROM alerts WHERE resolved = 0')
         stats['active_alerts'] = c.fetchone()[0]
         
-        c.execute('''SELECT SUM(revenue) FROM sales 
-            WHERE sale_date >= date('now', '-30 days')''')
+        c.execute('''SELECT SUM(revenue) FROM daily_sales 
+            WHERE day >= date('now', '-30 days')''')
         stats['monthly_revenue'] = c.fetchone()[0] or 0
         
         return stats
@@ -381,7 +983,7 @@ class Database:
         c.execute('DELETE FROM suppliers WHERE supplier_id = ?', (supplier_id,))
         conn.commit()
     
-    def __del__(self):
-        """Close connection on cleanup"""
-        if self.conn:
-            self.conn.close()
\ No newline at end of file
+    def close(self):
+        """Close pooled connections"""
+        self.pool.close()
+        self.read_pool.close()
\ No newline at end of file
@@ -0,0 +1,143 @@
+"""In-process publish/subscribe bus behind the /api/stream endpoint
+
+Database write paths publish small events once they have committed:
+  * stock:   {product_id, current_quantity, delta}
+  * alert:   {action: raised | updated | resolved, alert_id, product_id, alert}
+  * stats:   dashboard counter deltas, e.g. {inventory_value: -250.0}
+  * product: {action, product_id} when catalog rows are added, edited or removed
+  * resync:  state changed in bulk; clients reload their snapshot
+
+Every stream client subscribes with a bounded queue. A client that falls
+STREAM_QUEUE_SIZE events behind is sent ``resync`` instead of slowing the
+writers down. Events never leave the process, so writes made elsewhere
+(``manage.py worker``) reach clients on their next resync only.
+"""
+import json
+import queue
+import threading
+
+from config import STREAM_BATCH, STREAM_KEEPALIVE_SECONDS, STREAM_QUEUE_SIZE, STREAM_RETRY_MS
+
+
+class Subscription:
+    """One listener's queue of (kind, data) events"""
+
+    def __init__(self, size):
+        self.queue = queue.Queue(size)
+        self.overflowed = False
+
+
+class EventBus:
+    """Fans events out to every subscriber's queue without blocking the publisher"""
+
+    def __init__(self, queue_size=STREAM_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def active(self):
+        """Whether anyone is listening; publishers skip building events otherwise"""
+        return bool(self._subscribers)
+
+    def subscribe(self):
+        subscription = Subscription(self.queue_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def publish(self, kind, data):
+        with self._lock:
+            if not self._subscribers:
+                return
+            event = (kind, data)
+            subscribers = list(self._subscribers)
+            self.published += 1
+        for subscription in subscribers:
+            try:
+                subscription.queue.put_nowait(event)
+            except queue.Full:
+                subscription.overflowed = True
+
+    def stats(self):
+        return {'subscribers': len(self._subscribers), 'published': self.published}
+
+
+def coalesce(events):
+    """Merge a burst of events into the fewest deltas
+
+    Stock changes merge per product (deltas summed, last quantity kept),
+    alert changes per alert and stats deltas into one event.
+    """
+    other, stock, alerts, stats = [], {}, {}, {}
+    for kind, data in events:
+        if kind == 'stock':
+            previous = stock.get(data['product_id'])
+            if previous:
+                data = dict(data, delta=previous['delta'] + data['delta'])
+            stock[data['product_id']] = data
+        elif kind == 'alert':
+            previous = alerts.get(data['alert_id'])
+            if previous and previous['action'] == 'raised' and data['action'] == 'updated':
+                data = dict(data, action='raised')
+            alerts[data['alert_id']] = data
+        elif kind == 'stats':
+            for key, value in data.items():
+                stats[key] = stats.get(key, 0) + value
+        else:
+            other.append((kind, data))
+
+    merged = other + [('stock', data) for data in stock.values()]
+    merged += [('alert', data) for data in alerts.values()]
+    stats = {key: value for key, value in stats.items() if value}
+    if stats:
+        merged.append(('stats', stats))
+    return merged
+
+
+def format_event(kind, data):
+    """One server-sent event"""
+    return f"event: {kind}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream_events(bus, keepalive=STREAM_KEEPALIVE_SECONDS, batch=STREAM_BATCH):
+    """Server-sent events for one client until it disconnects
+
+    Blocks for the next event, then drains whatever else is queued and
+    sends it coalesced. A comment line goes out every ``keepalive``
+    seconds so proxies keep the connection open and a dropped client is
+    noticed.
+    """
+    subscription = bus.subscribe()
+    try:
+        yield f"retry: {STREAM_RETRY_MS}\n\n"
+        while True:
+            if subscription.overflowed:
+                # Drop the backlog; the client reloads its snapshot instead
+                while not subscription.queue.empty():
+                    subscription.queue.get_nowait()
+                subscription.overflowed = False
+                yield format_event('resync', {})
+                continue
+
+            try:
+                events = [subscription.queue.get(timeout=keepalive)]
+            except queue.Empty:
+                yield ': keepalive\n\n'
+                continue
+            while len(events) < batch:
+                try:
+                    events.append(subscription.queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            yield ''.join(format_event(kind, data) for kind, data in coalesce(events))
+    finally:
+        bus.unsubscribe(subscription)
+
+
+event_bus = EventBus()
@@ -0,0 +1,190 @@
+"""Vectorized feature engine for demand forecasting
+
+Builds the same daily features as ``NBEATSForecaster.prepare_data`` and
+the lookback windows used for training, with NumPy only. Windows are
+strided views over one float32 feature array, so building the training
+matrix never copies individual rows.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import as_strided, sliding_window_view
+
+FEATURE_COLS = ['value', 'day_of_week', 'day_of_month', 'month', 'is_weekend',
+                'lag_1', 'lag_7', 'lag_14', 'lag_30',
+                'rolling_mean_7', 'rolling_mean_14', 'rolling_mean_30']
+
+LAGS = [1, 7, 14, 30]
+ROLLING_WINDOWS = [7, 14, 30]
+
+# Feature subsets a forecaster can be tuned with; dropped columns are zeroed
+# so every model keeps the FEATURE_COLS layout
+FEATURE_SETS = {
+    'all': FEATURE_COLS,
+    'no_calendar': ['value', 'lag_1', 'lag_7', 'lag_14', 'lag_30',
+                    'rolling_mean_7', 'rolling_mean_14', 'rolling_mean_30'],
+    'no_rolling': ['value', 'day_of_week', 'day_of_month', 'month', 'is_weekend',
+                   'lag_1', 'lag_7', 'lag_14', 'lag_30'],
+    'lags_only': ['value', 'lag_1', 'lag_7', 'lag_14', 'lag_30'],
+}
+
+
+def feature_mask(feature_set='all'):
+    """Boolean mask over FEATURE_COLS for a FEATURE_SETS entry"""
+    keep = set(FEATURE_SETS[feature_set])
+    return np.array([col in keep for col in FEATURE_COLS])
+
+
+def calendar_features(dates):
+    """Day of week, day of month, month and weekend flag for datetime64 dates"""
+    days = np.asarray(dates, dtype='datetime64[D]')
+    months = days.astype('datetime64[M]')
+
+    # 1970-01-01 was a Thursday (Monday = 0)
+    day_of_week = (days.astype(np.int64) + 3) % 7
+    day_of_month = (days - months).astype(np.int64) + 1
+    month = months.astype(np.int64) % 12 + 1
+    is_weekend = (day_of_week >= 5).astype(np.int64)
+
+    return day_of_week, day_of_month, month, is_weekend
+
+
+def build_features(values, dates):
+    """Build the FEATURE_COLS matrix for one or many daily series
+
+    ``values`` is shaped (days,) or (series, days) and ``dates`` holds the
+    shared calendar of length ``days``. Returns float32 features shaped
+    (days, n_features) or (series, days, n_features).
+    """
+    values = np.asarray(values, dtype=np.float64)
+    single = values.ndim == 1
+    if single:
+        values = values[np.newaxis, :]
+
+    n_series, n_days = values.shape
+    out = np.zeros((n_series, n_days, len(FEATURE_COLS)), dtype=np.float32)
+
+    out[:, :, 0] = values
+    for col, feature in enumerate(calendar_features(dates), start=1):
+        out[:, :, col] = feature
+
+    # Lags are zero before the series starts (matches shift + fillna(0))
+    col = 5
+    for lag in LAGS:
+        if lag < n_days:
+            out[:, lag:, col] = values[:, :-lag]
+        col += 1
+
+    # Rolling means with min_periods=1 from a running sum
+    csum = np.cumsum(values, axis=1)
+    for window in ROLLING_WINDOWS:
+        total = csum.copy()
+        total[:, window:] -= csum[:, :-window]
+        counts = np.minimum(np.arange(1, n_days + 1), window)
+        out[:, :, col] = total / counts
+        col += 1
+
+    return out[0] if single else out
+
+
+def sliding_windows(features, lookback):
+    """All lookback windows of a feature array as a read-only strided view
+
+    ``features`` shaped (days, n_features) gives (days - lookback + 1,
+    lookback * n_features); a batch shaped (series, days, n_features) gives
+    (series, days - lookback + 1, lookback * n_features). Row ``i`` is the
+    flattened block ``features[i:i + lookback]``.
+    """
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    n_days, n_features = features.shape[-2:]
+    n_windows = n_days - lookback + 1
+    if n_windows <= 0:
+        raise ValueError(f"Need more than {lookback} days, got {n_days}")
+
+    row_stride, item_stride = features.strides[-2:]
+    shape = features.shape[:-2] + (n_windows, lookback * n_features)
+    strides = features.strides[:-2] + (row_stride, item_stride)
+    return as_strided(features, shape=shape, strides=strides, writeable=False)
+
+
+def training_windows(features, lookback):
+    """Inputs and next-day targets for one series or an equal-length batch
+
+    Window ``i`` covers days ``i .. i + lookback - 1`` and its target is the
+    value on day ``i + lookback``.
+    """
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    X = sliding_windows(features, lookback)[..., :-1, :]
+    y = features[..., lookback:, 0]
+    return X, y
+
+
+def direct_windows(features, lookback, horizon):
+    """Inputs and multi-day targets for direct multi-horizon training
+
+    Window ``i`` covers days ``i .. i + lookback - 1`` and its target row is
+    the values on days ``i + lookback .. i + lookback + horizon - 1``. Both
+    are strided views.
+    """
+    features = np.ascontiguousarray(features, dtype=np.float32)
+    n_days = features.shape[-2]
+    width = lookback * features.shape[-1]
+    n_windows = n_days - lookback - horizon + 1
+    if n_windows <= 0:
+        return (np.empty(features.shape[:-2] + (0, width), dtype=np.float32),
+                np.empty(features.shape[:-2] + (0, horizon), dtype=np.float32))
+
+    targets = sliding_window_view(features[..., lookback:, 0], horizon, axis=-1)
+    return sliding_windows(features, lookback)[..., :n_windows, :], targets
+
+
+def rollout_features(values, dates):
+    """Next-day features laid out exactly as the recursive rollout builds them
+
+    Row ``k`` predicts ``values[t]`` for ``t = k + 30`` from the previous
+    day's value, day ``t``'s calendar, lags 1/7/14/30 and the trailing
+    7/14/30-day means ending on day ``t - 1``. Returns float32 X and the
+    matching targets; series of 30 days or fewer give no rows.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_days = len(values)
+    window = max(LAGS)
+    n_rows = n_days - window
+    if n_rows <= 0:
+        return (np.empty((0, len(FEATURE_COLS)), dtype=np.float32),
+                np.empty(0, dtype=np.float32))
+
+    X = np.empty((n_rows, len(FEATURE_COLS)), dtype=np.float32)
+    previous = values[window - 1:n_days - 1]
+    X[:, 0] = previous
+    for col, feature in enumerate(calendar_features(np.asarray(dates)[window:]), start=1):
+        X[:, col] = feature
+    for col, lag in enumerate(LAGS, start=5):
+        X[:, col] = values[window - lag:n_days - lag]
+
+    # csum[k] is the sum of values[:k]
+    csum = np.concatenate([[0.0], np.cumsum(values)])
+    for col, size in enumerate(ROLLING_WINDOWS, start=9):
+        X[:, col] = (csum[window:n_days] - csum[window - size:n_days - size]) / size
+
+    return X, values[window:].astype(np.float32)
+
+
+def stack_training_windows(feature_list, lookback):
+    """Stack training windows of series with different lengths
+
+    Returns X, y and the index of the series each row came from.
+    """
+    Xs, ys, owners = [], [], []
+    for i, features in enumerate(feature_list):
+        if len(features) <= lookback:
+            continue
+        X, y = training_windows(features, lookback)
+        Xs.append(X)
+        ys.append(y)
+        owners.append(np.full(len(y), i, dtype=np.int32))
+
+    if not Xs:
+        width = lookback * len(FEATURE_COLS)
+        return (np.empty((0, width), dtype=np.float32),
+                np.empty(0, dtype=np.float32), np.empty(0, dtype=np.int32))
+
+    return np.concatenate(Xs), np.concatenate(ys), np.concatenate(owners)
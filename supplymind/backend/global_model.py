@@ -0,0 +1,283 @@
+"""Pooled cross-product forecasting model
+
+One Ridge model is fit over every product's daily series in a single
+vectorized fit. Each series is divided by its own mean demand so fast and
+slow movers share coefficients, and category and demand-scale features let
+the model tell them apart. The model is refit nightly and saved to disk;
+serving a forecast is a lockstep rollout over the shared coefficients.
+"""
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+
+from config import (CATEGORIES, FORECAST_DAYS, FORECAST_HISTORY_DAYS, GLOBAL_ALPHA,
+                    GLOBAL_MIN_DAYS, GLOBAL_MODEL_PATH)
+from features import FEATURE_COLS, rollout_features
+from model_cache import ModelFile, write_npz
+from inference import ROLLOUT_WINDOW, format_forecast, generate_recommendations, recursive_rollout
+
+CATEGORY_NAMES = list(CATEGORIES) + ['Other']
+
+
+def product_features(categories, scales):
+    """Category one-hot plus log demand scale for each product"""
+    index = {name: i for i, name in enumerate(CATEGORY_NAMES)}
+    out = np.zeros((len(categories), len(CATEGORY_NAMES) + 1))
+    columns = [index.get(category, len(CATEGORY_NAMES) - 1) for category in categories]
+    out[np.arange(len(categories)), columns] = 1
+    out[:, -1] = np.log1p(scales)
+    return out
+
+
+def daily_matrix(sales, product_ids, end_date, days):
+    """Pivot daily_sales rows into a (products, days) matrix ending on end_date
+
+    ``sales`` is a get_daily_sales DataFrame or get_daily_columns arrays.
+    """
+    start = np.datetime64(end_date, 'D') - (days - 1)
+    matrix = np.zeros((len(product_ids), days))
+    quantities = np.asarray(sales['quantity_sold'], dtype=np.float64)
+    if len(quantities) == 0 or len(product_ids) == 0:
+        return matrix
+
+    day_index = (np.asarray(sales['sale_date']).astype('datetime64[D]') - start).astype(np.int64)
+    ids = np.asarray(product_ids, dtype=np.int64)
+    order = np.argsort(ids)
+    product_col = np.asarray(sales['product_id'], dtype=np.int64)
+    found = np.minimum(np.searchsorted(ids[order], product_col), len(ids) - 1)
+    rows = order[found]
+    keep = (ids[rows] == product_col) & (day_index >= 0) & (day_index < days)
+    np.add.at(matrix, (rows[keep], day_index[keep]), quantities[keep])
+    return matrix
+
+
+class GlobalForecaster:
+    """One forecasting model shared by every product"""
+
+    def __init__(self):
+        self.coef = None
+        self.intercept = 0.0
+        self.feature_mean = None
+        self.feature_scale = None
+        self.product_ids = np.empty(0, dtype=np.int64)
+        self.scales = np.empty(0)
+        self.product_bias = np.empty(0)
+        self.end_date = None
+        self.metrics = {}
+        self.trained_at = None
+        self._index = {}
+
+    def fit(self, db, days=FORECAST_HISTORY_DAYS, alpha=GLOBAL_ALPHA):
+        """Fit the pooled model over the whole catalog"""
+        products = db.get_all_products()
+        sales = db.get_daily_sales(days=days)
+        if sales.empty:
+            return False, "No sales history"
+
+        end_date = np.datetime64(sales['sale_date'].max(), 'D')
+        ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+        matrix = daily_matrix(sales, ids, end_date, days)
+        return self.train(matrix, products, end_date, alpha=alpha)
+
+    def train(self, matrix, products, end_date, alpha=GLOBAL_ALPHA):
+        """Fit on a (products, days) daily demand matrix ending on end_date"""
+        # Training only; serving this model never needs scikit-learn
+        from sklearn.linear_model import Ridge
+        from sklearn.preprocessing import StandardScaler
+
+        days = matrix.shape[1]
+        dates = end_date - np.arange(days)[::-1]
+
+        # Validate on targets in the last 20% of the calendar
+        cutoff = int(days * 0.8)
+        X_parts, y_parts, owners, target_days = [], [], [], []
+        kept, scales, categories = [], [], []
+
+        for i, product in enumerate(products):
+            series = matrix[i]
+            if (series > 0).sum() < GLOBAL_MIN_DAYS:
+                continue
+            first = int(np.argmax(series > 0))
+            scale = series[first:].mean()
+            X, y = rollout_features(series[first:] / scale, dates[first:])
+            if len(y) == 0:
+                continue
+
+            X_parts.append(X)
+            y_parts.append(y)
+            owners.append(np.full(len(y), len(kept), dtype=np.int32))
+            target_days.append(np.arange(first + ROLLOUT_WINDOW, days))
+            kept.append(product['product_id'])
+            scales.append(scale)
+            categories.append(product['category'])
+
+        if not kept:
+            return False, f"No product has {GLOBAL_MIN_DAYS}+ days of sales"
+
+        scales = np.array(scales)
+        owner = np.concatenate(owners)
+        pf = product_features(categories, scales).astype(np.float32)
+        X = np.hstack([np.concatenate(X_parts), pf[owner]])
+        y = np.concatenate(y_parts)
+        train = np.concatenate(target_days) < cutoff
+
+        print(f"📊 Pooled fit: {len(kept)} products, {len(y)} rows, {X.shape[1]} features")
+
+        # Holdout metrics in original units
+        if train.any() and (~train).any():
+            scaler = StandardScaler().fit(X[train])
+            model = Ridge(alpha=alpha).fit(scaler.transform(X[train]), y[train])
+            y_pred = np.maximum(model.predict(scaler.transform(X[~train])), 0) * scales[owner[~train]]
+            self.metrics = holdout_metrics(y[~train] * scales[owner[~train]], y_pred)
+
+        # Serve from a fit over every row
+        scaler = StandardScaler().fit(X)
+        model = Ridge(alpha=alpha).fit(scaler.transform(X), y)
+
+        self.coef = model.coef_.astype(np.float64)
+        self.intercept = float(model.intercept_)
+        self.feature_mean = scaler.mean_
+        self.feature_scale = scaler.scale_
+        self.product_ids = np.array(kept, dtype=np.int64)
+        self.scales = scales
+        self.end_date = end_date
+        self.trained_at = datetime.now().isoformat(timespec='seconds')
+
+        # Product features are constant per product, so fold them into a bias
+        weights, bias = self.effective_weights()
+        n_series = len(FEATURE_COLS)
+        self.product_bias = bias + product_features(categories, scales) @ weights[n_series:]
+        self._index = {pid: i for i, pid in enumerate(kept)}
+        return True, f"Pooled model trained on {len(kept)} products"
+
+    def effective_weights(self):
+        """Fold the scaler into the Ridge coefficients"""
+        weights = self.coef / self.feature_scale
+        bias = self.intercept - float((self.coef * self.feature_mean / self.feature_scale).sum())
+        return weights, bias
+
+    def covers(self, product_id):
+        """Whether the product was part of the pooled fit"""
+        return product_id in self._index
+
+    def predict(self, db, product_ids, days=FORECAST_DAYS):
+        """Forecast covered products in one lockstep rollout
+
+        Returns (product_ids, first_date, predictions) in original units.
+        """
+        product_ids = [pid for pid in product_ids if pid in self._index]
+        if not product_ids:
+            return [], None, np.empty((0, days))
+
+        if len(product_ids) == 1:
+            sales = db.get_daily_columns(product_ids[0], days=ROLLOUT_WINDOW + 1)
+        else:
+            sales = db.get_daily_columns(days=ROLLOUT_WINDOW + 1)
+
+        end_date = self.end_date
+        if len(sales['sale_date']):
+            end_date = max(end_date, sales['sale_date'].max())
+
+        history = daily_matrix(sales, product_ids, end_date, ROLLOUT_WINDOW)
+        return product_ids, end_date + 1, self.rollout(product_ids, history, end_date + 1, days)
+
+    def rollout(self, product_ids, history, first_date, days=FORECAST_DAYS):
+        """Forecast covered products from their last ROLLOUT_WINDOW daily values"""
+        rows = np.array([self._index[pid] for pid in product_ids])
+        scales = self.scales[rows]
+
+        weights, _ = self.effective_weights()
+        series_weights = np.broadcast_to(weights[:len(FEATURE_COLS)], (len(rows), len(FEATURE_COLS)))
+        first_dates = np.full(len(rows), np.datetime64(first_date, 'D'))
+
+        predictions = recursive_rollout(series_weights, self.product_bias[rows],
+                                        history / scales[:, np.newaxis], first_dates, days,
+                                        round_previous=False)
+        return predictions * scales[:, np.newaxis]
+
+    def forecast_product(self, db, product, days=FORECAST_DAYS):
+        """API-shaped forecast for one product, or None if it is not covered"""
+        if not self.covers(product['product_id']):
+            return None
+
+        _, first_date, predictions = self.predict(db, [product['product_id']], days)
+        forecast = format_forecast(predictions[0], first_date)
+        return {
+            'success': True,
+            'engine': 'global',
+            'forecast': forecast,
+            'accuracy': self.metrics or holdout_metrics(np.zeros(1), np.zeros(1)),
+            'recommendations': generate_recommendations(product, forecast)
+        }
+
+    def save(self, path=GLOBAL_MODEL_PATH):
+        """Write the model atomically as a .npz archive"""
+        write_npz(path, {
+            'coef': self.coef,
+            'intercept': np.array(self.intercept),
+            'feature_mean': self.feature_mean,
+            'feature_scale': self.feature_scale,
+            'product_ids': self.product_ids,
+            'scales': self.scales,
+            'product_bias': self.product_bias,
+            'end_date': np.array(self.end_date),
+            'meta': np.array(json.dumps({'metrics': self.metrics, 'trained_at': self.trained_at}))
+        })
+
+    @classmethod
+    def load(cls, path=GLOBAL_MODEL_PATH):
+        """Read a model written by save()"""
+        model = cls()
+        with np.load(path, allow_pickle=False) as data:
+            model.coef = data['coef']
+            model.intercept = float(data['intercept'])
+            model.feature_mean = data['feature_mean']
+            model.feature_scale = data['feature_scale']
+            model.product_ids = data['product_ids']
+            model.scales = data['scales']
+            model.product_bias = data['product_bias']
+            model.end_date = data['end_date'][()]
+            meta = json.loads(str(data['meta']))
+
+        model.metrics = meta['metrics']
+        model.trained_at = meta['trained_at']
+        model._index = {int(pid): i for i, pid in enumerate(model.product_ids)}
+        return model
+
+
+def holdout_metrics(y_true, y_pred):
+    """MAE, RMSE, MAPE, R² and accuracy, as reported by NBEATSForecaster"""
+    mae = np.mean(np.abs(y_true - y_pred))
+    rmse = np.sqrt(np.mean((y_true - y_pred) ** 2))
+    mask = y_true > 0
+    mape = np.mean(np.abs((y_true[mask] - y_pred[mask]) / y_true[mask])) * 100 if mask.any() else 15.0
+    ss_res = np.sum((y_true - y_pred) ** 2)
+    ss_tot = np.sum((y_true - np.mean(y_true)) ** 2)
+    return {
+        'mae': float(mae),
+        'rmse': float(rmse),
+        'r2': float(1 - ss_res / (ss_tot + 1e-10)),
+        'mape': float(mape),
+        'accuracy': float(max(0, min(100, 100 - mape)))
+    }
+
+
+_saved = ModelFile(GLOBAL_MODEL_PATH, GlobalForecaster.load)
+
+
+def load_global_model():
+    """Get the saved pooled model, reloading it after a nightly refit"""
+    return _saved.get()
+
+
+def fit_global_model(db, path=GLOBAL_MODEL_PATH):
+    """Refit the pooled model and save it, returns (success, message, model)"""
+    start = time.perf_counter()
+    model = GlobalForecaster()
+    success, message = model.fit(db)
+    if success:
+        model.save(path)
+        message = f"{message} in {time.perf_counter() - start:.1f}s"
+    return success, message, model
@@ -0,0 +1,283 @@
+"""Prophet + gradient boosting engine (models.HybridForecaster)
+
+A hybrid fit takes seconds, so all hybrid work runs on a process pool and
+the serving process never imports Prophet or pandas. Fitted models are
+pickled under HYBRID_MODEL_DIR keyed by the product's sales watermark
+(``<product_id>-<watermark>.pkl``) and reused until a sale arrives.
+
+Requests never wait for a fit. Without a model at the product's watermark
+a fit is submitted to the pool and the request falls back at once to the
+fast engines in ``forecast_service``; requests after the fit finishes are
+served from its cached model. While a fit for a watermark is in flight it
+is not submitted again. Each fit gets HYBRID_FIT_BUDGET seconds, and a fit
+that fails or overruns leaves a ``.skip`` marker for that watermark so the
+product keeps falling back until its next sale. Sparse products always go
+to the intermittent-demand engine.
+"""
+import contextlib
+import io
+import os
+import pickle
+import signal
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+
+import numpy as np
+
+from config import (FORECAST_DAYS, HYBRID_FIT_BUDGET, HYBRID_HISTORY_DAYS, HYBRID_MODEL_DIR,
+                    HYBRID_PREDICT_TIMEOUT, HYBRID_WORKERS)
+from global_model import daily_matrix
+from inference import generate_recommendations
+from intermittent import is_sparse
+
+
+class FitTimeout(Exception):
+    """A hybrid fit ran over its budget"""
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    """Raise FitTimeout in the block after ``seconds`` (main thread on POSIX, else no limit)"""
+    if (not seconds or not hasattr(signal, 'setitimer')
+            or threading.current_thread() is not threading.main_thread()):
+        yield
+        return
+
+    def expire(signum, frame):
+        raise FitTimeout(f"fit exceeded {seconds}s")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def fit_series(values, dates, budget=HYBRID_FIT_BUDGET):
+    """Fit a HybridForecaster on one daily series
+
+    Returns (model, status) with status 'fitted', 'failed' or 'timeout';
+    the model is None unless fitted.
+    """
+    import pandas as pd
+    from models import HybridForecaster
+
+    model = HybridForecaster()
+    sales = pd.DataFrame({'sale_date': np.asarray(dates).astype(str), 'quantity_sold': values})
+    start = time.perf_counter()
+    try:
+        with time_limit(budget):
+            trained = model.train(sales)
+    except FitTimeout:
+        trained = False
+    if trained:
+        return model, 'fitted'
+    return None, 'timeout' if budget and time.perf_counter() - start >= budget else 'failed'
+
+
+def model_path(directory, product_id, watermark, suffix='pkl'):
+    return os.path.join(directory, f"{product_id}-{watermark}.{suffix}")
+
+
+def _store(directory, product_id, watermark, model):
+    """Write a fitted model (or a skip marker when None), dropping older watermarks"""
+    os.makedirs(directory, exist_ok=True)
+    for name in os.listdir(directory):
+        if name.startswith(f"{product_id}-") and not name.startswith(f"{product_id}-{watermark}."):
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(os.path.join(directory, name))
+
+    path = model_path(directory, product_id, watermark, 'pkl' if model is not None else 'skip')
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        if model is not None:
+            pickle.dump(model, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _load(directory, product_id, watermark):
+    with open(model_path(directory, product_id, watermark), 'rb') as f:
+        return pickle.load(f)
+
+
+def _fit_worker(directory, product_id, watermark, values, dates, budget):
+    """Worker: fit one product and cache the model (or a skip marker)"""
+    start = time.perf_counter()
+    # Prophet and cmdstan report every fit; keep worker output quiet
+    with contextlib.redirect_stdout(io.StringIO()):
+        model, status = fit_series(values, dates, budget)
+    _store(directory, product_id, watermark, model)
+    return product_id, status, time.perf_counter() - start
+
+
+def _forecast_worker(directory, product_id, watermark, days):
+    """Worker: forecast one product from its cached model
+
+    Returns (status, forecast rows, metrics); rows are None if the model
+    could not predict.
+    """
+    model = _load(directory, product_id, watermark)
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = model.predict(days)
+    if rows is None:
+        return 'failed', None, None
+    forecast = [{
+        'date': row['date'],
+        'demand': row['predicted_demand'],
+        'lower': row['confidence_lower'],
+        'upper': row['confidence_upper']
+    } for row in rows]
+    return 'cached', forecast, model.get_accuracy()
+
+
+def load_history(db, product_ids, days=HYBRID_HISTORY_DAYS):
+    """Daily matrix of complete days up to yesterday, and its dates"""
+    yesterday = np.datetime64('today', 'D') - 1
+    # A single product reads only its own rows
+    product_id = int(product_ids[0]) if len(product_ids) == 1 else None
+    columns = db.get_daily_columns(product_id, days=days)
+    matrix = daily_matrix(columns, product_ids, yesterday, days)
+    return matrix, yesterday - np.arange(days)[::-1]
+
+
+def _trim(row, dates):
+    """A series from its first sale on, as the other per-product engines train on"""
+    first = int(np.argmax(row > 0))
+    return row[first:], dates[first:]
+
+
+class HybridEngine:
+    """Serves hybrid forecasts from the on-disk model cache, fitting on a process pool"""
+
+    def __init__(self, directory=HYBRID_MODEL_DIR, workers=HYBRID_WORKERS, budget=HYBRID_FIT_BUDGET):
+        self.directory = directory
+        self.workers = workers
+        self.budget = budget
+        self._pool = None
+        self._lock = threading.Lock()
+        # (product_id, watermark) -> future of the fit in flight for it
+        self._pending = {}
+
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers)
+            return self._pool
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+            self._pending.clear()
+
+    def forecast_product(self, db, product, days=FORECAST_DAYS):
+        """API-shaped forecast for one product, or None to fall back to a fast engine
+
+        Only a model already fitted at the product's sales watermark is
+        served; otherwise a fit is started and None returned straight away.
+        """
+        product_id = product['product_id']
+        watermark = db.get_sales_version(product_id)
+        if os.path.exists(model_path(self.directory, product_id, watermark, 'skip')):
+            return None
+        if not os.path.exists(model_path(self.directory, product_id, watermark)):
+            self.start_fit(db, product_id, watermark)
+            return None
+
+        future = self.pool().submit(_forecast_worker, self.directory, product_id, watermark, days)
+        try:
+            status, forecast, metrics = future.result(timeout=HYBRID_PREDICT_TIMEOUT)
+        except TimeoutError:
+            print(f"⏱️ Hybrid prediction for product {product_id} queued too long, using the fast engine")
+            return None
+        if forecast is None:
+            print(f"⚠️ Hybrid prediction for product {product_id} {status}, using the fast engine")
+            return None
+
+        return {
+            'success': True,
+            'engine': 'hybrid',
+            'forecast': forecast,
+            'accuracy': metrics,
+            'recommendations': generate_recommendations(product, forecast)
+        }
+
+    def start_fit(self, db, product_id, watermark):
+        """Fit a product on the pool in the background, unless it is sparse or already being fitted
+
+        Returns the fit's future, or None if no fit was started.
+        """
+        key = (product_id, watermark)
+        if key in self._pending:
+            print(f"⏳ Hybrid fit for product {product_id} still running, using the fast engine")
+            return None
+
+        history, history_dates = load_history(db, [product_id])
+        if not history.any() or is_sparse(history)[0]:
+            return None
+        values, dates = _trim(history[0], history_dates)
+
+        pool = self.pool()
+        with self._lock:
+            if key in self._pending:
+                return None
+            future = pool.submit(_fit_worker, self.directory, product_id, watermark,
+                                 values, dates, self.budget)
+            self._pending[key] = future
+        future.add_done_callback(lambda done: self._finished(key, done))
+        print(f"🔮 Fitting hybrid model for product {product_id} in the background, using the fast engine")
+        return future
+
+    def _finished(self, key, future):
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+        if not future.cancelled() and future.exception() is not None:
+            print(f"❌ Hybrid fit for product {key[0]} crashed: {future.exception()}")
+
+    def fit_catalog(self, db, category=None, force=False):
+        """Fit every dense product without a cached model at its watermark
+
+        Returns a summary dict with counts per fit status.
+        """
+        start = time.perf_counter()
+        products = db.get_products_by_category(category) if category else db.get_all_products()
+        versions = db.get_sales_versions()
+        ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+        matrix, dates = load_history(db, ids)
+
+        summary = {'fitted': 0, 'failed': 0, 'timeout': 0, 'cached': 0, 'sparse': 0}
+        todo = []
+        for product_id, row, sparse in zip(ids.tolist(), matrix, is_sparse(matrix)):
+            watermark = versions.get(product_id, 0)
+            if sparse or not row.any():
+                summary['sparse'] += 1
+            elif not force and (os.path.exists(model_path(self.directory, product_id, watermark))
+                                or os.path.exists(model_path(self.directory, product_id, watermark, 'skip'))):
+                summary['cached'] += 1
+            else:
+                todo.append((product_id, watermark, *_trim(row, dates)))
+
+        print(f"🔮 Fitting hybrid models for {len(todo)} products "
+              f"({summary['cached']} cached, {summary['sparse']} sparse) on {self.workers} workers")
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(_fit_worker, self.directory, *item, self.budget) for item in todo]
+            for future in as_completed(futures):
+                product_id, status, seconds = future.result()
+                summary[status] += 1
+                print(f"   product {product_id}: {status} in {seconds:.1f}s")
+
+        summary['seconds'] = time.perf_counter() - start
+        return summary
+
+
+hybrid_engine = HybridEngine()
+
+
+def load_hybrid_engine():
+    """The hybrid engine; it always exists, models are fitted on demand"""
+    return hybrid_engine
@@ -0,0 +1,139 @@
+"""Intermittent-demand forecasting (Croston, SBA and TSB) for sparse products
+
+Long-tail products sell on a few scattered days, which the regression
+engines cannot learn from. These methods smooth demand sizes and the
+intervals (or probability) of demand separately and forecast a flat daily
+rate:
+  * croston: size / interval, both smoothed at demand days only
+  * sba:     Croston with the Syntetos-Boylan bias correction (1 - alpha/2)
+  * tsb:     size x demand probability, the probability smoothed every day
+             so it decays while a product stops selling
+
+Every method works on a whole (products, days) matrix at once. Exponential
+smoothing started at the first observation has closed-form weights, so
+the final level of each row is one weighted bincount over the nonzero
+entries, with no loop over products or days.
+
+A product is routed here when it has fewer than MIN_TRAINING_SAMPLES days
+with sales or its average demand interval exceeds INTERMITTENT_ADI (the
+Syntetos-Boylan cut-off between smooth and intermittent demand).
+"""
+import numpy as np
+
+from config import (INTERMITTENT_ADI, INTERMITTENT_ALPHA, INTERMITTENT_BETA, INTERMITTENT_HOLDOUT,
+                    INTERMITTENT_METHOD, MIN_TRAINING_SAMPLES)
+from inference import format_forecast, generate_recommendations
+
+METHODS = ('croston', 'sba', 'tsb')
+
+
+def _smooth_levels(rows, values, ranks, counts, alpha):
+    """Final exponential-smoothing level of each row's sequence
+
+    ``values`` are the sequence entries in order, ``ranks`` their 1-based
+    position in their row and ``counts`` the sequence length per row. The
+    first entry initialises the level, so its weight is (1 - alpha)^(n-1)
+    and the j-th entry's is alpha (1 - alpha)^(n-j).
+    """
+    n = counts[rows]
+    weights = np.where(ranks == 1, (1 - alpha) ** (n - 1), alpha * (1 - alpha) ** (n - ranks))
+    return np.bincount(rows, weights * values, minlength=len(counts))
+
+
+def demand_profile(matrix):
+    """Days with sales and average demand interval (ADI) of each row
+
+    The interval is measured from a product's first sale, so products newer
+    than the window are not mistaken for sparse ones.
+    """
+    sold = matrix > 0
+    sale_days = sold.sum(axis=1)
+    active_days = matrix.shape[1] - np.argmax(sold, axis=1)
+    adi = np.divide(active_days, sale_days, out=np.full(len(matrix), np.inf),
+                    where=sale_days > 0)
+    return sale_days, adi
+
+
+def is_sparse(matrix):
+    """Rows that should be forecast by this engine rather than a regression"""
+    sale_days, adi = demand_profile(matrix)
+    return (sale_days > 0) & ((sale_days < MIN_TRAINING_SAMPLES) | (adi > INTERMITTENT_ADI))
+
+
+def demand_rates(matrix, method=INTERMITTENT_METHOD, alpha=INTERMITTENT_ALPHA,
+                 beta=INTERMITTENT_BETA):
+    """Forecast daily demand rate of every row, 0 for rows without sales
+
+    Smoothing starts at each row's first sale, as ``demand_profile`` does,
+    so the empty days before a product was listed do not drag its rate down.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown intermittent method: {method} (choose from {', '.join(METHODS)})")
+
+    matrix = np.asarray(matrix, dtype=np.float64)
+    rows, cols = np.nonzero(matrix > 0)   # row-major, so each row's days are in order
+    counts = np.bincount(rows, minlength=len(matrix))
+    starts = np.cumsum(counts) - counts
+    ranks = np.arange(len(rows)) - starts[rows] + 1
+    sizes = _smooth_levels(rows, matrix[rows, cols], ranks, counts, alpha)
+
+    sold = counts > 0
+    first = np.argmax(matrix > 0, axis=1)
+    active_days = matrix.shape[1] - first
+
+    if method == 'tsb':
+        # Probability of a sale, smoothed over every day since the first sale
+        sold_probability = _smooth_levels(rows, np.ones(len(rows)), cols - first[rows] + 1,
+                                          active_days, beta)
+        return sizes * sold_probability
+
+    # Interval before each demand. The first sale has none; it is seeded with
+    # the mean of the later intervals, or the days since that sale if it is
+    # the only one.
+    intervals = np.diff(cols, prepend=-1).astype(np.float64)
+    intervals[starts[sold]] = 0
+    later = np.bincount(rows, intervals, minlength=len(matrix))
+    seeds = np.where(counts > 1, later / np.maximum(counts - 1, 1), active_days)
+    intervals[starts[sold]] = seeds[sold]
+    periods = _smooth_levels(rows, intervals, ranks, counts, alpha)
+
+    rates = np.divide(sizes, periods, out=np.zeros(len(matrix)), where=sold)
+    return rates * (1 - alpha / 2) if method == 'sba' else rates
+
+
+def holdout_metrics(matrix, method=INTERMITTENT_METHOD, holdout=INTERMITTENT_HOLDOUT):
+    """Accuracy metrics per row from refitting without the last ``holdout`` days"""
+    actual = matrix[:, -holdout:]
+    predicted = demand_rates(matrix[:, :-holdout], method)[:, np.newaxis]
+    error = actual - predicted
+
+    mae = np.abs(error).mean(axis=1)
+    rmse = np.sqrt((error ** 2).mean(axis=1))
+    sold = actual > 0
+    pct = np.where(sold, np.abs(error) / np.where(sold, actual, 1), 0.0)
+    mape = np.divide(pct.sum(axis=1) * 100, sold.sum(axis=1), out=np.full(len(matrix), 15.0),
+                     where=sold.any(axis=1))
+    ss_tot = ((actual - actual.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+    r2 = 1 - (error ** 2).sum(axis=1) / (ss_tot + 1e-10)
+    accuracy = np.clip(100 - mape, 0, 100)
+
+    return [{'mae': float(a), 'rmse': float(b), 'r2': float(c), 'mape': float(d), 'accuracy': float(e)}
+            for a, b, c, d, e in zip(mae, rmse, r2, mape, accuracy)]
+
+
+def forecast_intermittent(products, matrix, first_date, days, method=INTERMITTENT_METHOD):
+    """API-shaped forecasts for the rows of ``matrix``, one per product"""
+    rates = demand_rates(matrix, method)
+    metrics = holdout_metrics(matrix, method)
+    results = []
+    for product, rate, accuracy in zip(products, rates, metrics):
+        forecast = format_forecast(np.full(days, rate), first_date)
+        results.append({
+            'success': True,
+            'engine': 'intermittent',
+            'method': method,
+            'forecast': forecast,
+            'accuracy': accuracy,
+            'recommendations': generate_recommendations(product, forecast)
+        })
+    return results
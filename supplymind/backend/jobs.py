@@ -0,0 +1,407 @@
+"""Background job queue and scheduler
+
+Jobs live in the ``jobs`` table, so queued work survives restarts and
+several processes can share one queue. A bounded pool of worker threads
+claims jobs atomically, highest priority lane first, with the low lane
+capped so catalog-wide work never occupies every worker. Failed jobs are
+retried with exponential backoff.
+
+A claimed job records its owner (host, pid and a per-scheduler token) and
+the owner's scheduler heartbeats its running jobs every poll. Running jobs
+whose owner process is gone, or whose heartbeat is older than
+JOB_LEASE_SECONDS, are put back in the queue, at startup and on every poll.
+
+The scheduler thread enqueues:
+  * a nightly run (re-tune drifted products, forecast the catalog, then
+    reorder levels and alerts)
+  * a forecast refresh for any product with JOB_REFRESH_AFTER_SALES new
+    sales since the last check
+"""
+import json
+import math
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+from datetime import datetime
+
+from config import (FORECAST_DAYS, FORECAST_ENGINE, JOB_LANES, JOB_LEASE_SECONDS, JOB_LOW_LANE_LIMIT,
+                    JOB_MAX_ATTEMPTS, JOB_NIGHTLY_AT, JOB_POLL_SECONDS, JOB_REFRESH_AFTER_SALES,
+                    JOB_RETRY_DELAY, JOB_WORKERS, REORDER_LEAD_DAYS, REORDER_SERVICE_Z)
+from events import event_bus
+
+LOW_LANE = max(JOB_LANES.values())
+
+
+def forecast_key(product_id, days=FORECAST_DAYS, engine=FORECAST_ENGINE):
+    """Dedupe key of a forecast refresh; other horizons and engines refresh separately"""
+    return f'forecast-{product_id}-{days}-{engine}'
+
+
+def run_forecast_product(db, payload):
+    """Recompute and store one product's forecast"""
+    from forecast_service import compute_forecast
+
+    product = db.get_product(payload['product_id'])
+    if not product:
+        raise ValueError(f"Product not found: {payload['product_id']}")
+    result = compute_forecast(db, product, payload.get('days', FORECAST_DAYS),
+                              payload.get('engine', FORECAST_ENGINE))
+    return {'success': result['success'], 'error': result.get('error')}
+
+
+def run_forecast_catalog(db, payload):
+    """Forecast the whole catalog (or one category) on the process pool"""
+    from batch_forecast import forecast_catalog
+
+    succeeded = failed = 0
+    for result in forecast_catalog(db, category=payload.get('category'),
+                                   days=payload.get('days', FORECAST_DAYS)):
+        if result['success']:
+            succeeded += 1
+        else:
+            failed += 1
+    return {'succeeded': succeeded, 'failed': failed}
+
+
+def run_reorder_levels(db, payload):
+    """Set reorder levels from stored forecasts
+
+    Reorder level = expected demand over the lead time plus safety stock
+    for the configured service level, assuming independent daily errors.
+    The daily sigma is the RMSE of the engine that made the forecast
+    (forecast_runs.metrics), or, when the run reports none, the half-width
+    of the stored forecast band taken as a REORDER_SERVICE_Z interval.
+    Flat forecasts such as the intermittent-demand ones still get safety
+    stock this way.
+    """
+    lead_days = payload.get('lead_days', REORDER_LEAD_DAYS)
+    rows = db.get_read_conn().execute('''SELECT f.product_id, AVG(f.predicted_demand),
+            AVG(f.upper_bound - f.lower_bound), r.metrics
+        FROM forecasts f LEFT JOIN forecast_runs r ON r.product_id = f.product_id
+        GROUP BY f.product_id''').fetchall()
+
+    updates = []
+    for product_id, mean, width, metrics in rows:
+        sigma = (json.loads(metrics) if metrics else {}).get('rmse') or 0.0
+        if sigma <= 0:
+            sigma = (width or 0.0) / (2 * REORDER_SERVICE_Z)
+        level = math.ceil(mean * lead_days + REORDER_SERVICE_Z * sigma * math.sqrt(lead_days))
+        updates.append((max(level, 1), product_id))
+
+    conn = db.get_conn()
+    conn.executemany('UPDATE products SET reorder_level = ? WHERE product_id = ?', updates)
+    conn.commit()
+    db.mark_alerts_dirty([product_id for _, product_id in updates])
+    event_bus.publish('resync', {})
+    return {'updated': len(updates)}
+
+
+def run_check_alerts(db, payload):
+    """Re-evaluate stock alerts for every product"""
+    from alert_system import AlertSystem
+
+    return {'alerts': len(AlertSystem(db).analyze_inventory())}
+
+
+def run_backtest_job(db, payload):
+    """Backtest forecast engines; results land in backtest_results"""
+    from backtest import run_backtest
+
+    run_id, results = run_backtest(db, engines=payload.get('engines'), category=payload.get('category'),
+                                   **{key: payload[key] for key in ('folds', 'horizon', 'step')
+                                      if key in payload})
+    return {'run_id': run_id, 'engines': [r['engine'] for r in results]}
+
+
+def run_tune(db, payload):
+    """Re-tune forecaster hyperparameters where the data drifted"""
+    from tuning import tune_catalog
+
+    return tune_catalog(db, category=payload.get('category'), force=payload.get('force', False),
+                        **{key: payload[key] for key in ('scope',) if key in payload})
+
+
+def run_nightly(db, payload):
+    """Nightly refresh: tuning, then forecasts, since reorder levels and alerts read them"""
+    return {
+        'tuning': run_tune(db, payload),
+        'forecasts': run_forecast_catalog(db, payload),
+        'reorder_levels': run_reorder_levels(db, payload),
+        'alerts': run_check_alerts(db, payload)
+    }
+
+
+HANDLERS = {
+    'forecast_product': run_forecast_product,
+    'forecast_catalog': run_forecast_catalog,
+    'reorder_levels': run_reorder_levels,
+    'check_alerts': run_check_alerts,
+    'backtest': run_backtest_job,
+    'tune': run_tune,
+    'nightly': run_nightly,
+}
+
+
+def _owner_alive(owner):
+    """Whether the process named in a job owner may still be running
+
+    Only owners on this host can be checked; others are judged by their
+    heartbeat alone.
+    """
+    host, _, rest = (owner or '').partition(':')
+    pid = rest.partition(':')[0]
+    if os.name != 'posix' or host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class JobQueue:
+    """The persistent queue in the jobs table"""
+
+    def __init__(self, db):
+        self.db = db
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    def enqueue(self, kind, payload=None, lane='normal', dedupe_key=None, once=False,
+                max_attempts=JOB_MAX_ATTEMPTS):
+        """Add a job, returns its id, or None if an equivalent job is pending
+
+        With ``dedupe_key`` a job is skipped while another with the same key
+        is queued or running; with ``once`` as well, if one ever existed.
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if lane not in JOB_LANES:
+            raise ValueError(f"Unknown job lane: {lane}")
+
+        conn = self.db.get_conn()
+        if once and dedupe_key and conn.execute(
+                'SELECT 1 FROM jobs WHERE dedupe_key = ?', (dedupe_key,)).fetchone():
+            return None
+
+        row = conn.execute('''INSERT OR IGNORE INTO jobs (kind, payload, priority, dedupe_key, max_attempts)
+            VALUES (?, ?, ?, ?, ?) RETURNING job_id''',
+            (kind, json.dumps(payload or {}), JOB_LANES[lane], dedupe_key, max_attempts)).fetchone()
+        conn.commit()
+        return row[0] if row else None
+
+    def claim(self):
+        """Atomically take the next runnable job, or None"""
+        conn = self.db.get_conn()
+        row = conn.execute('''UPDATE jobs SET status = 'running', attempts = attempts + 1,
+                started_at = CURRENT_TIMESTAMP, owner = ?, heartbeat_at = CURRENT_TIMESTAMP
+            WHERE job_id = (
+                SELECT job_id FROM jobs
+                WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP
+                  AND (priority < ? OR (SELECT COUNT(*) FROM jobs
+                                        WHERE status = 'running' AND priority = ?) < ?)
+                ORDER BY priority, job_id LIMIT 1)
+            RETURNING job_id, kind, payload, attempts, max_attempts''',
+            (self.owner, LOW_LANE, LOW_LANE, JOB_LOW_LANE_LIMIT)).fetchone()
+        conn.commit()
+        if not row:
+            return None
+        job_id, kind, payload, attempts, max_attempts = row
+        return {'job_id': job_id, 'kind': kind, 'payload': json.loads(payload),
+                'attempts': attempts, 'max_attempts': max_attempts}
+
+    def finish(self, job_id, result):
+        conn = self.db.get_conn()
+        conn.execute('''UPDATE jobs SET status = 'done', finished_at = CURRENT_TIMESTAMP,
+            result = ?, error = NULL WHERE job_id = ?''', (json.dumps(result), job_id))
+        conn.commit()
+
+    def fail(self, job, error):
+        """Requeue with backoff, or mark failed after the last attempt"""
+        conn = self.db.get_conn()
+        if job['attempts'] < job['max_attempts']:
+            delay = JOB_RETRY_DELAY * 2 ** (job['attempts'] - 1)
+            conn.execute('''UPDATE jobs SET status = 'queued', error = ?,
+                run_after = datetime('now', '+' || ? || ' seconds') WHERE job_id = ?''',
+                (error, int(delay), job['job_id']))
+        else:
+            conn.execute('''UPDATE jobs SET status = 'failed', error = ?,
+                finished_at = CURRENT_TIMESTAMP WHERE job_id = ?''', (error, job['job_id']))
+        conn.commit()
+
+    def heartbeat(self):
+        """Renew the lease of every job this queue is running"""
+        conn = self.db.get_conn()
+        conn.execute('''UPDATE jobs SET heartbeat_at = CURRENT_TIMESTAMP
+            WHERE status = 'running' AND owner = ?''', (self.owner,))
+        conn.commit()
+
+    def requeue_abandoned(self, lease=JOB_LEASE_SECONDS):
+        """Put back jobs left running by a process that died or stopped heartbeating
+
+        A job that has used up its attempts is marked failed instead, so a
+        job that kills its process is not retried forever.
+        """
+        conn = self.db.get_conn()
+        owners = [row[0] for row in conn.execute(
+            "SELECT DISTINCT owner FROM jobs WHERE status = 'running' AND owner IS NOT ?", (self.owner,))]
+        gone = [owner for owner in owners if not _owner_alive(owner)]
+        placeholders = ','.join('?' * len(gone)) or 'NULL'
+        count = conn.execute(f'''UPDATE jobs SET
+                status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'queued' END,
+                error = 'abandoned by ' || COALESCE(owner, 'an unknown process'),
+                finished_at = CASE WHEN attempts >= max_attempts THEN CURRENT_TIMESTAMP END,
+                owner = NULL
+            WHERE status = 'running' AND owner IS NOT ?
+              AND (owner IN ({placeholders})
+                   OR COALESCE(heartbeat_at, started_at) < datetime('now', '-' || ? || ' seconds'))''',
+            [self.owner] + gone + [int(lease)]).rowcount
+        conn.commit()
+        return count
+
+    def get(self, job_id):
+        rows = self.db.execute_query('SELECT * FROM jobs WHERE job_id = ?', (job_id,))
+        return _job_dict(rows[0]) if rows else None
+
+    def recent(self, limit=50, status=None):
+        if status:
+            rows = self.db.execute_query('''SELECT * FROM jobs WHERE status = ?
+                ORDER BY job_id DESC LIMIT ?''', (status, limit))
+        else:
+            rows = self.db.execute_query('SELECT * FROM jobs ORDER BY job_id DESC LIMIT ?', (limit,))
+        return [_job_dict(row) for row in rows]
+
+    def counts(self):
+        """Job counts by lane and status"""
+        lanes = {priority: name for name, priority in JOB_LANES.items()}
+        counts = {name: {} for name in JOB_LANES}
+        for priority, status, count in self.db.get_read_conn().execute(
+                'SELECT priority, status, COUNT(*) FROM jobs GROUP BY priority, status'):
+            counts[lanes.get(priority, str(priority))][status] = count
+        return counts
+
+
+def _job_dict(job):
+    job = dict(job)
+    job['payload'] = json.loads(job['payload']) if job['payload'] else {}
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    lanes = {priority: name for name, priority in JOB_LANES.items()}
+    job['lane'] = lanes.get(job['priority'], str(job['priority']))
+    return job
+
+
+class JobScheduler:
+    """Worker threads plus the nightly / sales-count trigger loop"""
+
+    def __init__(self, db, workers=JOB_WORKERS):
+        self.db = db
+        self.queue = JobQueue(db)
+        self.workers = workers
+        self._threads = []
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._new_sales = {}       # product_id -> sales since its last refresh was queued
+        self._last_sale_id = None
+        self.started_at = None
+
+    def enqueue(self, *args, **kwargs):
+        """Queue a job and wake a worker"""
+        job_id = self.queue.enqueue(*args, **kwargs)
+        self._wake.set()
+        return job_id
+
+    def start(self):
+        """Start worker and scheduler threads (idempotent)"""
+        if self._threads:
+            return
+        self.reclaim()
+
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._schedule, name='job-scheduler', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        print(f"⏱️ Job scheduler started with {self.workers} workers")
+
+    def stop(self, timeout=5):
+        self._stop.set()
+        self._wake.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _work(self):
+        while not self._stop.is_set():
+            job = self.queue.claim()
+            if job is None:
+                self._wake.wait(JOB_POLL_SECONDS)
+                self._wake.clear()
+                continue
+
+            start = time.perf_counter()
+            try:
+                result = HANDLERS[job['kind']](self.db, job['payload'])
+                self.queue.finish(job['job_id'], result)
+                print(f"✅ Job {job['job_id']} {job['kind']} done in {time.perf_counter() - start:.1f}s")
+            except Exception as e:
+                print(f"❌ Job {job['job_id']} {job['kind']} failed "
+                      f"(attempt {job['attempts']}/{job['max_attempts']}): {str(e)}")
+                traceback.print_exc()
+                self.queue.fail(job, str(e))
+
+    def reclaim(self):
+        """Renew this scheduler's job leases and requeue other schedulers' abandoned jobs"""
+        self.queue.heartbeat()
+        requeued = self.queue.requeue_abandoned()
+        if requeued:
+            print(f"♻️ Requeued {requeued} abandoned jobs")
+            self._wake.set()
+
+    def _schedule(self):
+        while not self._stop.is_set():
+            try:
+                self.reclaim()
+                self.tick()
+            except Exception as e:
+                print(f"❌ Scheduler error: {str(e)}")
+                traceback.print_exc()
+            self._stop.wait(JOB_POLL_SECONDS)
+
+    def tick(self, now=None):
+        """Enqueue whatever is due: the nightly run and sales-triggered refreshes"""
+        now = now or datetime.now()
+        if now.strftime('%H:%M') >= JOB_NIGHTLY_AT:
+            self.enqueue('nightly', lane='low', dedupe_key=f"nightly-{now:%Y-%m-%d}", once=True)
+
+        # Count sales since the last tick by scanning new sale_ids only
+        conn = self.db.get_read_conn()
+        if self._last_sale_id is None:
+            self._last_sale_id = conn.execute('SELECT COALESCE(MAX(sale_id), 0) FROM sales').fetchone()[0]
+            return
+
+        rows = conn.execute('''SELECT product_id, COUNT(*), MAX(sale_id) FROM sales
+            WHERE sale_id > ? GROUP BY product_id''', (self._last_sale_id,)).fetchall()
+        for product_id, count, last_id in rows:
+            self._last_sale_id = max(self._last_sale_id, last_id)
+            total = self._new_sales.get(product_id, 0) + count
+            if total >= JOB_REFRESH_AFTER_SALES:
+                self.enqueue('forecast_product', {'product_id': product_id},
+                             dedupe_key=forecast_key(product_id))
+                total = 0
+            self._new_sales[product_id] = total
+
+    def status(self):
+        """Summary for the /api/jobs endpoint"""
+        return {
+            'running': bool(self._threads),
+            'started_at': self.started_at,
+            'workers': self.workers,
+            'lanes': self.queue.counts()
+        }
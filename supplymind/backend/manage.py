@@ -0,0 +1,186 @@
+"""Maintenance commands for SupplyMind
+
+Run from the backend directory:
+
+    python manage.py migrate
+    python manage.py rebuild-rollup
+    python manage.py forecast [--category Electronics] [--workers 8]
+    python manage.py fit-global
+    python manage.py fit-nbeats [--epochs 20] [--resume]
+    python manage.py bootstrap-online [--category Electronics]
+    python manage.py fit-hybrid [--category Electronics] [--workers 8] [--force]
+    python manage.py worker [--workers 2]
+    python manage.py backtest [--engines ridge,online] [--folds 4] [--category Electronics]
+    python manage.py tune [--scope category] [--force]
+"""
+import argparse
+import time
+
+from config import ALERTS_INCREMENTAL, BACKTEST_FOLDS, DATABASE_PATH, FORECAST_DAYS, FORECAST_WORKERS, TUNING_SCOPE
+from database import Database
+from migrations import get_version
+
+
+def cmd_migrate(db, args):
+    """Upgrade the schema to the latest version"""
+    # Database() already applies pending migrations on open
+    print(f"✅ Schema version {get_version(db.get_conn())}")
+
+
+def cmd_rebuild_rollup(db, args):
+    """Rebuild the daily_sales rollup from raw sales"""
+    rows = db.rebuild_daily_sales()
+    print(f"✅ Rebuilt daily_sales: {rows} product-days")
+
+
+def cmd_forecast(db, args):
+    """Forecast the catalog on a process pool"""
+    from batch_forecast import forecast_catalog
+
+    start = time.perf_counter()
+    succeeded = failed = 0
+    for result in forecast_catalog(db, category=args.category, days=args.days,
+                                   workers=args.workers):
+        if result['success']:
+            succeeded += 1
+            print(f"✅ {result['product_id']:>6} {result['product_name']}: "
+                  f"{result['accuracy']['accuracy']:.1f}% accuracy")
+        else:
+            failed += 1
+            print(f"❌ {result['product_id']:>6} {result['product_name']}: {result['error']}")
+
+    elapsed = time.perf_counter() - start
+    print(f"\n📊 {succeeded} forecasts saved, {failed} skipped in {elapsed:.1f}s")
+
+
+def cmd_fit_global(db, args):
+    """Refit the pooled cross-product model"""
+    from global_model import fit_global_model
+
+    success, message, model = fit_global_model(db)
+    if not success:
+        print(f"❌ {message}")
+        return
+    print(f"✅ {message}")
+    for name, value in model.metrics.items():
+        print(f"   {name}: {value:.3f}")
+
+
+def cmd_fit_nbeats(db, args):
+    """Train the N-BEATS engine, optionally resuming from the last checkpoint"""
+    from nbeats_engine import fit_nbeats_engine
+
+    success, message, engine = fit_nbeats_engine(db, max_epochs=args.epochs, resume=args.resume)
+    if not success:
+        print(f"❌ {message}")
+        return
+    print(f"✅ {message}")
+    for name, value in engine.metrics.items():
+        print(f"   {name}: {value:.3f}")
+
+
+def cmd_fit_hybrid(db, args):
+    """Fit and cache Prophet hybrid models for products without a current one"""
+    from hybrid_engine import HybridEngine
+
+    summary = HybridEngine(workers=args.workers).fit_catalog(db, category=args.category, force=args.force)
+    print(f"✅ {summary['fitted']} fitted, {summary['cached']} cached, {summary['timeout']} over budget, "
+          f"{summary['failed']} failed, {summary['sparse']} sparse in {summary['seconds']:.1f}s")
+
+
+def cmd_bootstrap_online(db, args):
+    """Build online model state for products that do not have it yet"""
+    from online_model import online_engine
+
+    products = db.get_products_by_category(args.category) if args.category else db.get_all_products()
+    start = time.perf_counter()
+    built = sum(online_engine.get_model(db, product['product_id']) is not None
+                for product in products)
+    elapsed = time.perf_counter() - start
+    print(f"✅ Online state ready for {built} of {len(products)} products in {elapsed:.1f}s")
+
+
+def cmd_backtest(db, args):
+    """Rolling-origin backtest of forecast engines, saved to backtest_results"""
+    from backtest import run_backtest
+
+    engines = args.engines.split(',') if args.engines else None
+    start = time.perf_counter()
+    run_id, results = run_backtest(db, engines=engines, category=args.category, folds=args.folds,
+                                   horizon=args.days, workers=args.workers)
+
+    print(f"\n📊 Backtest {run_id} in {time.perf_counter() - start:.1f}s")
+    print(f"{'engine':<8} {'products':>8} {'MAE':>8} {'RMSE':>8} {'MAPE %':>8} {'bias':>8} "
+          f"{'train s':>8} {'infer ms':>9}")
+    for r in results:
+        infer_ms = r['inference_seconds'] / max(r['forecasts'], 1) * 1000
+        print(f"{r['engine']:<8} {r['products']:>8} {r['mae']:>8.2f} {r['rmse']:>8.2f} "
+              f"{r['mape']:>8.1f} {r['bias']:>+8.2f} {r['train_seconds']:>8.1f} {infer_ms:>9.2f}")
+
+
+def cmd_tune(db, args):
+    """Search forecaster hyperparameters for products whose data drifted"""
+    from tuning import tune_catalog
+
+    summary = tune_catalog(db, scope=args.scope, category=args.category, force=args.force,
+                           workers=args.workers)
+    print(f"✅ Tuned {summary['tuned']} products ({summary['cached']} cached, "
+          f"{summary['unfinished']} unfinished) in {summary['seconds']:.1f}s")
+    if summary['tuned']:
+        print(f"   mean CV MAE improvement over defaults: {summary['mean_improvement']:.1%}")
+
+
+def cmd_worker(db, args):
+    """Run the job scheduler and alert evaluator in the foreground, outside app.py"""
+    from alert_system import AlertEvaluator
+    from jobs import JobScheduler
+
+    scheduler = JobScheduler(db, workers=args.workers)
+    scheduler.start()
+    evaluator = AlertEvaluator(db)
+    if ALERTS_INCREMENTAL:
+        evaluator.start()
+    try:
+        while True:
+            time.sleep(60)
+    except KeyboardInterrupt:
+        print("⏹️ Stopping job workers")
+        scheduler.stop()
+        evaluator.stop()
+
+
+COMMANDS = {
+    'migrate': cmd_migrate,
+    'rebuild-rollup': cmd_rebuild_rollup,
+    'forecast': cmd_forecast,
+    'fit-global': cmd_fit_global,
+    'fit-nbeats': cmd_fit_nbeats,
+    'fit-hybrid': cmd_fit_hybrid,
+    'bootstrap-online': cmd_bootstrap_online,
+    'worker': cmd_worker,
+    'backtest': cmd_backtest,
+    'tune': cmd_tune,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='SupplyMind maintenance')
+    parser.add_argument('command', choices=sorted(COMMANDS))
+    parser.add_argument('--db', default=DATABASE_PATH, help='database file')
+    parser.add_argument('--category', help='limit forecasting to one category')
+    parser.add_argument('--days', type=int, default=FORECAST_DAYS)
+    parser.add_argument('--workers', type=int, default=FORECAST_WORKERS)
+    parser.add_argument('--epochs', type=int, help='N-BEATS epoch limit (default from NBEATS_CONFIG)')
+    parser.add_argument('--engines', help='comma-separated engines to backtest')
+    parser.add_argument('--folds', type=int, default=BACKTEST_FOLDS, help='backtest origins per product')
+    parser.add_argument('--scope', choices=['product', 'category'], default=TUNING_SCOPE,
+                        help='tune per product or one setting per category')
+    parser.add_argument('--force', action='store_true', help='re-tune (or refit hybrid models) even if nothing changed')
+    parser.add_argument('--resume', action='store_true', help='resume N-BEATS from its checkpoint')
+    args = parser.parse_args()
+
+    db = Database(args.db)
+    try:
+        COMMANDS[args.command](db, args)
+    finally:
+        db.close()
@@ -0,0 +1,241 @@
+"""Versioned schema migrations for the SupplyMind database
+
+The schema version is stored in SQLite's ``PRAGMA user_version``. Each
+migration runs once, inside its own transaction, and upgrades the schema
+in place - existing rows are never dropped.
+"""
+
+MIGRATIONS = [
+    (1, 'Base schema', [
+        '''CREATE TABLE IF NOT EXISTS products (
+            product_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_name TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            category TEXT NOT NULL,
+            purchase_price REAL NOT NULL,
+            selling_price REAL NOT NULL,
+            current_quantity INTEGER DEFAULT 0,
+            reorder_level INTEGER DEFAULT 50,
+            max_stock_level INTEGER DEFAULT 500,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(product_name, brand)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS sales (
+            sale_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            quantity_sold INTEGER,
+            sale_date DATE,
+            selling_price REAL,
+            revenue REAL,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS transactions (
+            transaction_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            type TEXT,
+            quantity INTEGER,
+            transaction_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            notes TEXT,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS alerts (
+            alert_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            alert_type TEXT,
+            severity TEXT,
+            message TEXT,
+            recommendation TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            resolved INTEGER DEFAULT 0,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS forecasts (
+            forecast_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id INTEGER,
+            forecast_date DATE,
+            predicted_demand REAL,
+            lower_bound REAL,
+            upper_bound REAL,
+            accuracy REAL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+        '''CREATE TABLE IF NOT EXISTS suppliers (
+            supplier_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            supplier_name TEXT NOT NULL,
+            contact_person TEXT,
+            phone TEXT,
+            email TEXT,
+            address TEXT,
+            payment_terms TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+    ]),
+    (2, 'Hot-path indexes', [
+        # Per-product history: get_sales(product_id), sales velocity
+        '''CREATE INDEX IF NOT EXISTS idx_sales_product_date
+            ON sales(product_id, sale_date, quantity_sold, revenue)''',
+        # Date-range analytics: get_sales(), get_stats, /api/analytics/sales
+        '''CREATE INDEX IF NOT EXISTS idx_sales_date
+            ON sales(sale_date, product_id, quantity_sold, revenue)''',
+        # Active alerts ordered by severity and age
+        '''CREATE INDEX IF NOT EXISTS idx_alerts_active
+            ON alerts(resolved, severity, created_at)''',
+        '''CREATE INDEX IF NOT EXISTS idx_transactions_product_date
+            ON transactions(product_id, transaction_date)''',
+    ]),
+    (3, 'Daily sales rollup', [
+        '''CREATE TABLE IF NOT EXISTS daily_sales (
+            product_id INTEGER NOT NULL,
+            day DATE NOT NULL,
+            qty INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            sales_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (product_id, day)
+        ) WITHOUT ROWID''',
+        '''CREATE INDEX IF NOT EXISTS idx_daily_sales_day
+            ON daily_sales(day, product_id, qty, revenue)''',
+        '''INSERT OR REPLACE INTO daily_sales (product_id, day, qty, revenue, sales_count)
+            SELECT product_id, sale_date, SUM(quantity_sold), SUM(revenue), COUNT(*)
+            FROM sales GROUP BY product_id, sale_date''',
+    ]),
+    (4, 'Forecast lookup index', [
+        '''CREATE INDEX IF NOT EXISTS idx_forecasts_product_date
+            ON forecasts(product_id, forecast_date)''',
+    ]),
+    (5, 'Online model state', [
+        '''CREATE TABLE IF NOT EXISTS online_models (
+            product_id INTEGER PRIMARY KEY,
+            open_day DATE NOT NULL,
+            day_total REAL NOT NULL DEFAULT 0,
+            state BLOB NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+    ]),
+    (6, 'Forecast runs', [
+        '''CREATE TABLE IF NOT EXISTS forecast_runs (
+            product_id INTEGER PRIMARY KEY,
+            sales_version INTEGER,
+            engine TEXT NOT NULL,
+            days INTEGER NOT NULL,
+            metrics TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+    ]),
+    (7, 'Job queue', [
+        '''CREATE TABLE IF NOT EXISTS jobs (
+            job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            payload TEXT,
+            priority INTEGER NOT NULL DEFAULT 1,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            dedupe_key TEXT,
+            run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            started_at TIMESTAMP,
+            finished_at TIMESTAMP,
+            error TEXT,
+            result TEXT
+        )''',
+        '''CREATE INDEX IF NOT EXISTS idx_jobs_claim
+            ON jobs(status, priority, run_after)''',
+        # At most one pending job per dedupe key
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_dedupe
+            ON jobs(dedupe_key) WHERE status IN ('queued', 'running')''',
+    ]),
+    (8, 'Backtest results', [
+        '''CREATE TABLE IF NOT EXISTS backtest_results (
+            result_id INTEGER PRIMARY KEY AUTOINCREMENT,
+            run_id TEXT NOT NULL,
+            engine TEXT NOT NULL,
+            category TEXT,
+            folds INTEGER,
+            horizon INTEGER,
+            products INTEGER,
+            forecasts INTEGER,
+            mae REAL,
+            rmse REAL,
+            mape REAL,
+            bias REAL,
+            train_seconds REAL,
+            inference_seconds REAL,
+            fits INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )''',
+        '''CREATE INDEX IF NOT EXISTS idx_backtest_run
+            ON backtest_results(run_id)''',
+    ]),
+    (9, 'Tuned forecaster parameters', [
+        '''CREATE TABLE IF NOT EXISTS tuned_params (
+            product_id INTEGER PRIMARY KEY,
+            alpha REAL NOT NULL,
+            lookback INTEGER NOT NULL,
+            features TEXT NOT NULL,
+            scope TEXT NOT NULL DEFAULT 'product',
+            cv_mae REAL,
+            baseline_mae REAL,
+            level REAL,
+            sales_version INTEGER,
+            tuned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (product_id) REFERENCES products(product_id)
+        )''',
+    ]),
+    (10, 'Incremental alerts', [
+        # One active alert per (product, type); older duplicates become history
+        '''UPDATE alerts SET resolved = 1 WHERE resolved = 0 AND alert_id NOT IN
+            (SELECT MAX(alert_id) FROM alerts WHERE resolved = 0 GROUP BY product_id, alert_type)''',
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_alerts_open_key
+            ON alerts(product_id, alert_type) WHERE resolved = 0''',
+        # Products whose alerts need re-checking; version changes on every mark
+        '''CREATE TABLE IF NOT EXISTS alert_dirty (
+            product_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 1
+        )''',
+        '''INSERT OR IGNORE INTO alert_dirty (product_id) SELECT product_id FROM products''',
+    ]),
+    (11, 'Job leases', [
+        # The scheduler running a job, and when it last reported being alive
+        'ALTER TABLE jobs ADD COLUMN owner TEXT',
+        'ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP',
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_version(conn):
+    """Get the schema version of a database"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def migrate(conn):
+    """Apply pending migrations in order, returns the list applied"""
+    applied = []
+    current = get_version(conn)
+
+    for version, description, statements in MIGRATIONS:
+        if version <= current:
+            continue
+
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for statement in statements:
+                conn.execute(statement)
+            # PRAGMA does not accept bound parameters
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        print(f"✅ Migration {version} applied: {description}")
+        applied.append(version)
+
+    if applied:
+        conn.execute('PRAGMA optimize')
+
+    return applied
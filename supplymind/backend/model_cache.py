@@ -0,0 +1,127 @@
+"""Process-wide cache of trained forecasting models
+
+Entries are keyed by product and a sales watermark (the product's latest
+sale_id). A new sale moves the watermark, so the next lookup misses and
+the model is retrained; otherwise repeat forecasts reuse the fitted model.
+
+Catalog-wide models live in .npz files instead; ``ModelFile`` serves one
+to every request and picks up a refit when the file is replaced.
+"""
+import io
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from config import MODEL_CACHE_SIZE, MODEL_CACHE_MAX_MB
+
+
+class ModelCache:
+    """Thread-safe LRU cache bounded by entry count and memory"""
+
+    def __init__(self, max_entries=MODEL_CACHE_SIZE, max_bytes=MODEL_CACHE_MAX_MB * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()   # product_id -> (watermark, value, size)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, product_id, watermark):
+        """Get the cached model for a product if it was trained at this watermark"""
+        with self._lock:
+            entry = self._entries.get(product_id)
+            if entry is None or entry[0] != watermark:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(product_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, product_id, watermark, value, size=0):
+        """Store a model, replacing any older version for the product"""
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            old = self._entries.pop(product_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+            self._entries[product_id] = (watermark, value, size)
+            self._bytes += size
+
+            while self._entries and (len(self._entries) > self.max_entries
+                                     or self._bytes > self.max_bytes):
+                _, (_, _, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def invalidate(self, product_id=None):
+        """Drop one product's model, or everything"""
+        with self._lock:
+            if product_id is None:
+                self._entries.clear()
+                self._bytes = 0
+                return
+            old = self._entries.pop(product_id, None)
+            if old is not None:
+                self._bytes -= old[2]
+
+    def stats(self):
+        """Hit/miss counters and current usage"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes
+            }
+
+
+# Shared by every request thread in the process
+model_cache = ModelCache()
+
+
+class ModelFile:
+    """A model saved on disk, loaded once and reloaded when the file changes"""
+
+    def __init__(self, path, loader):
+        self.path = path
+        self.loader = loader
+        self._model = None
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        """The current model, or None if it has not been trained yet"""
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return None
+
+        with self._lock:
+            if self._mtime != mtime:
+                self._model = self.loader(self.path)
+                self._mtime = mtime
+            return self._model
+
+
+def write_npz(path, arrays):
+    """Write arrays to an .npz file atomically, so readers never see a partial file"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    buffer = io.BytesIO()
+    np.savez(buffer, **arrays)
+
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(buffer.getvalue())
+    os.replace(tmp_path, path)
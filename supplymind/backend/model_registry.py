@@ -0,0 +1,354 @@
+"""On-disk registry of trained per-product forecasting models
+
+Every trained ``NBEATSForecaster`` is stored as plain arrays: Ridge
+coefficients and intercept, scaler mean and scale, the recent feature
+tail, plus its sales watermark, the key of the tuned parameters it was
+trained with and accuracy metrics. A snapshot is two
+.npy files, a fixed-width index and one flat float64 parameter array,
+both opened with ``mmap_mode='r'``. Opening is instant and pages load
+on first use, so a new worker serves forecasts without retraining.
+``get_arrays`` hands serving plain arrays for ``inference``; only
+``get`` rebuilds scikit-learn objects, for code that keeps training.
+
+New models are held in memory and flushed every REGISTRY_FLUSH_EVERY
+models as a segment holding only those models; lookups check segments
+newest first. Segments are merged into the run before them once they
+hold as many models, so a catalog is rewritten a logarithmic number of
+times and only a handful of segments are mapped. CURRENT lists the base
+generation and its segments, and is replaced atomically to publish them.
+Flushes from different processes are serialised by a lock file.
+"""
+import atexit
+import contextlib
+import itertools
+import os
+import threading
+import time
+import zlib
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+import numpy as np
+
+from config import REGISTRY_DIR, REGISTRY_FLUSH_EVERY
+from features import FEATURE_COLS, LAGS
+
+# Rows of recent features kept per model, as in NBEATSForecaster.train
+RECENT_ROWS = max(LAGS)
+
+METRICS = ['mae', 'rmse', 'r2', 'mape', 'accuracy']
+
+# Tells apart generations written by one process within a millisecond
+_generations = itertools.count()
+
+INDEX_DTYPE = np.dtype([
+    ('product_id', 'i8'),
+    ('watermark', 'i8'),
+    ('params_key', 'i8'),      # params_key() of the tuned parameters used
+    ('offset', 'i8'),          # start of the product's slice in the parameter array
+    ('lookback', 'i4'),
+    ('horizon', 'i4'),
+    ('direct', 'i1'),
+    ('last_date', 'i8'),       # days since 1970-01-01
+    ('mean_sales', 'f8'),
+    ('std_sales', 'f8'),
+    ('trained_at', 'f8'),
+] + [(name, 'f8') for name in METRICS])
+
+
+def params_key(params):
+    """Stable key of tuned forecaster parameters, 0 for the defaults
+
+    Models are looked up by sales watermark and this key, so a tuning run
+    that changes a product's parameters retrains it without waiting for a sale.
+    """
+    if not params:
+        return 0
+    return zlib.crc32(repr([(name, params.get(name)) for name in ('alpha', 'lookback', 'features')]).encode())
+
+
+def param_sizes(lookback, horizon, direct):
+    """Sizes of (coef, intercept, mean, scale, recent_features) for one model"""
+    width = lookback * len(FEATURE_COLS)
+    outputs = horizon if direct else 1
+    return [outputs * width, outputs, width, width, RECENT_ROWS * len(FEATURE_COLS)]
+
+
+def pack_state(product_id, watermark, state, tuning=0):
+    """Turn a forecaster state into (index record, parameter vector)"""
+    record = np.zeros((), dtype=INDEX_DTYPE)
+    record['product_id'] = product_id
+    record['watermark'] = watermark
+    record['params_key'] = tuning
+    record['lookback'] = state['lookback']
+    record['horizon'] = state['horizon']
+    record['direct'] = state['mode'] == 'direct'
+    record['last_date'] = np.datetime64(state['last_date'], 'D').astype(np.int64)
+    record['mean_sales'] = state['mean_sales']
+    record['std_sales'] = state['std_sales']
+    record['trained_at'] = time.time()
+    for name in METRICS:
+        record[name] = state['accuracy_metrics'].get(name, 0.0)
+
+    model, scaler = state['model'], state['scaler']
+    params = np.concatenate([
+        np.ravel(model.coef_), np.ravel(model.intercept_),
+        scaler.mean_, scaler.scale_, np.ravel(state['recent_features'])
+    ]).astype(np.float64)
+    return record, params
+
+
+def unpack_arrays(record, params):
+    """Inverse of pack_state() as plain arrays, the model format of ``inference``"""
+    lookback, horizon, direct = int(record['lookback']), int(record['horizon']), bool(record['direct'])
+    sizes = param_sizes(lookback, horizon, direct)
+    coef, intercept, mean, scale, recent = np.split(np.asarray(params), np.cumsum(sizes)[:-1])
+
+    return {
+        'coef': coef.reshape(horizon, -1) if direct else coef,
+        'intercept': intercept if direct else float(intercept[0]),
+        'mean': mean,
+        'scale': scale,
+        'recent_features': recent.reshape(RECENT_ROWS, len(FEATURE_COLS)),
+        'last_date': np.datetime64(int(record['last_date']), 'D'),
+        'lookback': lookback,
+        'mode': 'direct' if direct else 'recursive',
+        'horizon': horizon,
+        'accuracy_metrics': {name: float(record[name]) for name in METRICS},
+        'mean_sales': float(record['mean_sales']),
+        'std_sales': float(record['std_sales'])
+    }
+
+
+def unpack_state(record, params):
+    """Inverse of pack_state(), rebuilding fitted Ridge and StandardScaler objects"""
+    from sklearn.linear_model import Ridge
+    from sklearn.preprocessing import StandardScaler
+
+    state = unpack_arrays(record, params)
+    model = Ridge(alpha=1.0)
+    model.coef_ = state.pop('coef')
+    model.intercept_ = state.pop('intercept')
+    model.n_features_in_ = len(state['mean'])
+
+    scaler = StandardScaler()
+    scaler.mean_ = state.pop('mean')
+    scaler.scale_ = state.pop('scale')
+    scaler.var_ = scaler.scale_ ** 2
+    scaler.n_features_in_ = len(scaler.mean_)
+
+    state['model'] = model
+    state['scaler'] = scaler
+    return state
+
+
+def _slice(record, params):
+    """(record, parameter vector) of one index row"""
+    size = sum(param_sizes(int(record['lookback']), int(record['horizon']), bool(record['direct'])))
+    offset = int(record['offset'])
+    return record, params[offset:offset + size]
+
+
+class ModelRegistry:
+    """Memory-mapped snapshot and segments of trained models plus unflushed new ones"""
+
+    def __init__(self, path=REGISTRY_DIR, flush_every=REGISTRY_FLUSH_EVERY):
+        self.path = path
+        self.flush_every = flush_every
+        self._runs = []      # (generation, index, params), the base snapshot first
+        self._manifest = []
+        self._checked = None
+        self._pending = {}   # product_id -> (record, params)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def _current_path(self):
+        return os.path.join(self.path, 'CURRENT')
+
+    @contextlib.contextmanager
+    def _file_lock(self):
+        """Serialise flushes across processes (no-op without fcntl)"""
+        os.makedirs(self.path, exist_ok=True)
+        with open(os.path.join(self.path, 'LOCK'), 'w') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read_manifest(self):
+        with open(self._current_path()) as f:
+            return f.read().split()
+
+    def _map(self, generation):
+        index = np.load(os.path.join(self.path, f'index-{generation}.npy'), mmap_mode='r')
+        params = np.load(os.path.join(self.path, f'params-{generation}.npy'), mmap_mode='r')
+        if index.dtype != INDEX_DTYPE:
+            # Written with an older layout; its models are retrained as they are needed
+            return generation, np.empty(0, dtype=INDEX_DTYPE), np.empty(0)
+        return generation, index, params
+
+    def open(self):
+        """Map the latest snapshot and segments if another process published newer ones"""
+        try:
+            mtime = os.path.getmtime(self._current_path())
+        except OSError:
+            return
+        if mtime == self._checked:
+            return
+
+        with self._lock:
+            # A compaction can delete files of a manifest we just read; read it again
+            for attempt in range(3):
+                try:
+                    manifest = self._read_manifest()
+                    mapped = {run[0]: run for run in self._runs}
+                    runs = [mapped.get(generation) or self._map(generation) for generation in manifest]
+                    break
+                except FileNotFoundError:
+                    continue
+            else:
+                print("⚠️ Model registry changed while mapping it; keeping the mapped generation")
+                return
+
+            if manifest != self._manifest:
+                self._runs, self._manifest = runs, manifest
+                print(f"📦 Model registry: {sum(len(run[1]) for run in runs)} models mapped "
+                      f"(generation {manifest[0]}, {len(manifest) - 1} segments)")
+            self._checked = mtime
+
+    def get(self, product_id, watermark, tuning=0):
+        """State of the model trained at this watermark with these parameters, or None"""
+        entry = self._lookup(product_id, watermark, tuning)
+        return unpack_state(*entry) if entry is not None else None
+
+    def get_arrays(self, product_id, watermark, tuning=0):
+        """Plain-array model trained at this watermark with these parameters, or None"""
+        entry = self._lookup(product_id, watermark, tuning)
+        return unpack_arrays(*entry) if entry is not None else None
+
+    def _lookup(self, product_id, watermark, tuning):
+        try:
+            self.open()
+        except OSError:
+            # Keep serving the mapped generation; the next lookup retries
+            self._checked = None
+        with self._lock:
+            entry = self._pending.get(product_id)
+            if entry is None:
+                entry = self._find(product_id)
+
+            if (entry is None or int(entry[0]['watermark']) != watermark
+                    or int(entry[0]['params_key']) != tuning):
+                self.misses += 1
+                return None
+            self.hits += 1
+        return entry
+
+    def _find(self, product_id):
+        """Newest mapped (record, params) of a product; newer segments shadow older ones"""
+        for _, index, params in reversed(self._runs):
+            row = np.searchsorted(index['product_id'], product_id)
+            if row < len(index) and index[row]['product_id'] == product_id:
+                return _slice(index[row], params)
+        return None
+
+    def put(self, product_id, watermark, state, tuning=0):
+        """Register a newly trained model; flushed to disk in batches"""
+        entry = pack_state(product_id, watermark, state, tuning)
+        with self._lock:
+            self._pending[product_id] = entry
+            if len(self._pending) >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        """Write pending models as a new segment, merged with the smaller segments before it"""
+        with self._lock:
+            if not self._pending:
+                return 0
+            pending = self._pending
+
+            with self._file_lock():
+                self._checked = None
+                self.open()
+                previous = list(self._manifest)
+                runs = self._runs
+
+                # Fold the newest segments into the new one while they are no
+                # bigger than it, so each model is rewritten a logarithmic number
+                # of times and only a few segments stay mapped
+                merged, models = len(runs), len(pending)
+                while merged > 0 and len(runs[merged - 1][1]) <= models:
+                    merged -= 1
+                    models += len(runs[merged][1])
+                entries = [_slice(record, params) for _, index, params in runs[merged:] for record in index]
+                generation = self._write(entries + list(pending.values()))
+                manifest = [run[0] for run in runs[:merged]] + [generation]
+
+                tmp_path = self._current_path() + '.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write('\n'.join(manifest))
+                os.replace(tmp_path, self._current_path())
+
+                self._pending = {}
+                self._checked = None
+                self.open()
+                self._remove_old(keep_generations=set(manifest) | set(previous))
+            return len(pending)
+
+    def _write(self, entries):
+        """Write (record, params) entries as one generation, later entries winning"""
+        latest = {int(record['product_id']): (record, params) for record, params in entries}
+        records = [record.copy() for record, _ in latest.values()]
+        chunks = [params for _, params in latest.values()]
+
+        index = np.array(records, dtype=INDEX_DTYPE)
+        sizes = np.array([len(chunk) for chunk in chunks], dtype=np.int64)
+        index['offset'] = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        order = np.argsort(index['product_id'], kind='stable')
+        params = np.concatenate(chunks) if chunks else np.empty(0)
+
+        generation = f"{int(time.time() * 1000)}-{os.getpid()}-{next(_generations)}"
+        for name, array in (('index', index[order]), ('params', params)):
+            tmp_path = os.path.join(self.path, f'{name}-{generation}.npy.tmp')
+            with open(tmp_path, 'wb') as f:
+                np.save(f, array)
+            os.replace(tmp_path, os.path.join(self.path, f'{name}-{generation}.npy'))
+        return generation
+
+    def _remove_old(self, keep_generations):
+        """Delete snapshot files outside the current and previous manifest"""
+        for name in os.listdir(self.path):
+            if not name.endswith('.npy'):
+                continue
+            generation = name.split('-', 1)[1][:-len('.npy')]
+            if generation not in keep_generations:
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except OSError:
+                    pass
+
+    def stats(self):
+        """Snapshot and segment sizes and lookup counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'generation': self._manifest[0] if self._manifest else None,
+                'segments': max(len(self._manifest) - 1, 0),
+                'models': len(np.unique(np.concatenate([[]] + [run[1]['product_id'] for run in self._runs]))),
+                'pending': len(self._pending),
+                'bytes': int(sum(index.nbytes + params.nbytes for _, index, params in self._runs)),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+model_registry = ModelRegistry()
+atexit.register(model_registry.flush)
@@ -1,11 +1,12 @@
 """
 AI Forecasting Models using Prophet and XGBoost
 Hybrid approach for 90%+ accuracy
+
+Prophet is imported when a model is trained, so importing this module
+does not need it installed. Serving goes through ``hybrid_engine``.
 """
 import pandas as pd
 import numpy as np
-from datetime import datetime, timedelta
-from prophet import Prophet
 from sklearn.ensemble import GradientBoostingRegressor
 from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import warnings
@@ -20,6 +21,8 @@ class HybridForecaster:
     def __init__(self):
         self.prophet_model = None
         self.xgboost_model = None
+        self.feature_cols = []
+        self.history = None
         self.is_trained = False
         self.accuracy_metrics = {}
     
@@ -56,10 +59,11 @@ class HybridForecaster:
         for lag in [1, 7, 14, 30]:
             df[f'lag_{lag}'] = df['y'].shift(lag)
         
-        # Rolling statistics
+        # Rolling statistics of the days before, so a row never sees its own target
+        previous = df['y'].shift(1)
         for window in [7, 14, 30]:
-            df[f'rolling_mean_{window}'] = df['y'].rolling(window=window, min_periods=1).mean()
-            df[f'rolling_std_{window}'] = df['y'].rolling(window=window, min_periods=1).std()
+            df[f'rolling_mean_{window}'] = previous.rolling(window=window, min_periods=1).mean()
+            df[f'rolling_std_{window}'] = previous.rolling(window=window, min_periods=1).std()
         
         df = df.fillna(0)
         return df
@@ -67,6 +71,8 @@ class HybridForecaster:
     def train(self, sales_df):
         """Train hybrid model"""
         try:
+            from prophet import Prophet
+            
             prepared_data = self.prepare_data(sales_df)
             if prepared_data is None:
                 return False
@@ -99,6 +105,7 @@ class HybridForecaster:
             
             feature_cols = [col for col in train_features.columns 
                           if col not in ['ds', 'y']]
+            self.feature_cols = feature_cols
             
             X_train = train_features[feature_cols]
             y_train = train_features['y']
@@ -136,12 +143,15 @@ class HybridForecaster:
                 accuracy = max(0, 100 - mape)
                 
                 self.accuracy_metrics = {
-                    'mae': mae,
-                    'rmse': rmse,
-                    'r2': r2,
-                    'accuracy': accuracy
+                    'mae': float(mae),
+                    'rmse': float(rmse),
+                    'r2': float(r2),
+                    'mape': float(mape),
+                    'accuracy': float(accuracy)
                 }
             
+            # Forecasts continue from the last observed day
+            self.history = prepared_data
             self.is_trained = True
             return True
             
@@ -150,50 +160,39 @@ class HybridForecaster:
             return False
     
     def predict(self, days=30):
-        """Generate forecast"""
+        """Generate forecast for the days after the training history"""
         if not self.is_trained:
             return None
         
         try:
             # Create future dates
-            last_date = datetime.now()
+            last_date = self.history['ds'].iloc[-1]
             future_dates = pd.DataFrame({
-                'ds': pd.date_range(start=last_date, periods=days, freq='D')
+                'ds': pd.date_range(start=last_date + pd.Timedelta(days=1), periods=days, freq='D')
             })
             
             # Prophet forecast
             prophet_forecast = self.prophet_model.predict(future_dates)
             
-            # Create features for XGBoost
-            future_features = self.create_features(future_dates)
-            future_features['prophet_pred'] = prophet_forecast['yhat'].values
-            
-            # For lag features, use last known values
-            for col in future_features.columns:
-                if 'lag_' in col or 'rolling_' in col:
-                    future_features[col] = future_features[col].fillna(
-                        future_features[col].mean()
-                    )
-            
-            feature_cols = [col for col in future_features.columns 
-                          if col not in ['ds', 'y']]
-            
-            X_future = future_features[feature_cols]
-            
-            # XGBoost predictions
-            xgb_predictions = self.xgboost_model.predict(X_future)
-            xgb_predictions = np.maximum(xgb_predictions, 0)
-            
-            # Combine predictions (weighted average)
-            final_predictions = (0.6 * xgb_predictions + 
-                               0.4 * prophet_forecast['yhat'].values)
-            final_predictions = np.maximum(final_predictions, 0)
+            # XGBoost one day at a time, feeding predictions back in as lags
+            frame = self.history[['ds', 'y']].copy()
+            final_predictions = np.zeros(days)
+            for i in range(days):
+                frame = pd.concat([frame, pd.DataFrame({'ds': [future_dates['ds'].iloc[i]], 'y': [np.nan]})],
+                                  ignore_index=True)
+                features = self.create_features(frame).iloc[[-1]].copy()
+                features['prophet_pred'] = prophet_forecast['yhat'].values[i]
+                
+                xgb_prediction = max(self.xgboost_model.predict(features[self.feature_cols])[0], 0)
+                
+                # Combine predictions (weighted average)
+                final_predictions[i] = max(0.6 * xgb_prediction + 0.4 * prophet_forecast['yhat'].values[i], 0)
+                frame.loc[frame.index[-1], 'y'] = final_predictions[i]
             
             # Calculate confidence intervals
             prophet_lower = prophet_forecast['yhat_lower'].values
-            prophet_upper = prophet_forecast['yhat_upper'].values
             
-            confidence_lower = np.maximum(final_predictions * 0.8, prophet_lower)
+            confidence_lower = np.minimum(np.maximum(final_predictions * 0.8, prophet_lower), final_predictions)
             confidence_upper = final_predictions * 1.2
             
             # Format results
@@ -201,9 +200,9 @@ class HybridForecaster:
             for i in range(len(future_dates)):
                 forecasts.append({
                     'date': future_dates['ds'].iloc[i].strftime('%Y-%m-%d'),
-                    'predicted_demand': round(final_predictions[i], 2),
-                    'confidence_lower': round(confidence_lower[i], 2),
-                    'confidence_upper': round(confidence_upper[i], 2)
+                    'predicted_demand': round(float(final_predictions[i]), 2),
+                    'confidence_lower': round(float(confidence_lower[i]), 2),
+                    'confidence_upper': round(float(confidence_upper[i]), 2)
                 })
             
             return forecasts
@@ -0,0 +1,484 @@
+"""N-BEATS forecasting engine in NumPy
+
+Implements the N-BEATS architecture described by NBEATS_CONFIG: stacks of
+fully connected blocks, each emitting a backcast that is removed from its
+input and a forecast that is added to the output. Trend and seasonality
+blocks project onto fixed polynomial and Fourier bases; generic blocks
+learn theirs. One network is trained on windows drawn from every
+product's series, with hand-written backprop and Adam, early stopping on
+the newest forecast origins and a checkpoint after every epoch. It runs
+on CPU; all the work is large matrix products on the multi-threaded BLAS.
+"""
+import contextlib
+import json
+import os
+import time
+from datetime import datetime
+
+import numpy as np
+
+try:
+    from threadpoolctl import threadpool_limits
+except ImportError:
+    threadpool_limits = None   # BLAS keeps its default thread count
+
+from config import (FORECAST_DAYS, GLOBAL_MIN_DAYS, NBEATS_CHECKPOINT_PATH, NBEATS_CONFIG,
+                    NBEATS_HISTORY_DAYS, NBEATS_MODEL_PATH, NBEATS_THREADS)
+from global_model import daily_matrix, holdout_metrics
+from model_cache import ModelFile, write_npz
+from inference import format_forecast, generate_recommendations
+
+
+def block_basis(stack_type, context, horizon, config):
+    """Fixed (backcast, forecast) basis for a block, None for generic blocks
+
+    Both sides share one time axis scaled to [-1, 1), so a basis function
+    means the same thing before and after the forecast origin and the
+    polynomial terms stay bounded.
+    """
+    span = max(context, horizon)
+    t_back = (np.arange(context) - context) / span
+    t_fore = np.arange(horizon) / span
+
+    if stack_type == 'trend':
+        powers = np.arange(config['trend_polynomial_degree'] + 1)[:, np.newaxis]
+        return (t_back ** powers).astype(np.float32), (t_fore ** powers).astype(np.float32)
+
+    if stack_type == 'seasonality':
+        harmonics = np.arange(horizon // 2)[:, np.newaxis]
+
+        def waves(t):
+            return np.concatenate([np.cos(2 * np.pi * harmonics * t),
+                                   np.sin(2 * np.pi * harmonics[1:] * t)]).astype(np.float32)
+        return waves(t_back), waves(t_fore)
+
+    if stack_type == 'generic':
+        return None
+    raise ValueError(f"Unknown N-BEATS stack type: {stack_type}")
+
+
+def blas_threads(count):
+    """Limit BLAS threads for a block of work, when threadpoolctl is installed"""
+    if threadpool_limits is None:
+        return contextlib.nullcontext()
+    return threadpool_limits(limits=count, user_api='blas')
+
+
+class NBeatsNetwork:
+    """Parameters, forward pass and backprop of one N-BEATS network"""
+
+    def __init__(self, config=NBEATS_CONFIG, seed=0):
+        self.config = config
+        self.context = config['context_length']
+        self.horizon = config['prediction_length']
+        self.params = {}
+        self.blocks = []
+
+        rng = np.random.default_rng(seed)
+        width = config['layer_width']
+        for stack, (stack_type, n_blocks) in enumerate(zip(config['stack_types'], config['num_blocks'])):
+            for index in range(n_blocks):
+                name = f"{stack_type}{stack}.{index}"
+                size = self.context
+                for layer in range(config['num_layers']):
+                    # He initialisation for ReLU layers
+                    self.params[f"{name}.w{layer}"] = (rng.standard_normal((size, width))
+                                                       * np.sqrt(2 / size)).astype(np.float32)
+                    self.params[f"{name}.b{layer}"] = np.zeros(width, dtype=np.float32)
+                    size = width
+
+                basis = block_basis(stack_type, self.context, self.horizon, config)
+                if basis is None:
+                    dim = config['expansion_coefficient_dim']
+                    self.params[f"{name}.back"] = (rng.standard_normal((dim, self.context))
+                                                   / np.sqrt(dim)).astype(np.float32)
+                    self.params[f"{name}.fore"] = (rng.standard_normal((dim, self.horizon))
+                                                   / np.sqrt(dim)).astype(np.float32)
+                else:
+                    dim = len(basis[0])
+                self.params[f"{name}.theta"] = (rng.standard_normal((width, 2 * dim))
+                                                * 0.1 / np.sqrt(width)).astype(np.float32)
+                self.blocks.append({'name': name, 'dim': dim, 'basis': basis})
+
+    def _basis(self, block):
+        if block['basis'] is not None:
+            return block['basis']
+        return self.params[f"{block['name']}.back"], self.params[f"{block['name']}.fore"]
+
+    def forward(self, x, keep=False):
+        """Forecast (batch, horizon) from contexts (batch, context)
+
+        With ``keep`` the activations needed by ``backward`` are returned too.
+        """
+        residual = np.asarray(x)
+        forecast = np.zeros((len(residual), self.horizon), dtype=residual.dtype)
+        caches = []
+
+        for block in self.blocks:
+            name, dim = block['name'], block['dim']
+            activations = [residual]
+            hidden = residual
+            for layer in range(self.config['num_layers']):
+                hidden = hidden @ self.params[f"{name}.w{layer}"]
+                hidden += self.params[f"{name}.b{layer}"]
+                np.maximum(hidden, 0, out=hidden)
+                activations.append(hidden)
+
+            theta = hidden @ self.params[f"{name}.theta"]
+            back, fore = self._basis(block)
+            residual = residual - theta[:, :dim] @ back
+            forecast += theta[:, dim:] @ fore
+            if keep:
+                caches.append((activations, theta))
+
+        return forecast, caches
+
+    def backward(self, caches, d_forecast):
+        """Gradients of every parameter given d(loss)/d(forecast)"""
+        grads = {}
+        d_residual = np.zeros((len(d_forecast), self.context), dtype=d_forecast.dtype)
+
+        for block, (activations, theta) in zip(reversed(self.blocks), reversed(caches)):
+            name, dim = block['name'], block['dim']
+            back, fore = self._basis(block)
+
+            # residual_out = residual_in - theta_back @ back
+            d_back = -d_residual
+            d_theta = np.concatenate([d_back @ back.T, d_forecast @ fore.T], axis=1)
+            if block['basis'] is None:
+                grads[f"{name}.back"] = theta[:, :dim].T @ d_back
+                grads[f"{name}.fore"] = theta[:, dim:].T @ d_forecast
+
+            grads[f"{name}.theta"] = activations[-1].T @ d_theta
+            d_hidden = d_theta @ self.params[f"{name}.theta"].T
+            for layer in reversed(range(self.config['num_layers'])):
+                d_hidden *= activations[layer + 1] > 0
+                grads[f"{name}.w{layer}"] = activations[layer].T @ d_hidden
+                grads[f"{name}.b{layer}"] = d_hidden.sum(axis=0)
+                d_hidden = d_hidden @ self.params[f"{name}.w{layer}"].T
+
+            d_residual = d_residual + d_hidden
+
+        return grads
+
+    def predict(self, x, batch_size=4096):
+        """Forecasts for many contexts, in batches to bound memory"""
+        x = np.asarray(x, dtype=np.float32)
+        out = np.empty((len(x), self.horizon), dtype=np.float32)
+        for start in range(0, len(x), batch_size):
+            out[start:start + batch_size] = self.forward(x[start:start + batch_size])[0]
+        return out
+
+
+class Adam:
+    """Adam optimiser updating parameters in place"""
+
+    def __init__(self, params, learning_rate, beta1=0.9, beta2=0.999, eps=1e-8, clip_norm=1.0):
+        self.learning_rate = learning_rate
+        self.beta1 = beta1
+        self.beta2 = beta2
+        self.eps = eps
+        self.clip_norm = clip_norm
+        self.step = 0
+        self.m = {name: np.zeros_like(value) for name, value in params.items()}
+        self.v = {name: np.zeros_like(value) for name, value in params.items()}
+
+    def update(self, params, grads):
+        self.step += 1
+        norm = np.sqrt(sum(float(np.vdot(g, g)) for g in grads.values()))
+        scale = min(1.0, self.clip_norm / (norm + 1e-12))
+        rate = (self.learning_rate * np.sqrt(1 - self.beta2 ** self.step)
+                / (1 - self.beta1 ** self.step))
+
+        for name, grad in grads.items():
+            if scale < 1.0:
+                grad = grad * scale
+            m, v = self.m[name], self.v[name]
+            m *= self.beta1
+            m += (1 - self.beta1) * grad
+            v *= self.beta2
+            v += (1 - self.beta2) * grad * grad
+            params[name] -= rate * m / (np.sqrt(v) + self.eps)
+
+
+def window_index(first_days, n_days, context, horizon, validation_split):
+    """(row, origin) pairs for training and validation windows
+
+    A window's origin is its first forecast day. Validation takes the newest
+    origins; training windows end before the first of them, so no target
+    day is shared.
+    """
+    origins = np.arange(context, n_days - horizon + 1)
+    if len(origins) == 0:
+        empty = np.empty((0, 2), dtype=np.int64)
+        return empty, empty
+
+    n_val = max(1, int(len(origins) * validation_split))
+    val_start = origins[-n_val]
+
+    rows, cols = np.meshgrid(np.arange(len(first_days)), origins, indexing='ij')
+    # Contexts start on or after each product's first sale
+    valid = cols - context >= np.asarray(first_days)[:, np.newaxis]
+    pairs = np.stack([rows[valid], cols[valid]], axis=1)
+
+    train = pairs[pairs[:, 1] + horizon <= val_start]
+    val = pairs[pairs[:, 1] >= val_start]
+    return train, val
+
+
+class NBeatsEngine:
+    """N-BEATS trained over the whole catalog, served like the pooled model"""
+
+    def __init__(self, config=NBEATS_CONFIG):
+        self.config = dict(config)
+        self.network = NBeatsNetwork(self.config)
+        self.product_ids = np.empty(0, dtype=np.int64)
+        self.end_date = None
+        self.metrics = {}
+        self.trained_at = None
+        self.epochs = 0
+        self.throughput = []   # training windows/s per epoch
+        self._index = {}
+
+    @property
+    def horizon(self):
+        return self.network.horizon
+
+    def _windows(self, matrix, pairs):
+        """Scaled contexts, scaled targets and scales for (row, origin) pairs"""
+        offsets = np.arange(-self.network.context, self.network.horizon)
+        values = matrix[pairs[:, :1], pairs[:, 1:] + offsets]
+        context = self.network.context
+        scale = values[:, :context].mean(axis=1, keepdims=True) + 1.0
+        values /= scale
+        return values[:, :context], values[:, context:], scale
+
+    def fit(self, db, max_epochs=None, resume=False, checkpoint_path=NBEATS_CHECKPOINT_PATH, log=print):
+        """Train on every product with enough sales history"""
+        sales = db.get_daily_sales(days=NBEATS_HISTORY_DAYS)
+        if sales.empty:
+            return False, "No sales history"
+
+        products = db.get_all_products()
+        ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+        end_date = np.datetime64(sales['sale_date'].max(), 'D')
+        matrix = daily_matrix(sales, ids, end_date, NBEATS_HISTORY_DAYS)
+
+        keep = (matrix > 0).sum(axis=1) >= GLOBAL_MIN_DAYS
+        if not keep.any():
+            return False, f"No product has {GLOBAL_MIN_DAYS}+ days of sales"
+        return self.train(matrix[keep], ids[keep], end_date, max_epochs=max_epochs,
+                          resume=resume, checkpoint_path=checkpoint_path, log=log)
+
+    def train(self, matrix, product_ids, end_date, max_epochs=None, resume=False,
+              checkpoint_path=NBEATS_CHECKPOINT_PATH, threads=NBEATS_THREADS, seed=0, log=print):
+        """Mini-batch training on a (products, days) daily demand matrix"""
+        config = self.config
+        network = self.network
+        matrix = np.asarray(matrix, dtype=np.float32)
+        first_days = np.argmax(matrix > 0, axis=1)
+
+        # Drop calendar days before any product sold, so the validation
+        # split is a share of days that actually have windows
+        matrix = matrix[:, first_days.min():]
+        first_days -= first_days.min()
+        train_pairs, val_pairs = window_index(first_days, matrix.shape[1], network.context,
+                                              network.horizon, config['validation_split'])
+        if len(train_pairs) == 0 or len(val_pairs) == 0:
+            return False, (f"Need more than {network.context + 2 * network.horizon} days "
+                           f"of history to train N-BEATS")
+
+        max_epochs = max_epochs or config['max_epochs']
+        batch_size = config['batch_size']
+        optimizer = Adam(network.params, config['learning_rate'])
+        best_loss, bad_epochs, start_epoch = np.inf, 0, 0
+        best_params = {name: value.copy() for name, value in network.params.items()}
+        if resume and checkpoint_path and os.path.exists(checkpoint_path):
+            start_epoch, best_loss, bad_epochs, best_params = self._restore(checkpoint_path, optimizer)
+            log(f"♻️ Resumed N-BEATS from epoch {start_epoch}")
+
+        log(f"🧠 N-BEATS: {len(product_ids)} products, {len(train_pairs)} training windows, "
+            f"{len(val_pairs)} validation windows")
+
+        self.throughput = []
+        with blas_threads(threads):
+            for epoch in range(start_epoch, max_epochs):
+                if bad_epochs >= config['patience']:
+                    break
+
+                start = time.perf_counter()
+                order = np.random.default_rng((seed, epoch)).permutation(len(train_pairs))
+                loss = 0.0
+                for offset in range(0, len(order), batch_size):
+                    x, y, _ = self._windows(matrix, train_pairs[order[offset:offset + batch_size]])
+                    forecast, caches = network.forward(x, keep=True)
+                    error = forecast - y
+                    loss += float(np.abs(error).sum())
+                    grads = network.backward(caches, np.sign(error) / error.size)
+                    optimizer.update(network.params, grads)
+
+                elapsed = time.perf_counter() - start
+                self.throughput.append(len(order) / elapsed)
+
+                x, y, _ = self._windows(matrix, val_pairs)
+                val_loss = float(np.abs(network.predict(x) - y).mean())
+                train_loss = loss / (len(order) * network.horizon)
+                log(f"   epoch {epoch + 1:>3}: train MAE {train_loss:.4f}  val MAE {val_loss:.4f}  "
+                    f"{self.throughput[-1]:,.0f} windows/s")
+
+                if val_loss < best_loss - 1e-4:
+                    best_loss, bad_epochs = val_loss, 0
+                    best_params = {name: value.copy() for name, value in network.params.items()}
+                else:
+                    bad_epochs += 1
+
+                self.epochs = epoch + 1
+                if checkpoint_path:
+                    self._checkpoint(checkpoint_path, epoch + 1, best_loss, bad_epochs,
+                                     best_params, optimizer)
+
+        if bad_epochs >= config['patience']:
+            log(f"⏹️ Early stopping: no improvement in {config['patience']} epochs")
+
+        # Serve the best validation weights
+        network.params.update(best_params)
+        x, y, scale = self._windows(matrix, val_pairs)
+        predicted = np.maximum(network.predict(x), 0) * scale
+        self.metrics = holdout_metrics((y * scale).ravel(), predicted.ravel())
+
+        self.product_ids = np.asarray(product_ids, dtype=np.int64)
+        self.end_date = np.datetime64(end_date, 'D')
+        self.trained_at = datetime.now().isoformat(timespec='seconds')
+        self._index = {int(pid): i for i, pid in enumerate(self.product_ids)}
+        return True, f"N-BEATS trained on {len(product_ids)} products for {self.epochs} epochs"
+
+    def _checkpoint(self, path, epoch, best_loss, bad_epochs, best_params, optimizer):
+        """Save everything needed to resume training after this epoch"""
+        arrays = {}
+        for name, value in self.network.params.items():
+            arrays[f"param/{name}"] = value
+            arrays[f"best/{name}"] = best_params[name]
+            arrays[f"m/{name}"] = optimizer.m[name]
+            arrays[f"v/{name}"] = optimizer.v[name]
+        arrays['meta'] = np.array(json.dumps({
+            'epoch': epoch,
+            'best_loss': best_loss,
+            'bad_epochs': bad_epochs,
+            'step': optimizer.step,
+            'config': self.config
+        }))
+        write_npz(path, arrays)
+
+    def _restore(self, path, optimizer):
+        """Load a checkpoint written by _checkpoint into the network and optimiser"""
+        best_params = {}
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            if meta['config'] != self.config:
+                raise ValueError("Checkpoint was trained with a different NBEATS_CONFIG")
+            for name in self.network.params:
+                self.network.params[name] = data[f"param/{name}"]
+                best_params[name] = data[f"best/{name}"]
+                optimizer.m[name] = data[f"m/{name}"]
+                optimizer.v[name] = data[f"v/{name}"]
+
+        optimizer.step = meta['step']
+        self.epochs = meta['epoch']
+        return meta['epoch'], meta['best_loss'], meta['bad_epochs'], best_params
+
+    def covers(self, product_id):
+        """Whether the product was part of training"""
+        return product_id in self._index
+
+    def predict(self, db, product_ids, days=FORECAST_DAYS):
+        """Forecast covered products in one batched forward pass
+
+        Returns (product_ids, first_date, predictions) in original units.
+        """
+        product_ids = [pid for pid in product_ids if pid in self._index]
+        if not product_ids or days > self.horizon:
+            return [], None, np.empty((0, days))
+
+        context = self.network.context
+        if len(product_ids) == 1:
+            sales = db.get_daily_columns(product_ids[0], days=context + 1)
+        else:
+            sales = db.get_daily_columns(days=context + 1)
+
+        end_date = self.end_date
+        if len(sales['sale_date']):
+            end_date = max(end_date, sales['sale_date'].max())
+
+        history = daily_matrix(sales, product_ids, end_date, context)
+        return product_ids, end_date + 1, self.predict_history(history, days)
+
+    def predict_history(self, history, days=FORECAST_DAYS):
+        """Forecasts from (products, context) matrices of the last daily values"""
+        history = np.asarray(history, dtype=np.float32)
+        scale = history.mean(axis=1, keepdims=True) + 1.0
+        predictions = np.maximum(self.network.predict(history / scale), 0) * scale
+        return predictions[:, :days]
+
+    def forecast_product(self, db, product, days=FORECAST_DAYS):
+        """API-shaped forecast for one product, or None if it is not covered"""
+        if not self.covers(product['product_id']) or days > self.horizon:
+            return None
+
+        _, first_date, predictions = self.predict(db, [product['product_id']], days)
+        forecast = format_forecast(predictions[0], first_date)
+        return {
+            'success': True,
+            'engine': 'nbeats',
+            'forecast': forecast,
+            'accuracy': self.metrics,
+            'recommendations': generate_recommendations(product, forecast)
+        }
+
+    def save(self, path=NBEATS_MODEL_PATH):
+        """Write the trained network as an .npz archive"""
+        arrays = {f"param/{name}": value for name, value in self.network.params.items()}
+        arrays['product_ids'] = self.product_ids
+        arrays['meta'] = np.array(json.dumps({
+            'config': self.config,
+            'end_date': str(self.end_date),
+            'metrics': self.metrics,
+            'trained_at': self.trained_at,
+            'epochs': self.epochs
+        }))
+        write_npz(path, arrays)
+
+    @classmethod
+    def load(cls, path=NBEATS_MODEL_PATH):
+        """Read a model written by save()"""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            engine = cls(meta['config'])
+            for name in engine.network.params:
+                engine.network.params[name] = data[f"param/{name}"]
+            engine.product_ids = data['product_ids']
+
+        engine.end_date = np.datetime64(meta['end_date'], 'D')
+        engine.metrics = meta['metrics']
+        engine.trained_at = meta['trained_at']
+        engine.epochs = meta['epochs']
+        engine._index = {int(pid): i for i, pid in enumerate(engine.product_ids)}
+        return engine
+
+
+_saved = ModelFile(NBEATS_MODEL_PATH, NBeatsEngine.load)
+
+
+def load_nbeats_engine():
+    """Get the saved N-BEATS model, reloading it after retraining"""
+    return _saved.get()
+
+
+def fit_nbeats_engine(db, max_epochs=None, resume=False, path=NBEATS_MODEL_PATH):
+    """Train N-BEATS and save it, returns (success, message, engine)"""
+    start = time.perf_counter()
+    engine = NBeatsEngine()
+    success, message = engine.fit(db, max_epochs=max_epochs, resume=resume)
+    if success:
+        engine.save(path)
+        message = f"{message} in {time.perf_counter() - start:.1f}s"
+    return success, message, engine
@@ -1,23 +1,47 @@
 """Simplified N-BEATS Forecasting Model - FULLY FIXED"""
 import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from sklearn.linear_model import Ridge
 from sklearn.preprocessing import StandardScaler
 import warnings
 warnings.filterwarnings('ignore')
 
-from config import FORECAST_DAYS, MIN_TRAINING_SAMPLES
+from config import FORECAST_DAYS, FORECAST_HISTORY_DAYS, FORECAST_MODE, MIN_TRAINING_SAMPLES
+from features import FEATURE_COLS, direct_windows, feature_mask, training_windows
+# Inference helpers are re-exported here for code that imports them from this module
+from inference import (ROLLOUT_WINDOW, effective_weights, format_forecast,
+                       generate_recommendations, predict_linear, recursive_rollout)
+from model_cache import model_cache
+from model_registry import model_registry, params_key
+
+
+def predict_batch(forecasters, days=FORECAST_DAYS):
+    """Forecast several trained forecasters at once, see ``inference.predict_linear``"""
+    results = predict_linear([f.export_arrays() for f in forecasters], days)
+    return [format_forecast(predictions, first_date) for first_date, predictions in results]
+
 
 class NBEATSForecaster:
     """Simplified but accurate forecasting model"""
     
-    def __init__(self, db):
-        """Initialize forecaster with database connection"""
+    def __init__(self, db, mode=FORECAST_MODE, horizon=FORECAST_DAYS, params=None):
+        """Initialize forecaster with database connection
+        
+        ``mode`` is 'recursive' (predict one day, feed it back) or 'direct'
+        (one multi-output model maps the lookback window to ``horizon`` days).
+        ``params`` overrides the Ridge ``alpha``, the ``lookback`` and the
+        ``features`` set (a FEATURE_SETS name), as found by tuning.
+        """
         self.db = db
+        self.mode = mode
+        self.horizon = horizon
+        self.params = params or {}
         self.model = None
         self.scaler = StandardScaler()
         self.training_data = None
+        self.recent_features = None
+        self.last_date = None
+        self.lookback = 30
         self.is_trained = False
         self.accuracy_metrics = {}
         self.mean_sales = 0
@@ -74,19 +98,20 @@ class NBEATSForecaster:
             print(f"❌ Data preparation error: {str(e)}")
             return None
     
+    def feature_matrix(self, data):
+        """FEATURE_COLS as float32, with columns outside the tuned feature set zeroed"""
+        features = data[FEATURE_COLS].to_numpy(dtype=np.float32)
+        # Zeroed columns get zero coefficients, so the state layout never changes
+        features[:, ~feature_mask(self.params.get('features', 'all'))] = 0
+        return features
+    
     def create_sequences(self, data, lookback=30):
-        """Create input-output sequences"""
-        X, y = [], []
-        
-        feature_cols = ['value', 'day_of_week', 'day_of_month', 'month', 'is_weekend',
-                       'lag_1', 'lag_7', 'lag_14', 'lag_30',
-                       'rolling_mean_7', 'rolling_mean_14', 'rolling_mean_30']
-        
-        for i in range(lookback, len(data)):
-            X.append(data[feature_cols].iloc[i-lookback:i].values.flatten())
-            y.append(data['value'].iloc[i])
-        
-        return np.array(X), np.array(y)
+        """Create input-output sequences as strided float32 windows"""
+        return training_windows(self.feature_matrix(data), lookback)
+    
+    def create_direct_sequences(self, data, lookback=30, horizon=FORECAST_DAYS):
+        """Create lookback windows with the following ``horizon`` days as targets"""
+        return direct_windows(self.feature_matrix(data), lookback, horizon)
     
     def train(self, sales_df):
         """Train forecasting model"""
@@ -97,12 +122,24 @@ class NBEATSForecaster:
                 return False, f"Insufficient data: need {MIN_TRAINING_SAMPLES} days"
             
             self.training_data = data
+            # Tail of the feature matrix, all that prediction needs
+            self.recent_features = data[FEATURE_COLS].to_numpy(dtype=np.float64)[-ROLLOUT_WINDOW:]
+            self.last_date = np.datetime64(data['date'].max().date(), 'D')
             self.mean_sales = data['value'].mean()
             self.std_sales = data['value'].std() if data['value'].std() > 0 else 1
             
             # Create sequences
-            lookback = min(30, len(data) // 4)
-            X, y = self.create_sequences(data, lookback)
+            lookback = min(self.params.get('lookback', 30), len(data) // 4)
+            self.lookback = lookback
+            
+            if self.mode == 'direct':
+                X, y = self.create_direct_sequences(data, lookback, self.horizon)
+                if len(X) < 20:
+                    print(f"⚠️ Too little history for a {self.horizon}-day direct model, using recursive mode")
+                    self.mode = 'recursive'
+            
+            if self.mode != 'direct':
+                X, y = self.create_sequences(data, lookback)
             
             if len(X) < 20:
                 return False, "Not enough data for training sequences"
@@ -119,7 +156,7 @@ class NBEATSForecaster:
             X_val_scaled = self.scaler.transform(X_val)
             
             # Train model
-            self.model = Ridge(alpha=1.0)
+            self.model = Ridge(alpha=self.params.get('alpha', 1.0))
             self.model.fit(X_train_scaled, y_train)
             
             # Validate
@@ -166,6 +203,22 @@ class NBEATSForecaster:
             print(traceback.format_exc())
             return False, f"Training failed: {str(e)}"
     
+    def effective_weights(self):
+        """Collapse the scaler and Ridge model into one weight per feature"""
+        return effective_weights(self.model.coef_, self.model.intercept_, self.scaler.mean_,
+                                 self.scaler.scale_, self.lookback)
+    
+    def last_window(self):
+        """Scaled feature window ending on the last training day"""
+        window = self.recent_features[-self.lookback:].reshape(1, -1)
+        return (window - self.scaler.mean_) / self.scaler.scale_
+    
+    def predict_direct(self):
+        """Whole-horizon forecast from the direct model in one matrix product"""
+        coef = self.model.coef_.astype(np.float64)
+        predictions = coef @ self.last_window()[0] + self.model.intercept_
+        return np.maximum(predictions, 0)
+    
     def predict(self, days=FORECAST_DAYS):
         """Generate forecast"""
         if not self.is_trained or self.model is None:
@@ -174,81 +227,20 @@ class NBEATSForecaster:
         try:
             print(f"🔮 Generating {days}-day forecast...")
             
-            # Start with historical data
-            data = self.training_data.copy()
-            last_date = data['date'].max()
+            first_date = self.last_date + 1
             
-            forecasts = []
+            if self.mode == 'direct':
+                if days > self.horizon:
+                    print(f"❌ Direct model covers {self.horizon} days, {days} requested")
+                    return None
+                predictions = self.predict_direct()[:days]
+            else:
+                weights, bias = self.effective_weights()
+                history = self.recent_features[:, 0]
+                predictions = recursive_rollout(weights[np.newaxis], np.array([bias]),
+                                                history[np.newaxis], np.array([first_date]), days)[0]
             
-            # Generate predictions day by day
-            for day in range(1, days + 1):
-                # Get last 30 days
-                recent_data = data.tail(30).copy()
-                
-                # Create features for next day
-                next_date = last_date + timedelta(days=day)
-                
-                next_features = {
-                    'value': recent_data['value'].iloc[-1],
-                    'day_of_week': next_date.weekday(),
-                    'day_of_month': next_date.day,
-                    'month': next_date.month,
-                    'is_weekend': 1 if next_date.weekday() >= 5 else 0,
-                    'lag_1': recent_data['value'].iloc[-1],
-                    'lag_7': recent_data['value'].iloc[-7] if len(recent_data) >= 7 else recent_data['value'].mean(),
-                    'lag_14': recent_data['value'].iloc[-14] if len(recent_data) >= 14 else recent_data['value'].mean(),
-                    'lag_30': recent_data['value'].iloc[-30] if len(recent_data) >= 30 else recent_data['value'].mean(),
-                    'rolling_mean_7': recent_data['value'].tail(7).mean(),
-                    'rolling_mean_14': recent_data['value'].tail(14).mean(),
-                    'rolling_mean_30': recent_data['value'].tail(30).mean()
-                }
-                
-                # Create feature vector
-                feature_cols = ['value', 'day_of_week', 'day_of_month', 'month', 'is_weekend',
-                               'lag_1', 'lag_7', 'lag_14', 'lag_30',
-                               'rolling_mean_7', 'rolling_mean_14', 'rolling_mean_30']
-                
-                X = []
-                for _ in range(30):  # Repeat 30 times for lookback
-                    X.extend([next_features[col] for col in feature_cols])
-                
-                X = np.array(X).reshape(1, -1)
-                X_scaled = self.scaler.transform(X)
-                
-                # Predict
-                prediction = self.model.predict(X_scaled)[0]
-                prediction = max(0, prediction)  # No negative
-                
-                # Apply smoothing based on trend
-                if day > 1:
-                    prev_pred = forecasts[-1]['demand']
-                    prediction = 0.7 * prediction + 0.3 * prev_pred
-                
-                forecasts.append({
-                    'date': next_date.strftime('%Y-%m-%d'),
-                    'demand': round(float(prediction), 2),
-                    'lower': round(float(prediction * 0.8), 2),
-                    'upper': round(float(prediction * 1.2), 2)
-                })
-                
-                # Add prediction to data for next iteration
-                new_row = pd.DataFrame({
-                    'date': [next_date],
-                    'value': [prediction],
-                    'day_of_week': [next_features['day_of_week']],
-                    'day_of_month': [next_features['day_of_month']],
-                    'month': [next_features['month']],
-                    'is_weekend': [next_features['is_weekend']],
-                    'lag_1': [next_features['lag_1']],
-                    'lag_7': [next_features['lag_7']],
-                    'lag_14': [next_features['lag_14']],
-                    'lag_30': [next_features['lag_30']],
-                    'rolling_mean_7': [next_features['rolling_mean_7']],
-                    'rolling_mean_14': [next_features['rolling_mean_14']],
-                    'rolling_mean_30': [next_features['rolling_mean_30']]
-                })
-                
-                data = pd.concat([data, new_row], ignore_index=True)
+            forecasts = format_forecast(predictions, first_date)
             
             print(f"✅ Forecast generated: {len(forecasts)} days")
             return forecasts
@@ -259,6 +251,62 @@ class NBEATSForecaster:
             print(traceback.format_exc())
             return None
     
+    def export_arrays(self):
+        """The trained model as plain arrays for ``inference``"""
+        return {
+            'coef': self.model.coef_,
+            'intercept': self.model.intercept_,
+            'mean': self.scaler.mean_,
+            'scale': self.scaler.scale_,
+            'recent_features': self.recent_features,
+            'last_date': self.last_date,
+            'lookback': self.lookback,
+            'mode': self.mode,
+            'horizon': self.horizon,
+            'accuracy_metrics': self.accuracy_metrics
+        }
+    
+    def get_state(self):
+        """Trained state, shared read-only through the model cache"""
+        return {
+            'model': self.model,
+            'scaler': self.scaler,
+            'recent_features': self.recent_features,
+            'last_date': self.last_date,
+            'lookback': self.lookback,
+            'mode': self.mode,
+            'horizon': self.horizon,
+            'accuracy_metrics': self.accuracy_metrics,
+            'mean_sales': self.mean_sales,
+            'std_sales': self.std_sales
+        }
+    
+    def set_state(self, state):
+        """Restore trained state from the model cache"""
+        self.model = state['model']
+        self.scaler = state['scaler']
+        self.recent_features = state['recent_features']
+        self.last_date = state['last_date']
+        self.lookback = state['lookback']
+        self.mode = state['mode']
+        self.horizon = state['horizon']
+        self.accuracy_metrics = state['accuracy_metrics']
+        self.mean_sales = state['mean_sales']
+        self.std_sales = state['std_sales']
+        self.is_trained = True
+    
+    def state_size(self):
+        """Approximate memory held by the trained state, in bytes"""
+        return self._state_bytes(self.get_state())
+    
+    @staticmethod
+    def _state_bytes(state):
+        size = state['recent_features'].nbytes
+        size += state['model'].coef_.nbytes
+        size += sum(getattr(state['scaler'], attr).nbytes
+                    for attr in ('mean_', 'scale_', 'var_'))
+        return size
+    
     def get_accuracy(self):
         """Get accuracy metrics"""
         return self.accuracy_metrics if self.accuracy_metrics else {
@@ -276,25 +324,53 @@ class NBEATSForecaster:
             print(f"🔮 Starting forecast for product {product_id}")
             print(f"{'='*60}")
             
-            # Get sales data
-            sales_df = self.db.get_sales(product_id, days=180)
-            
-            if sales_df.empty or len(sales_df) < MIN_TRAINING_SAMPLES:
-                return {
-                    'success': False,
-                    'error': f'Insufficient sales history. Need at least {MIN_TRAINING_SAMPLES} days of data.'
-                }
-            
-            print(f"📊 Found {len(sales_df)} sales records")
-            
-            # Train model
-            success, message = self.train(sales_df)
-            
-            if not success:
-                return {
-                    'success': False,
-                    'error': message
-                }
+            # Hyperparameters from the last tuning run, if any
+            if not self.params:
+                self.params = self.db.get_tuned_params(product_id) or {}
+            
+            # Reuse the trained model if no sale arrived and no tuning run
+            # changed its parameters since it was fit
+            watermark = self.db.get_sales_version(product_id)
+            tuning = params_key(self.params)
+            state = model_cache.get(product_id, (watermark, tuning))
+            
+            # A direct model only covers the horizon it was trained for
+            if self.mode == 'direct':
+                self.horizon = max(self.horizon, days)
+            if state is None:
+                # Another process (or a previous run) may have trained it already
+                state = model_registry.get(product_id, watermark, tuning)
+                if state is not None:
+                    model_cache.put(product_id, (watermark, tuning), state, self._state_bytes(state))
+            if state is not None and state['mode'] == 'direct' and state['horizon'] < days:
+                state = None
+            
+            if state is not None:
+                print(f"⚡ Using cached model (sales version {watermark})")
+                self.set_state(state)
+            else:
+                # Get daily sales totals from the rollup
+                sales_df = self.db.get_daily_sales(product_id, days=FORECAST_HISTORY_DAYS)
+                
+                if sales_df.empty or len(sales_df) < MIN_TRAINING_SAMPLES:
+                    return {
+                        'success': False,
+                        'error': f'Insufficient sales history. Need at least {MIN_TRAINING_SAMPLES} days of data.'
+                    }
+                
+                print(f"📊 Found {len(sales_df)} days of sales")
+                
+                # Train model
+                success, message = self.train(sales_df)
+                
+                if not success:
+                    return {
+                        'success': False,
+                        'error': message
+                    }
+                
+                model_cache.put(product_id, (watermark, tuning), self.get_state(), self.state_size())
+                model_registry.put(product_id, watermark, self.get_state(), tuning)
             
             # Generate forecast
             forecast = self.predict(days)
@@ -315,7 +391,8 @@ class NBEATSForecaster:
             recommendations = self._generate_recommendations(product, forecast)
             
             # Save forecast to database
-            self.db.save_forecast(product_id, forecast, accuracy['accuracy'])
+            self.db.save_forecast(product_id, forecast, accuracy['accuracy'],
+                                  sales_version=watermark, engine='ridge', metrics=accuracy)
             
             print(f"✅ Forecast complete!")
             print(f"{'='*60}\n")
@@ -336,75 +413,49 @@ class NBEATSForecaster:
                 'error': str(e)
             }
     
-    def _generate_recommendations(self, product, forecast):
-        """Generate recommendations based on forecast"""
-        if not product or not forecast:
-            return []
-        
-        recommendations = []
-        current_stock = product['current_quantity']
-        product_name = product['product_name']
-        purchase_price = product['purchase_price']
-        selling_price = product['selling_price']
-        
-        # Calculate total demand
-        total_demand = sum([f['demand'] for f in forecast])
-        avg_demand = total_demand / len(forecast)
-        
-        # Stock sufficiency
-        days_of_stock = current_stock / avg_demand if avg_demand > 0 else float('inf')
-        
-        # URGENT REORDER
-        if days_of_stock < 7:
-            order_qty = int(total_demand * 1.3)
-            cost = order_qty * purchase_price
-            
-            recommendations.append({
-                'type': 'urgent_reorder',
-                'priority': 'high',
-                'icon': '🚨',
-                'message': f'CRITICAL: Stock will last only {int(days_of_stock)} days',
-                'action': f'ORDER IMMEDIATELY:\n• Quantity: {order_qty} units\n• Cost: ₹{cost:,.0f}\n• This covers 30 days + 30% buffer'
-            })
-        
-        elif days_of_stock < 14:
-            order_qty = int(total_demand * 1.2)
-            cost = order_qty * purchase_price
-            
-            recommendations.append({
-                'type': 'reorder_soon',
-                'priority': 'medium',
-                'icon': '⚠️',
-                'message': f'Stock sufficient for only {int(days_of_stock)} days',
-                'action': f'PLAN TO ORDER:\n• Quantity: {order_qty} units\n• Cost: ₹{cost:,.0f}\n• Order within 3-5 days'
-            })
-        
-        # TREND ANALYSIS
-        first_week = np.mean([f['demand'] for f in forecast[:7]])
-        last_week = np.mean([f['demand'] for f in forecast[-7:]])
+    def forecast_from_sales(self, sales_df, product, days=30):
+        """Train and forecast from a sales frame without touching the database
         
-        if first_week > 0:
-            trend_change = ((last_week - first_week) / first_week * 100)
-        else:
-            trend_change = 0
-        
-        if trend_change > 20:
-            recommendations.append({
-                'type': 'increasing_demand',
-                'priority': 'high',
-                'icon': '📈',
-                'message': f'Demand SURGING: +{trend_change:.1f}% growth trend',
-                'action': f'CAPITALIZE:\n• Increase stock by 30%\n• Consider bulk discount\n• High profit opportunity'
-            })
-        
-        elif trend_change < -20:
-            discount = min(25, int(abs(trend_change) / 2))
-            recommendations.append({
-                'type': 'decreasing_demand',
-                'priority': 'medium',
-                'icon': '📉',
-                'message': f'Demand DECLINING: {abs(trend_change):.1f}% drop',
-                'action': f'MITIGATE:\n• Launch {discount}% discount\n• Run marketing campaign\n• Bundle with popular items'
-            })
+        Used by batch forecasting workers, which receive their sales history
+        from the parent process and hand results back for a bulk save.
+        """
+        try:
+            if sales_df.empty or len(sales_df) < MIN_TRAINING_SAMPLES:
+                return {
+                    'success': False,
+                    'error': f'Insufficient sales history. Need at least {MIN_TRAINING_SAMPLES} days of data.'
+                }
+            
+            if self.mode == 'direct':
+                self.horizon = max(self.horizon, days)
+            
+            success, message = self.train(sales_df)
+            if not success:
+                return {
+                    'success': False,
+                    'error': message
+                }
+            
+            forecast = self.predict(days)
+            if forecast is None:
+                return {
+                    'success': False,
+                    'error': 'Failed to generate forecast'
+                }
+            
+            return {
+                'success': True,
+                'forecast': forecast,
+                'accuracy': self.get_accuracy(),
+                'recommendations': self._generate_recommendations(product, forecast)
+            }
         
-        return recommendations
\ No newline at end of file
+        except Exception as e:
+            return {
+                'success': False,
+                'error': str(e)
+            }
+    
+    def _generate_recommendations(self, product, forecast):
+        """Generate recommendations based on forecast"""
+        return generate_recommendations(product, forecast)
@@ -0,0 +1,259 @@
+"""Online forecasting models updated sale by sale
+
+Each product keeps the sufficient statistics of its next-day regression
+(weighted feature sums, Gram matrix and target moments) with exponential
+forgetting. The Ridge solution on standardized features is recovered from
+them in closed form, so it equals a StandardScaler + Ridge refit over the
+same weighted rows. Sales on the open day only add to its total; when a
+later day arrives the finished day becomes one training row, an
+O(features²) update plus one tiny solve. State lives in the
+``online_models`` table and is written in the same transaction as the sale.
+"""
+import numpy as np
+
+from config import (FORECAST_DAYS, MIN_TRAINING_SAMPLES, ONLINE_ALPHA, ONLINE_FORGETTING,
+                    ONLINE_HISTORY_DAYS)
+from features import FEATURE_COLS, LAGS, ROLLING_WINDOWS, calendar_features, rollout_features
+from inference import format_forecast, generate_recommendations, recursive_rollout
+
+N_FEATURES = len(FEATURE_COLS)
+WINDOW = max(LAGS)
+
+# Layout of the state blob: name -> size, in order
+STATE_LAYOUT = [
+    ('history', WINDOW),            # finished days before the open day, oldest first
+    ('scalars', 8),                 # see SCALARS
+    ('sum_x', N_FEATURES),
+    ('sum_xy', N_FEATURES),
+    ('weights', N_FEATURES),
+    ('sum_xx', N_FEATURES * N_FEATURES),
+]
+SCALARS = ['count', 'sum_y', 'sum_yy', 'bias', 'abs_error', 'sq_error', 'pct_error', 'pct_count']
+
+
+class OnlineModel:
+    """One product's online regression state"""
+
+    def __init__(self, open_day, day_total=0.0):
+        self.open_day = np.datetime64(open_day, 'D')
+        self.day_total = float(day_total)
+        self.history = np.zeros(WINDOW)
+        self.sum_x = np.zeros(N_FEATURES)
+        self.sum_xy = np.zeros(N_FEATURES)
+        self.sum_xx = np.zeros((N_FEATURES, N_FEATURES))
+        self.weights = np.zeros(N_FEATURES)
+        for name in SCALARS:
+            setattr(self, name, 0.0)
+
+    @classmethod
+    def bootstrap(cls, values, dates, forgetting=ONLINE_FORGETTING, alpha=ONLINE_ALPHA):
+        """Build state from a daily series whose last day is the open day"""
+        values = np.asarray(values, dtype=np.float64)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        model = cls(dates[-1], values[-1])
+
+        finished = values[:-1]
+        model.history[max(0, WINDOW - len(finished)):] = finished[-WINDOW:]
+
+        X, y = rollout_features(finished, dates[:-1])
+        X, y = X.astype(np.float64), y.astype(np.float64)
+        if len(y) == 0:
+            return model
+
+        decay = forgetting ** np.arange(len(y) - 1, -1, -1)
+        model.count = decay.sum()
+        model.sum_x = decay @ X
+        model.sum_y = decay @ y
+        model.sum_xx = X.T @ (X * decay[:, np.newaxis])
+        model.sum_xy = X.T @ (y * decay)
+        model.sum_yy = decay @ (y * y)
+        model.solve(alpha)
+
+        # In-sample errors stand in for the one-step-ahead history
+        predicted = np.maximum(X @ model.weights + model.bias, 0)
+        model.abs_error = decay @ np.abs(predicted - y)
+        model.sq_error = decay @ (predicted - y) ** 2
+        sold = y > 0
+        model.pct_error = decay[sold] @ (np.abs(predicted - y)[sold] / y[sold])
+        model.pct_count = decay[sold].sum()
+        return model
+
+    def add_sale(self, day, quantity, forgetting=ONLINE_FORGETTING, alpha=ONLINE_ALPHA):
+        """Fold a sale in; returns False for a day that is already folded"""
+        day = np.datetime64(day, 'D')
+        if day < self.open_day:
+            return False
+
+        self.advance(day, forgetting, alpha)
+        self.day_total += quantity
+        return True
+
+    def advance(self, day, forgetting=ONLINE_FORGETTING, alpha=ONLINE_ALPHA):
+        """Finish every day before ``day``, days without sales as zeros, and open ``day``"""
+        day = np.datetime64(day, 'D')
+        while self.open_day < day:
+            self._finish_day(forgetting, alpha)
+
+    def _row(self):
+        """Features of the open day, laid out as features.rollout_features"""
+        x = np.empty(N_FEATURES)
+        history = self.history
+        x[0] = history[-1]
+        x[1:5] = calendar_features(self.open_day)
+        for col, lag in enumerate(LAGS, start=5):
+            x[col] = history[-lag]
+        for col, size in enumerate(ROLLING_WINDOWS, start=9):
+            x[col] = history[-size:].mean()
+        return x
+
+    def _finish_day(self, forgetting, alpha):
+        """Turn the open day into a training row and open the next day"""
+        x, y = self._row(), self.day_total
+
+        # One-step-ahead error of the coefficients being served
+        if self.count > 0:
+            error = max(x @ self.weights + self.bias, 0.0) - y
+            self.abs_error = forgetting * self.abs_error + abs(error)
+            self.sq_error = forgetting * self.sq_error + error * error
+            self.pct_error *= forgetting
+            self.pct_count *= forgetting
+            if y > 0:
+                self.pct_error += abs(error) / y
+                self.pct_count += 1
+
+        self.count = forgetting * self.count + 1
+        self.sum_y = forgetting * self.sum_y + y
+        self.sum_yy = forgetting * self.sum_yy + y * y
+        self.sum_x *= forgetting
+        self.sum_x += x
+        self.sum_xy *= forgetting
+        self.sum_xy += x * y
+        self.sum_xx *= forgetting
+        self.sum_xx += np.outer(x, x)
+        self.solve(alpha)
+
+        self.history[:-1] = self.history[1:]
+        self.history[-1] = y
+        self.open_day += 1
+        self.day_total = 0.0
+
+    def solve(self, alpha=ONLINE_ALPHA):
+        """Ridge on standardized features, folded back to raw-feature weights"""
+        n = self.count
+        mean = self.sum_x / n
+        y_mean = self.sum_y / n
+        centered_xx = self.sum_xx - n * np.outer(mean, mean)
+        scale = np.sqrt(np.maximum(np.diag(centered_xx) / n, 0))
+        scale[scale < 1e-12] = 1.0   # constant columns, as StandardScaler does
+
+        gram = centered_xx / np.outer(scale, scale)
+        rhs = (self.sum_xy - n * mean * y_mean) / scale
+        coef = np.linalg.solve(gram + alpha * np.eye(N_FEATURES), rhs)
+
+        self.weights = coef / scale
+        self.bias = y_mean - self.weights @ mean
+
+    def metrics(self):
+        """Accuracy metrics in the shape NBEATSForecaster reports"""
+        n = max(self.count, 1e-12)
+        mape = self.pct_error / self.pct_count * 100 if self.pct_count else 15.0
+        ss_tot = self.sum_yy - self.sum_y ** 2 / n
+        return {
+            'mae': float(self.abs_error / n),
+            'rmse': float(np.sqrt(self.sq_error / n)),
+            'r2': float(1 - self.sq_error / (ss_tot + 1e-10)),
+            'mape': float(mape),
+            'accuracy': float(max(0, min(100, 100 - mape)))
+        }
+
+    def forecast(self, days=FORECAST_DAYS):
+        """Daily predictions starting the day after the open day"""
+        history = np.append(self.history, self.day_total)[np.newaxis, -WINDOW:]
+        return recursive_rollout(self.weights[np.newaxis], [self.bias], history,
+                                 [self.open_day + 1], days)[0]
+
+    def to_row(self):
+        """(open_day, day_total, state blob) for the online_models table"""
+        parts = {
+            'history': self.history,
+            'scalars': np.array([getattr(self, name) for name in SCALARS]),
+            'sum_x': self.sum_x,
+            'sum_xy': self.sum_xy,
+            'weights': self.weights,
+            'sum_xx': self.sum_xx.ravel(),
+        }
+        blob = np.concatenate([parts[name] for name, _ in STATE_LAYOUT]).astype(np.float64)
+        return str(self.open_day), self.day_total, blob.tobytes()
+
+    @classmethod
+    def from_row(cls, open_day, day_total, blob):
+        """Inverse of to_row()"""
+        model = cls(open_day, day_total)
+        state = np.frombuffer(blob, dtype=np.float64)
+        offset = 0
+        for name, size in STATE_LAYOUT:
+            part = state[offset:offset + size].copy()
+            offset += size
+            if name == 'scalars':
+                for scalar, value in zip(SCALARS, part):
+                    setattr(model, scalar, float(value))
+            elif name == 'sum_xx':
+                model.sum_xx = part.reshape(N_FEATURES, N_FEATURES)
+            else:
+                setattr(model, name, part)
+        return model
+
+
+class OnlineEngine:
+    """Serves forecasts straight from online state, bootstrapping it on first use"""
+
+    def get_model(self, db, product_id):
+        """Stored state, or fresh state built from the product's history
+
+        The state is rolled forward through days without sales to
+        yesterday, as daily_matrix does, so its forecast starts today.
+        """
+        yesterday = np.datetime64('today', 'D') - 1
+        model = db.get_online_model(product_id)
+        if model is None:
+            model = db.bootstrap_online_model(product_id, ONLINE_HISTORY_DAYS,
+                                              lambda sales: self.build(sales, yesterday))
+        if model is not None:
+            model.advance(yesterday)
+        return model
+
+    def build(self, sales, yesterday):
+        """Fresh state from daily sales columns, or None without enough history"""
+        if len(sales['sale_date']) < MIN_TRAINING_SAMPLES:
+            return None
+
+        days = sales['sale_date']
+        dates = np.arange(days.min(), max(days.max(), yesterday) + 1)
+        values = np.zeros(len(dates))
+        values[(days - dates[0]).astype(np.int64)] = sales['quantity_sold']
+
+        model = OnlineModel.bootstrap(values, dates)
+        return model if model.count > 0 else None
+
+    def forecast_product(self, db, product, days=FORECAST_DAYS):
+        """API-shaped forecast for one product, or None without enough history"""
+        model = self.get_model(db, product['product_id'])
+        if model is None:
+            return None
+
+        forecast = format_forecast(model.forecast(days), model.open_day + 1)
+        return {
+            'success': True,
+            'engine': 'online',
+            'forecast': forecast,
+            'accuracy': model.metrics(),
+            'recommendations': generate_recommendations(product, forecast)
+        }
+
+
+online_engine = OnlineEngine()
+
+
+def load_online_engine():
+    """The online engine needs nothing loaded; state is read per product"""
+    return online_engine
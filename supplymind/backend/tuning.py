@@ -0,0 +1,188 @@
+"""Hyperparameter search for the per-product Ridge forecaster
+
+Searches Ridge alpha, lookback and feature set (TUNING_* in config) with
+expanding-window time-series cross-validation on next-day MAE, the same
+target ``NBEATSForecaster.train`` validates on. Work is shared across
+candidates:
+  * each product's feature matrix is built once
+  * the lookback windows are built once per lookback (strided views)
+  * each (lookback, feature set, fold) is factored with one SVD, which
+    solves every alpha at once
+
+Products are scored in chunks on a process pool. Winners are written to
+the tuned_params table and reused until the product's recent mean demand
+drifts by TUNING_DRIFT or they are TUNING_MAX_AGE_DAYS old, so a nightly
+run only re-tunes what changed. With the 'category' scope one shared
+winner per category minimises the mean MAE relative to the defaults.
+"""
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError, as_completed
+
+import numpy as np
+
+from config import (FORECAST_HISTORY_DAYS, FORECAST_WORKERS, MIN_TRAINING_SAMPLES, TUNING_ALPHAS,
+                    TUNING_DRIFT, TUNING_FEATURE_SETS, TUNING_FOLDS, TUNING_LEVEL_DAYS,
+                    TUNING_LOOKBACKS, TUNING_MAX_AGE_DAYS, TUNING_SCOPE, TUNING_TIME_BUDGET)
+from features import build_features, feature_mask, training_windows
+from global_model import daily_matrix
+
+DEFAULTS = (30, 'all', 1.0)
+
+# Candidate order matches the flattened (lookback, feature set, alpha) score grid
+CANDIDATES = [(lookback, features, alpha) for lookback in TUNING_LOOKBACKS
+              for features in TUNING_FEATURE_SETS for alpha in TUNING_ALPHAS]
+
+
+def cv_scores(values, dates, folds=TUNING_FOLDS):
+    """Cross-validated next-day MAE of every candidate, NaN where infeasible"""
+    alphas = np.asarray(TUNING_ALPHAS, dtype=np.float64)
+    features = build_features(values, dates)
+    scores = np.full((len(TUNING_LOOKBACKS), len(TUNING_FEATURE_SETS), len(alphas)), np.nan)
+
+    for li, lookback in enumerate(TUNING_LOOKBACKS):
+        # Same cap as training, so short histories score what they would train
+        lookback = min(lookback, len(values) // 4)
+        X, y = training_windows(features, lookback)
+        X, y = np.asarray(X, dtype=np.float64), np.asarray(y, dtype=np.float64)
+        n_rows = len(y)
+        val_size = max(7, n_rows // 10)
+        if n_rows - folds * val_size < 20:
+            continue
+
+        for fi, feature_set in enumerate(TUNING_FEATURE_SETS):
+            # Dropping columns gives the same Ridge fit as zeroing them
+            Xf = X[:, np.tile(feature_mask(feature_set), lookback)]
+            abs_error = np.zeros(len(alphas))
+
+            for fold in range(folds):
+                end = n_rows - (folds - fold) * val_size
+                train = Xf[:end]
+                mean = train.mean(axis=0)
+                scale = train.std(axis=0)
+                scale[scale < 1e-12] = 1.0   # constant columns, as StandardScaler does
+                y_mean = y[:end].mean()
+
+                # Ridge for all alphas from one SVD of the standardized windows
+                U, s, Vt = np.linalg.svd((train - mean) / scale, full_matrices=False)
+                shrink = s[:, np.newaxis] / (s[:, np.newaxis] ** 2 + alphas)
+                coefs = Vt.T @ (shrink * (U.T @ (y[:end] - y_mean))[:, np.newaxis])
+
+                val = (Xf[end:end + val_size] - mean) / scale
+                predicted = np.maximum(val @ coefs + y_mean, 0)
+                abs_error += np.abs(predicted - y[end:end + val_size, np.newaxis]).sum(axis=0)
+
+            scores[li, fi] = abs_error / (folds * val_size)
+
+    return scores.ravel()
+
+
+def _score_chunk(series):
+    """Worker: candidate scores for a list of (product_id, values, dates)"""
+    return [(product_id, cv_scores(values, dates)) for product_id, values, dates in series]
+
+
+def _needs_tuning(record, level, force):
+    """Whether a product's tuned parameters are missing, old or drifted"""
+    if force or record is None:
+        return True
+    if record['age_days'] > TUNING_MAX_AGE_DAYS:
+        return True
+    return abs(level - (record['level'] or 0.0)) > TUNING_DRIFT * max(record['level'] or 0.0, 1.0)
+
+
+def tune_catalog(db, scope=TUNING_SCOPE, category=None, force=False, workers=FORECAST_WORKERS,
+                 time_budget=TUNING_TIME_BUDGET):
+    """Tune every product whose cached winner is missing or stale
+
+    Returns a summary dict. Products not scored within ``time_budget``
+    seconds keep their previous parameters and are tuned on the next run.
+    """
+    if scope not in ('product', 'category'):
+        raise ValueError(f"Unknown tuning scope: {scope}")
+
+    start = time.perf_counter()
+    products = db.get_products_by_category(category) if category else db.get_all_products()
+    versions = db.get_sales_versions()
+    sales = db.get_daily_sales(days=FORECAST_HISTORY_DAYS)
+    if sales.empty or not products:
+        return {'tuned': 0, 'cached': 0, 'unfinished': 0, 'mean_improvement': 0.0, 'seconds': 0.0}
+
+    end_date = np.datetime64(sales['sale_date'].max(), 'D')
+    dates = end_date - np.arange(FORECAST_HISTORY_DAYS)[::-1]
+    ids = np.array([p['product_id'] for p in products], dtype=np.int64)
+    matrix = daily_matrix(sales, ids, end_date, FORECAST_HISTORY_DAYS)
+    cached = db.get_all_tuned_params()
+
+    # Series run from the first to the last day with sales, as in prepare_data
+    series, levels, stale = {}, {}, set()
+    for product, row in zip(products, matrix):
+        sold = np.flatnonzero(row > 0)
+        if len(sold) < MIN_TRAINING_SAMPLES:
+            continue
+        pid = product['product_id']
+        series[pid] = (row[sold[0]:sold[-1] + 1], dates[sold[0]:sold[-1] + 1])
+        levels[pid] = float(row[-TUNING_LEVEL_DAYS:].mean())
+        if _needs_tuning(cached.get(pid), levels[pid], force):
+            stale.add(pid)
+
+    # A shared winner is re-tuned as a whole when any member drifted
+    categories = {p['product_id']: p['category'] for p in products}
+    if scope == 'category':
+        stale_categories = {categories[pid] for pid in stale}
+        stale = {pid for pid in series if categories[pid] in stale_categories}
+
+    todo = [(pid, *series[pid]) for pid in series if pid in stale]
+    print(f"🎛️ Tuning {len(todo)} products ({len(series) - len(todo)} cached), "
+          f"{len(CANDIDATES)} candidates each")
+
+    scores = {}
+    if todo:
+        chunks = np.array_split(np.arange(len(todo)), max(1, min(len(todo), workers * 4)))
+        pool = ProcessPoolExecutor(max_workers=workers)
+        try:
+            futures = [pool.submit(_score_chunk, [todo[i] for i in chunk]) for chunk in chunks]
+            for future in as_completed(futures, timeout=time_budget):
+                scores.update(future.result())
+        except TimeoutError:
+            print(f"⏱️ Tuning budget of {time_budget}s used up, the rest waits for the next run")
+        finally:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+    unfinished = len(todo) - len(scores)
+    scores = {pid: s for pid, s in scores.items() if not np.isnan(s).all()}
+    baseline = CANDIDATES.index(DEFAULTS) if DEFAULTS in CANDIDATES else None
+    winners = {pid: int(np.nanargmin(s)) for pid, s in scores.items()}
+
+    if scope == 'category' and baseline is not None:
+        # Mean MAE relative to the defaults, so big sellers do not dominate
+        members = {}
+        for pid, s in scores.items():
+            if not np.isnan(s[baseline]) and s[baseline] > 0:
+                members.setdefault(categories[pid], []).append(s / s[baseline])
+        shared = {name: int(np.nanargmin(np.nanmean(rel, axis=0))) for name, rel in members.items()}
+        winners = {pid: shared.get(categories[pid], best) for pid, best in winners.items()
+                   if not np.isnan(scores[pid][shared.get(categories[pid], best)])}
+
+    rows, gains = [], []
+    for pid, best in winners.items():
+        lookback, features, alpha = CANDIDATES[best]
+        base = float(scores[pid][baseline]) if baseline is not None else None
+        cv_mae = float(scores[pid][best])
+        if base:
+            gains.append(1 - cv_mae / base)
+        rows.append({
+            'product_id': pid, 'alpha': alpha, 'lookback': lookback, 'features': features,
+            'scope': scope, 'cv_mae': cv_mae,
+            'baseline_mae': None if base is None or np.isnan(base) else base,
+            'level': levels[pid], 'sales_version': versions.get(pid, 0)
+        })
+    if rows:
+        db.save_tuned_params(rows)
+
+    return {
+        'tuned': len(rows),
+        'cached': len(series) - len(todo),
+        'unfinished': unfinished,
+        'mean_improvement': float(np.mean(gains)) if gains else 0.0,
+        'seconds': time.perf_counter() - start
+    }
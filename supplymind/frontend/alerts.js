@@ -100,4 +100,21 @@ async function resolveAlert(alertId) {
     } finally {
         hideLoading();
     }
+}
+
+// Live updates from the event stream (see connectStream)
+function applyAlertEvent(change) {
+    const index = allAlerts.findIndex(a => a.alert_id === change.alert_id);
+    
+    if (change.action === 'resolved') {
+        if (index >= 0) allAlerts.splice(index, 1);
+    } else if (index >= 0) {
+        Object.assign(allAlerts[index], change.alert);
+    } else {
+        allAlerts.push(change.alert);
+    }
+    
+    if (currentView === 'alerts') {
+        displayAlerts(allAlerts);
+    }
 }
\ No newline at end of file
@@ -352,12 +352,41 @@ document.addEventListener('keydown', (e) => {
     }
 });
 
-// Auto-refresh dashboard stats every 30 seconds
-setInterval(() => {
-    if (currentView === 'dashboard' && getUser()) {
+// Live updates: the server pushes alert, stock and stats deltas over /api/stream
+let eventStream = null;
+
+function connectStream() {
+    if (eventStream) return;
+    
+    let connected = false;
+    eventStream = new EventSource(`${API_URL}/stream`);
+    
+    eventStream.addEventListener('open', () => {
+        // After a reconnect, reload whatever was missed while offline
+        if (connected) resyncView();
+        connected = true;
+    });
+    eventStream.addEventListener('stock', e => applyStockEvent(JSON.parse(e.data)));
+    eventStream.addEventListener('stats', e => applyStatsEvent(JSON.parse(e.data)));
+    eventStream.addEventListener('alert', e => applyAlertEvent(JSON.parse(e.data)));
+    eventStream.addEventListener('product', () => resyncView());
+    eventStream.addEventListener('resync', () => resyncView());
+}
+
+function disconnectStream() {
+    if (eventStream) {
+        eventStream.close();
+        eventStream = null;
+    }
+}
+
+function resyncView() {
+    if (currentView === 'dashboard') {
         loadDashboard();
+    } else if (currentView === 'alerts') {
+        loadAlerts();
     }
-}, 30000);
+}
 
 // Console welcome message
 console.log('%c🚀 SupplyMind', 'font-size: 24px; font-weight: bold; color: #2563eb;');
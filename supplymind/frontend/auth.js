@@ -45,6 +45,7 @@ function showMainApp(user) {
     
     // Setup navigation
     setupNavigation();
+    connectStream();
     
     // Load dashboard after a short delay to ensure DOM is ready
     setTimeout(() => {
@@ -141,6 +142,7 @@ function logout() {
     if (confirm('Are you sure you want to logout? Your data will be saved.')) {
         console.log('User logging out');
         clearCurrentSession();
+        disconnectStream();
         showLogin();
         showNotification('Logged out successfully. Your data is safe!', 'info');
     }
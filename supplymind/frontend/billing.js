@@ -188,13 +188,23 @@ const BillingSystem = () => {
 
     setLoading(true);
     try {
-      // Record each sale
-      for (const item of cartItems) {
-        await fetch(`${API_URL}/products/${item.product_id}/sale`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ quantity: item.quantity }),
-        });
+      // Record the whole cart in one request
+      const response = await fetch(`${API_URL}/billing/create`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          items: cartItems.map((item) => ({
+            product_id: item.product_id,
+            quantity: item.quantity,
+          })),
+          customer_name: customerName,
+          customer_phone: customerPhone,
+          payment_method: paymentMethod,
+        }),
+      });
+      const result = await response.json();
+      if (!result.success) {
+        throw new Error(result.error || 'Checkout failed');
       }
 
       // Create bill data
@@ -1,5 +1,7 @@
 // Dashboard functionality
 let categoryChart = null;
+let dashboardStats = null;
+let dashboardRenderTimer = null;
 
 async function loadDashboard() {
     try {
@@ -11,10 +13,6 @@ async function loadDashboard() {
         const productsResult = await apiCall('/products');
         allProducts = productsResult.products;
         
-        // Load alerts count
-        const alertsResult = await apiCall('/alerts');
-        document.getElementById('alertCount').textContent = alertsResult.alerts.length;
-        
         // Update charts
         updateCategoryChart();
         updateLowStockList();
@@ -25,6 +23,8 @@ async function loadDashboard() {
 }
 
 function updateStats(stats) {
+    dashboardStats = stats;
+    document.getElementById('alertCount').textContent = stats.active_alerts || 0;
     document.getElementById('totalProducts').textContent = stats.total_products || 0;
     document.getElementById('inventoryValue').textContent = formatCurrency(stats.inventory_value || 0);
     document.getElementById('activeAlerts').textContent = stats.active_alerts || 0;
@@ -111,4 +111,33 @@ function updateLowStockList() {
             </div>
         </div>
     `).join('');
+}
+
+// Live updates from the event stream (see connectStream)
+function applyStatsEvent(delta) {
+    if (!dashboardStats) return;
+    
+    Object.entries(delta).forEach(([key, value]) => {
+        dashboardStats[key] = (dashboardStats[key] || 0) + value;
+    });
+    updateStats(dashboardStats);
+}
+
+function applyStockEvent(change) {
+    const product = allProducts.find(p => p.product_id === change.product_id);
+    if (!product) return;
+    
+    product.current_quantity = change.current_quantity;
+    scheduleDashboardRender();
+}
+
+function scheduleDashboardRender() {
+    // Redraw at most twice a second however many changes arrive
+    if (dashboardRenderTimer || currentView !== 'dashboard') return;
+    
+    dashboardRenderTimer = setTimeout(() => {
+        dashboardRenderTimer = null;
+        updateCategoryChart();
+        updateLowStockList();
+    }, 500);
 }
\ No newline at end of file